@@ -0,0 +1,121 @@
+import importlib
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from arches.app.models.system_settings import settings
+
+LEGACY_FUNCTION = "pg_temp.__arches_rascolls_legacy_related_resources"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the set-based and closure term search functions with the temp-table\n"
+        "version they replaced (migration 0008), for 1 to --max-terms terms. The old\n"
+        "version is recreated in pg_temp for the duration of the command. All must\n"
+        "return the same resources; the median latency of each is reported.\n\n"
+        "Examples:\n"
+        "  python manage.py benchmark_term_search\n"
+        "  python manage.py benchmark_term_search --terms paper linen blue --runs 10"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--terms",
+            nargs="+",
+            help="Search terms to use (default: the most frequent indexed lexemes).",
+        )
+        parser.add_argument(
+            "--max-terms",
+            type=int,
+            default=5,
+            help="Benchmark searches of 1 up to this many terms (default: 5).",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="Timed runs per function and term count (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        terms = options["terms"] or self.get_frequent_lexemes(options["max_terms"])
+        if not terms:
+            raise CommandError("No indexed search terms found to benchmark with.")
+        self.create_legacy_function()
+
+        self.stdout.write(
+            f"{'terms':>5} {'results':>8} {'legacy ms':>10} {'set-based ms':>13} {'closure ms':>11}"
+        )
+        for count in range(1, min(options["max_terms"], len(terms)) + 1):
+            search_terms = terms[:count]
+            graph_params = [search_terms, settings.COLLECTIONS_GRAPHID]
+            legacy_ids, legacy_ms = self.time_query(
+                f"SELECT resourceinstance FROM {LEGACY_FUNCTION}(%s::text[], %s::uuid)",
+                graph_params,
+                options["runs"],
+            )
+            timings = [legacy_ms]
+            for label, sql, params in [
+                (
+                    "set-based",
+                    """SELECT resourceinstance
+                    FROM __arches_rascolls_get_related_resources_by_searchable_values(%s::text[], %s::uuid)""",
+                    graph_params,
+                ),
+                (
+                    "closure",
+                    """SELECT resourceinstance
+                    FROM __arches_rascolls_get_collection_items_by_searchable_values(%s::text[])""",
+                    [search_terms],
+                ),
+            ]:
+                ids, milliseconds = self.time_query(sql, params, options["runs"])
+                if ids != legacy_ids:
+                    raise CommandError(
+                        f"Results differ for {search_terms}: {len(legacy_ids)} legacy, {len(ids)} {label}."
+                    )
+                timings.append(milliseconds)
+            self.stdout.write(
+                f"{count:>5} {len(legacy_ids):>8} {timings[0]:>10.1f} {timings[1]:>13.1f} {timings[2]:>11.1f}"
+            )
+
+    def get_frequent_lexemes(self, count):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT word
+                FROM ts_stat('SELECT search_vector FROM arches_search_terms LIMIT 5000')
+                WHERE word ~ '^[[:alpha:]]{3,}$'
+                ORDER BY ndoc DESC, word
+                LIMIT %s
+                """,
+                [count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def create_legacy_function(self):
+        migration = importlib.import_module(
+            "arches_rascolls.migrations.0008_update_basic_search_fn"
+        ).Migration
+        sql = migration.update_table_name.replace(
+            "__arches_rascolls_get_related_resources_by_searchable_values",
+            LEGACY_FUNCTION,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+
+    def time_query(self, sql, params, runs):
+        """Return (result ids, median milliseconds). Each run is its own
+        transaction, since the legacy function's temp tables are only
+        dropped on commit."""
+        timings = []
+        with connection.cursor() as cursor:
+            for _ in range(runs):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                ids = {row[0] for row in cursor.fetchall()}
+                timings.append((time.perf_counter() - start) * 1000)
+        return ids, statistics.median(timings)
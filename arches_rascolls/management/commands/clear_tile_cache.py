@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from arches_rascolls.search.tile_cache import get_tile_cache
+from arches_rascolls.views.map_api import ReferenceCollectionMVT
+
+
+class Command(BaseCommand):
+    help = (
+        "Drop the cached vector tiles of the collection map.\n\n"
+        "Tiles are dropped as geometries change; run this after loading\n"
+        "geometries with triggers disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--layer",
+            action="append",
+            help=f"Layer to clear (default: {ReferenceCollectionMVT.layer}).",
+        )
+
+    def handle(self, *args, **options):
+        tile_cache = get_tile_cache()
+        for layer in options["layer"] or [ReferenceCollectionMVT.layer]:
+            tile_cache.clear(layer)
+            self.stdout.write(self.style.SUCCESS(f"Cleared the {layer} tiles."))
@@ -11,7 +11,7 @@ IMPORTER_SUBCOMMANDS = {
 
 class Command(BaseCommand):
     help = (
-        "Import RaSColls *.xlsx files and rebuild descriptors, search index, and report configs.\n\n"
+        "Import RaSColls *.xlsx files and rebuild descriptors, search index, search cards, map tiles, and report configs.\n\n"
         "Examples:\n"
         "  python manage.py load_rascolls_data ../rascolls-data-pkg\n"
         "  python manage.py load_rascolls_data ../rascolls-data-pkg --format branch-excel"
@@ -46,10 +46,31 @@ class Command(BaseCommand):
             self.stdout.write(f"\n>>> etl {subcommand} -s {xlsx} -mp -mxp 3")
             call_command("etl", subcommand, "-s", str(xlsx), "-mp", "-mxp", "3")
 
+        self.stdout.write("\n>>> rebuild_tiledata_index")
+        call_command("rebuild_tiledata_index")
+
         self.stdout.write("\n>>> resources calculate_descriptors")
         call_command("resources", "calculate_descriptors", "-y")
 
         self.stdout.write("\n>>> arches_search reindex_database -mp -mxp 5")
         call_command("arches_search", "reindex_database", "-mp", "-mxp", "5")
 
+        self.stdout.write("\n>>> rebuild_related_closure")
+        call_command("rebuild_related_closure")
+
+        self.stdout.write("\n>>> rebuild_search_suggestions")
+        call_command("rebuild_search_suggestions")
+
+        self.stdout.write("\n>>> rebuild_search_cards")
+        call_command("rebuild_search_cards")
+
+        self.stdout.write("\n>>> rebuild_map_geometries")
+        call_command("rebuild_map_geometries")
+
+        self.stdout.write("\n>>> clear_tile_cache")
+        call_command("clear_tile_cache")
+
+        self.stdout.write("\n>>> seed_tile_cache")
+        call_command("seed_tile_cache")
+
         self.stdout.write(self.style.SUCCESS("\nDone."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from arches_rascolls.search.tile_cache import rebuild_map_geometries
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the rascolls_map_geometry table that collection map tiles are\n"
+        "rendered from.\n\n"
+        "The table is kept current by a trigger; run this after loading\n"
+        "geometries with triggers disabled."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_map_geometries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} map geometries."))
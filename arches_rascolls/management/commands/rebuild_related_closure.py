@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from arches_rascolls.search.closure import rebuild_related_closure
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the rascolls_related_collection_item table that term search uses\n"
+        "to find collection items through related resources.\n\n"
+        "The table is kept current by triggers; run this after loading relations\n"
+        "with triggers disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of batches to refresh concurrently (default: 4).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of resources to refresh per batch (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_related_closure(
+            workers=options["workers"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt related collection items for {count} resources."
+            )
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from arches_rascolls.search.hydration import rebuild_search_cards
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the rascolls_search_card table used to render search results.\n\n"
+        "Cards are kept current by triggers; run this after loading data with\n"
+        "triggers disabled or after changing how cards are computed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of resources to refresh per statement (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_search_cards(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt search cards for {count} resources.")
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from arches_rascolls.search.suggest import rebuild_search_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the dictionary of terms /api-search-suggest completes from.\n\n"
+        "Run after reindexing search terms (arches_search reindex_database) and\n"
+        "rebuilding the related collection item closure."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_search_suggestions()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} search suggestions."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from arches_rascolls.search.advanced_search import rebuild_tiledata_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the tiles index advanced search conditions use, over the\n"
+        "nodegroups of the collections graph.\n\n"
+        "Run after loading or changing the collections graph; tiles of\n"
+        "nodegroups added since the last rebuild are searched without it."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_tiledata_index()
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed the tiles of {count} nodegroups.")
+        )
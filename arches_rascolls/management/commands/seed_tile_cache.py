@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+from itertools import batched
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from arches_rascolls.search.tile_cache import (
+    get_covering_tiles,
+    get_max_zoom,
+    get_tile_cache,
+    refresh_tile_cache,
+)
+from arches_rascolls.utils.data_version import get_data_version
+from arches_rascolls.views.map_api import ReferenceCollectionMVT
+
+
+def render_tiles(tiles):
+    view = ReferenceCollectionMVT()
+    return [(zoom, x, y, view.render(zoom, x, y)) for zoom, x, y in tiles]
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the collection map's vector tiles into the tile cache.\n\n"
+        "Only tiles with geometries in or near them are rendered, spread over\n"
+        "a pool of processes that each hold a database connection. Run this\n"
+        "after load_rascolls_data so the first visitors don't wait for tiles.\n"
+        "With the default TILE_CACHE the tiles are written to an MBTiles\n"
+        "archive that the tile view serves from."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-zoom",
+            type=int,
+            default=0,
+            help="Lowest zoom level to render (default: 0).",
+        )
+        parser.add_argument(
+            "--max-zoom",
+            type=int,
+            default=10,
+            help="Highest zoom level to render (default: 10).",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of rendering processes (default: one per CPU).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of tiles rendered per task and written at once "
+            "(default: 100).",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options["min_zoom"] <= options["max_zoom"]:
+            raise CommandError("--min-zoom must be between 0 and --max-zoom.")
+        if options["max_zoom"] > get_max_zoom():
+            raise CommandError(
+                f"--max-zoom must not exceed TILE_CACHE MAX_ZOOM ({get_max_zoom()})."
+            )
+        if options["processes"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--processes and --batch-size must be positive.")
+
+        layer = ReferenceCollectionMVT.layer
+        tile_cache = get_tile_cache()
+        # Tiles rendered from here on are no older than this version, and
+        # edits after it are dropped again by the refresh below.
+        version = refresh_tile_cache(tile_cache, layer)
+        tiles = sorted(
+            get_covering_tiles(
+                ReferenceCollectionMVT().get_bboxes(),
+                options["max_zoom"],
+                min_zoom=options["min_zoom"],
+            )
+        )
+        self.stdout.write(
+            f"Rendering {len(tiles)} tiles at zoom levels "
+            f"{options['min_zoom']}-{options['max_zoom']}."
+        )
+
+        # Forked processes must not share the parent's connection.
+        connections.close_all()
+        done = 0
+        with multiprocessing.get_context("fork").Pool(options["processes"]) as pool:
+            for rendered in pool.imap_unordered(
+                render_tiles, batched(tiles, options["batch_size"])
+            ):
+                tile_cache.set_many(layer, rendered)
+                done += len(rendered)
+                self.stdout.write(f"{done}/{len(tiles)}", ending="\r")
+
+        if get_data_version("tiles") != version:
+            # Geometries changed while rendering, and a request may have
+            # refreshed the layer before the tiles covering them were
+            # written: drop those tiles again.
+            tile_cache.set_version(
+                layer, min(tile_cache.get_version(layer) or 0, version)
+            )
+            refresh_tile_cache(tile_cache, layer)
+
+        self.stdout.write(self.style.SUCCESS(f"\nRendered {len(tiles)} tiles."))
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0010_plugin_visibility"),
+    ]
+
+    create_search_results_table = """
+        -- Unlogged: result sets are disposable and shouldn't generate WAL.
+        CREATE UNLOGGED TABLE IF NOT EXISTS rascolls_search_results (
+            session_key TEXT NOT NULL,
+            query_key TEXT NOT NULL,
+            resourceids UUID[] NOT NULL,
+            expires TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (session_key, query_key)
+        );
+        CREATE INDEX IF NOT EXISTS rascolls_search_results_expires_idx
+            ON rascolls_search_results (expires);
+    """
+
+    drop_search_results_table = """
+        DROP TABLE IF EXISTS rascolls_search_results;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_search_results_table,
+            drop_search_results_table,
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0011_search_result_store"),
+    ]
+
+    create_search_data_version = """
+        CREATE SEQUENCE IF NOT EXISTS rascolls_search_data_version;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_search_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM nextval('rascolls_search_data_version');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Deferred until commit, so a transaction advances the version once
+        -- it is done writing. nextval() still takes effect before the commit
+        -- does, so a search can read the new version without seeing the new
+        -- data; migration 0024 moves the version into a row that only
+        -- changes as the transaction commits.
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_tiles_search_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON tiles
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_search_data_version();
+
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_resource_x_resource_search_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON resource_x_resource
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_search_data_version();
+
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_geojson_geometries_search_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON geojson_geometries
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_search_data_version();
+
+        -- Reindexing search terms changes term search results without any tile writes.
+        DO $$
+        BEGIN
+            IF to_regclass('arches_search_terms') IS NOT NULL THEN
+                CREATE CONSTRAINT TRIGGER __arches_rascolls_search_terms_search_data_version
+                    AFTER INSERT OR UPDATE OR DELETE ON arches_search_terms
+                    DEFERRABLE INITIALLY DEFERRED
+                    FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_search_data_version();
+            END IF;
+        END $$;
+    """
+
+    drop_search_data_version = """
+        DROP TRIGGER IF EXISTS __arches_rascolls_tiles_search_data_version ON tiles;
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_x_resource_search_data_version ON resource_x_resource;
+        DROP TRIGGER IF EXISTS __arches_rascolls_geojson_geometries_search_data_version ON geojson_geometries;
+        DO $$
+        BEGIN
+            IF to_regclass('arches_search_terms') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS __arches_rascolls_search_terms_search_data_version ON arches_search_terms;
+            END IF;
+        END $$;
+        DROP FUNCTION IF EXISTS __arches_rascolls_bump_search_data_version();
+        DROP SEQUENCE IF EXISTS rascolls_search_data_version;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_search_data_version,
+            drop_search_data_version,
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("arches_rascolls", "0012_search_data_version"),
+    ]
+
+    # Advanced search conditions are `nodegroupid = ... AND tiledata @> ...`,
+    # which Postgres answers by combining this with the nodegroupid index.
+    create_tiledata_index = """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS rascolls_tiles_tiledata_path_ops_idx
+            ON tiles USING gin (tiledata jsonb_path_ops);
+    """
+
+    drop_tiledata_index = """
+        DROP INDEX CONCURRENTLY IF EXISTS rascolls_tiles_tiledata_path_ops_idx;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_tiledata_index,
+            drop_tiledata_index,
+        ),
+    ]
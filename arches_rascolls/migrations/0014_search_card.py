@@ -0,0 +1,190 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0013_tiledata_path_ops_index"),
+    ]
+
+    create_search_card = f"""
+        CREATE TABLE IF NOT EXISTS rascolls_search_card (
+            resourceinstanceid UUID NOT NULL
+                REFERENCES resource_instances (resourceinstanceid) ON DELETE CASCADE,
+            language TEXT NOT NULL,
+            displayname TEXT,
+            displaydescription TEXT,
+            currentlocation TEXT NOT NULL DEFAULT '',
+            has_geom BOOLEAN NOT NULL DEFAULT FALSE,
+            centroid geometry(Point, 4326),
+            PRIMARY KEY (resourceinstanceid, language)
+        );
+
+        -- Recompute the cards of the given resources, one per descriptor language.
+        -- Resources outside the collections graph are ignored.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_refresh_search_cards(
+            resourceids UUID[]
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            DELETE FROM rascolls_search_card
+            WHERE resourceinstanceid = ANY(resourceids);
+
+            INSERT INTO rascolls_search_card (
+                resourceinstanceid,
+                language,
+                displayname,
+                displaydescription,
+                currentlocation,
+                has_geom,
+                centroid
+            )
+            SELECT
+                ri.resourceinstanceid,
+                descriptor.key,
+                descriptor.value ->> 'name',
+                descriptor.value ->> 'description',
+                concat_ws(
+                    ' | ',
+                    coalesce(place.name ->> descriptor.key, place.name ->> 'en'),
+                    statement.value
+                ),
+                geom.centroid IS NOT NULL,
+                geom.centroid
+            FROM resource_instances ri
+            CROSS JOIN LATERAL jsonb_each(ri.descriptors) descriptor
+            LEFT JOIN LATERAL (
+                SELECT location.name
+                FROM resource_x_resource rxr
+                JOIN resource_instances location
+                    ON location.resourceinstanceid = rxr.resourceinstanceidto
+                WHERE rxr.resourceinstanceidfrom = ri.resourceinstanceid
+                    AND rxr.nodeid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEID}'
+                ORDER BY rxr.resourcexid
+                LIMIT 1
+            ) place ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT t.tiledata -> '{settings.COLLECTIONS_CURRENT_LOCATION_STATEMENT_NODEID}' -> 'en' ->> 'value' AS value
+                FROM tiles t
+                WHERE t.resourceinstanceid = ri.resourceinstanceid
+                    AND t.nodegroupid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEGROUPID}'
+                    AND t.tiledata -> '{settings.COLLECTIONS_CURRENT_LOCATION_STATEMENT_NODEID}' -> 'en' ->> 'value' IS NOT NULL
+                ORDER BY t.tileid
+                LIMIT 1
+            ) statement ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT ST_Transform(ST_Centroid(ST_Union(gg.geom)), 4326) AS centroid
+                FROM geojson_geometries gg
+                WHERE gg.resourceinstanceid = ri.resourceinstanceid
+            ) geom ON TRUE
+            WHERE ri.resourceinstanceid = ANY(resourceids)
+                AND ri.graphid = '{settings.COLLECTIONS_GRAPHID}'
+                AND jsonb_typeof(ri.descriptors) = 'object'
+                AND jsonb_typeof(descriptor.value) = 'object';
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_resource_instances_search_card()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF NEW.graphid = '{settings.COLLECTIONS_GRAPHID}' AND (
+                TG_OP = 'INSERT' OR NEW.descriptors IS DISTINCT FROM OLD.descriptors
+            ) THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[NEW.resourceinstanceid]);
+            END IF;
+            -- Renaming a place changes the current location of the items stored there.
+            IF TG_OP = 'UPDATE' AND NEW.name IS DISTINCT FROM OLD.name THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY(
+                    SELECT rxr.resourceinstanceidfrom
+                    FROM resource_x_resource rxr
+                    WHERE rxr.resourceinstanceidto = NEW.resourceinstanceid
+                        AND rxr.nodeid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEID}'
+                ));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_tiles_search_card()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'DELETE' AND NEW.nodegroupid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEGROUPID}' THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[NEW.resourceinstanceid]);
+            END IF;
+            IF TG_OP <> 'INSERT' AND OLD.nodegroupid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEGROUPID}' THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[OLD.resourceinstanceid]);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_resource_x_resource_search_card()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'DELETE' AND NEW.nodeid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEID}' THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[NEW.resourceinstanceidfrom]);
+            END IF;
+            IF TG_OP <> 'INSERT' AND OLD.nodeid = '{settings.COLLECTIONS_CURRENT_LOCATION_NODEID}' THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[OLD.resourceinstanceidfrom]);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_geojson_geometries_search_card()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'DELETE' THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[NEW.resourceinstanceid]);
+            END IF;
+            IF TG_OP <> 'INSERT' AND OLD.resourceinstanceid IS DISTINCT FROM NEW.resourceinstanceid THEN
+                PERFORM __arches_rascolls_refresh_search_cards(ARRAY[OLD.resourceinstanceid]);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Not deferred, so that cards are current within the saving transaction.
+        CREATE TRIGGER __arches_rascolls_resource_instances_search_card
+            AFTER INSERT OR UPDATE ON resource_instances
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_resource_instances_search_card();
+
+        CREATE TRIGGER __arches_rascolls_tiles_search_card
+            AFTER INSERT OR UPDATE OR DELETE ON tiles
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_tiles_search_card();
+
+        CREATE TRIGGER __arches_rascolls_resource_x_resource_search_card
+            AFTER INSERT OR UPDATE OR DELETE ON resource_x_resource
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_resource_x_resource_search_card();
+
+        CREATE TRIGGER __arches_rascolls_geojson_geometries_search_card
+            AFTER INSERT OR UPDATE OR DELETE ON geojson_geometries
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_geojson_geometries_search_card();
+
+        SELECT __arches_rascolls_refresh_search_cards(ARRAY(
+            SELECT resourceinstanceid
+            FROM resource_instances
+            WHERE graphid = '{settings.COLLECTIONS_GRAPHID}'
+        ));
+    """
+
+    drop_search_card = """
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_instances_search_card ON resource_instances;
+        DROP TRIGGER IF EXISTS __arches_rascolls_tiles_search_card ON tiles;
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_x_resource_search_card ON resource_x_resource;
+        DROP TRIGGER IF EXISTS __arches_rascolls_geojson_geometries_search_card ON geojson_geometries;
+        DROP FUNCTION IF EXISTS __arches_rascolls_resource_instances_search_card();
+        DROP FUNCTION IF EXISTS __arches_rascolls_tiles_search_card();
+        DROP FUNCTION IF EXISTS __arches_rascolls_resource_x_resource_search_card();
+        DROP FUNCTION IF EXISTS __arches_rascolls_geojson_geometries_search_card();
+        DROP FUNCTION IF EXISTS __arches_rascolls_refresh_search_cards(UUID[]);
+        DROP TABLE IF EXISTS rascolls_search_card;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_search_card,
+            drop_search_card,
+        ),
+    ]
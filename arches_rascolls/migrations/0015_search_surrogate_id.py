@@ -0,0 +1,63 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0014_search_card"),
+    ]
+
+    create_search_surrogate = f"""
+        -- Dense integer ids for collection items, so that search result sets
+        -- can be kept as sorted uint32 arrays. Ids are never reused.
+        CREATE TABLE IF NOT EXISTS rascolls_search_surrogate (
+            surrogateid INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            resourceinstanceid UUID NOT NULL UNIQUE
+                REFERENCES resource_instances (resourceinstanceid) ON DELETE CASCADE
+        );
+
+        -- Existing items are numbered in resourceinstanceid order.
+        INSERT INTO rascolls_search_surrogate (resourceinstanceid)
+        SELECT resourceinstanceid FROM resource_instances
+        WHERE graphid = '{settings.COLLECTIONS_GRAPHID}'
+        ORDER BY resourceinstanceid
+        ON CONFLICT (resourceinstanceid) DO NOTHING;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_assign_search_surrogate()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO rascolls_search_surrogate (resourceinstanceid)
+            VALUES (NEW.resourceinstanceid)
+            ON CONFLICT (resourceinstanceid) DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_rascolls_resource_instances_search_surrogate
+            AFTER INSERT ON resource_instances
+            FOR EACH ROW
+            WHEN (NEW.graphid = '{settings.COLLECTIONS_GRAPHID}')
+            EXECUTE FUNCTION __arches_rascolls_assign_search_surrogate();
+
+        -- Stored result sets are disposable, so replace them rather than convert.
+        TRUNCATE rascolls_search_results;
+        ALTER TABLE rascolls_search_results DROP COLUMN resourceids;
+        ALTER TABLE rascolls_search_results ADD COLUMN surrogateids INTEGER[] NOT NULL;
+    """
+
+    drop_search_surrogate = """
+        TRUNCATE rascolls_search_results;
+        ALTER TABLE rascolls_search_results DROP COLUMN surrogateids;
+        ALTER TABLE rascolls_search_results ADD COLUMN resourceids UUID[] NOT NULL;
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_instances_search_surrogate ON resource_instances;
+        DROP FUNCTION IF EXISTS __arches_rascolls_assign_search_surrogate();
+        DROP TABLE IF EXISTS rascolls_search_surrogate;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_search_surrogate,
+            drop_search_surrogate,
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0015_search_surrogate_id"),
+    ]
+
+    # Same results as the plpgsql version from 0008, without any temp tables:
+    # for each term, the resources matching it and the target graph resources
+    # reachable from them through non-target resources within max_hops
+    # relations; then only the resources reached by every term are kept.
+    create_set_based_function = """
+        DROP FUNCTION IF EXISTS __arches_rascolls_get_related_resources_by_searchable_values(TEXT[], UUID);
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_get_related_resources_by_searchable_values(
+            search_terms TEXT[],
+            target_graphid UUID,
+            max_hops INTEGER DEFAULT 2
+        )
+        RETURNS TABLE(resourceinstance UUID) AS $$
+            WITH RECURSIVE terms AS (
+                SELECT term, position
+                FROM unnest(search_terms) WITH ORDINALITY AS t (term, position)
+            ),
+            reached AS (
+                SELECT
+                    terms.position,
+                    matched.resourceinstanceid,
+                    matched.graphid = target_graphid AS is_matching,
+                    0 AS hops
+                FROM terms
+                CROSS JOIN LATERAL (
+                    SELECT sv.resourceinstanceid, r.graphid
+                    FROM arches_search_terms sv
+                    JOIN resource_instances r ON r.resourceinstanceid = sv.resourceinstanceid
+                    WHERE to_tsquery(terms.term) @@ sv.search_vector
+                ) matched
+
+                UNION
+
+                -- Only resources outside the target graph lead any further.
+                SELECT
+                    reached.position,
+                    CASE WHEN rxr.resourceinstanceidto = reached.resourceinstanceid
+                        THEN rxr.resourceinstanceidfrom
+                        ELSE rxr.resourceinstanceidto
+                    END,
+                    CASE WHEN rxr.resourceinstanceidto = reached.resourceinstanceid
+                        THEN rxr.resourceinstancefrom_graphid
+                        ELSE rxr.resourceinstanceto_graphid
+                    END = target_graphid,
+                    reached.hops + 1
+                FROM reached
+                JOIN resource_x_resource rxr
+                    ON reached.resourceinstanceid IN (rxr.resourceinstanceidfrom, rxr.resourceinstanceidto)
+                WHERE NOT reached.is_matching AND reached.hops < max_hops
+            )
+            SELECT resourceinstanceid
+            FROM reached
+            WHERE is_matching
+            GROUP BY resourceinstanceid
+            HAVING count(DISTINCT position) = cardinality(search_terms);
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """
+
+    # 0009 dropped the previous version, so there is nothing to restore.
+    drop_set_based_function = """
+        DROP FUNCTION IF EXISTS __arches_rascolls_get_related_resources_by_searchable_values(TEXT[], UUID, INTEGER);
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_set_based_function,
+            drop_set_based_function,
+        ),
+    ]
@@ -0,0 +1,195 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0016_set_based_related_resources_search"),
+    ]
+
+    create_closure = f"""
+        -- Each relation, seen from both of its ends.
+        CREATE OR REPLACE VIEW rascolls_related_resource AS
+            SELECT
+                resourceinstanceidfrom AS resourceinstanceid,
+                resourceinstanceidto AS relatedid,
+                resourceinstanceto_graphid AS related_graphid,
+                nodeid
+            FROM resource_x_resource
+            UNION ALL
+            SELECT
+                resourceinstanceidto,
+                resourceinstanceidfrom,
+                resourceinstancefrom_graphid,
+                nodeid
+            FROM resource_x_resource;
+
+        -- The collection items reachable from each other resource within two
+        -- relations, passing only through resources outside the collections
+        -- graph (the same paths term search follows). nodeid is the node of
+        -- the relation that reaches the collection item.
+        CREATE TABLE IF NOT EXISTS rascolls_related_collection_item (
+            resourceinstanceid UUID NOT NULL,
+            collectionitemid UUID NOT NULL,
+            hops SMALLINT NOT NULL,
+            nodeid UUID NOT NULL,
+            PRIMARY KEY (resourceinstanceid, collectionitemid, hops, nodeid)
+        );
+        CREATE INDEX IF NOT EXISTS rascolls_related_collection_item_item_idx
+            ON rascolls_related_collection_item (collectionitemid);
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_refresh_related_closure(
+            resourceids UUID[]
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            DELETE FROM rascolls_related_collection_item
+            WHERE resourceinstanceid = ANY(resourceids);
+
+            INSERT INTO rascolls_related_collection_item (
+                resourceinstanceid, collectionitemid, hops, nodeid
+            )
+            WITH sources AS (
+                SELECT resourceinstanceid FROM resource_instances
+                WHERE resourceinstanceid = ANY(resourceids)
+                    AND graphid <> '{settings.COLLECTIONS_GRAPHID}'
+            )
+            SELECT s.resourceinstanceid, first_hop.relatedid, 1, first_hop.nodeid
+            FROM sources s
+            JOIN rascolls_related_resource first_hop
+                ON first_hop.resourceinstanceid = s.resourceinstanceid
+            WHERE first_hop.related_graphid = '{settings.COLLECTIONS_GRAPHID}'
+            UNION
+            SELECT s.resourceinstanceid, second_hop.relatedid, 2, second_hop.nodeid
+            FROM sources s
+            JOIN rascolls_related_resource first_hop
+                ON first_hop.resourceinstanceid = s.resourceinstanceid
+            JOIN rascolls_related_resource second_hop
+                ON second_hop.resourceinstanceid = first_hop.relatedid
+            WHERE first_hop.related_graphid <> '{settings.COLLECTIONS_GRAPHID}'
+                AND second_hop.related_graphid = '{settings.COLLECTIONS_GRAPHID}';
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- A relation between A and B changes the paths starting at A, at B,
+        -- and at the resources related to either of them.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_refresh_related_closure_for(
+            changed_endpoints UUID[]
+        )
+        RETURNS VOID AS $$
+            SELECT __arches_rascolls_refresh_related_closure(ARRAY(
+                SELECT unnest(changed_endpoints)
+                UNION
+                SELECT related.relatedid
+                FROM rascolls_related_resource related
+                WHERE related.resourceinstanceid = ANY(changed_endpoints)
+            ));
+        $$ LANGUAGE sql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_changed_relations_closure()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM __arches_rascolls_refresh_related_closure_for(ARRAY(
+                SELECT resourceinstanceidfrom FROM changed_relations
+                UNION
+                SELECT resourceinstanceidto FROM changed_relations
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_updated_relations_closure()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM __arches_rascolls_refresh_related_closure_for(ARRAY(
+                SELECT resourceinstanceidfrom FROM old_relations
+                UNION
+                SELECT resourceinstanceidto FROM old_relations
+                UNION
+                SELECT resourceinstanceidfrom FROM new_relations
+                UNION
+                SELECT resourceinstanceidto FROM new_relations
+            ));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Statement level, so a bulk write refreshes each affected resource once.
+        CREATE TRIGGER __arches_rascolls_resource_x_resource_insert_closure
+            AFTER INSERT ON resource_x_resource
+            REFERENCING NEW TABLE AS changed_relations
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_rascolls_changed_relations_closure();
+
+        CREATE TRIGGER __arches_rascolls_resource_x_resource_delete_closure
+            AFTER DELETE ON resource_x_resource
+            REFERENCING OLD TABLE AS changed_relations
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_rascolls_changed_relations_closure();
+
+        CREATE TRIGGER __arches_rascolls_resource_x_resource_update_closure
+            AFTER UPDATE ON resource_x_resource
+            REFERENCING OLD TABLE AS old_relations NEW TABLE AS new_relations
+            FOR EACH STATEMENT EXECUTE FUNCTION __arches_rascolls_updated_relations_closure();
+
+        -- Term search through the closure: the collection items matching every
+        -- term directly or through related resources within max_hops (<= 2).
+        CREATE OR REPLACE FUNCTION __arches_rascolls_get_collection_items_by_searchable_values(
+            search_terms TEXT[],
+            max_hops INTEGER DEFAULT 2
+        )
+        RETURNS TABLE(resourceinstance UUID) AS $$
+            WITH terms AS (
+                SELECT term, position
+                FROM unnest(search_terms) WITH ORDINALITY AS t (term, position)
+            ),
+            matched AS (
+                SELECT DISTINCT terms.position, sv.resourceinstanceid
+                FROM terms
+                CROSS JOIN LATERAL (
+                    SELECT sv.resourceinstanceid
+                    FROM arches_search_terms sv
+                    WHERE to_tsquery(terms.term) @@ sv.search_vector
+                ) sv
+            ),
+            reached AS (
+                SELECT matched.position, r.resourceinstanceid
+                FROM matched
+                JOIN resource_instances r ON r.resourceinstanceid = matched.resourceinstanceid
+                WHERE r.graphid = '{settings.COLLECTIONS_GRAPHID}'
+                UNION ALL
+                SELECT matched.position, closure.collectionitemid
+                FROM matched
+                JOIN rascolls_related_collection_item closure
+                    ON closure.resourceinstanceid = matched.resourceinstanceid
+                WHERE closure.hops <= max_hops
+            )
+            SELECT resourceinstanceid
+            FROM reached
+            GROUP BY resourceinstanceid
+            HAVING count(DISTINCT position) = cardinality(search_terms);
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+
+        SELECT __arches_rascolls_refresh_related_closure(ARRAY(
+            SELECT DISTINCT resourceinstanceid FROM rascolls_related_resource
+        ));
+    """
+
+    drop_closure = """
+        DROP FUNCTION IF EXISTS __arches_rascolls_get_collection_items_by_searchable_values(TEXT[], INTEGER);
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_x_resource_insert_closure ON resource_x_resource;
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_x_resource_delete_closure ON resource_x_resource;
+        DROP TRIGGER IF EXISTS __arches_rascolls_resource_x_resource_update_closure ON resource_x_resource;
+        DROP FUNCTION IF EXISTS __arches_rascolls_changed_relations_closure();
+        DROP FUNCTION IF EXISTS __arches_rascolls_updated_relations_closure();
+        DROP FUNCTION IF EXISTS __arches_rascolls_refresh_related_closure_for(UUID[]);
+        DROP FUNCTION IF EXISTS __arches_rascolls_refresh_related_closure(UUID[]);
+        DROP TABLE IF EXISTS rascolls_related_collection_item;
+        DROP VIEW IF EXISTS rascolls_related_resource;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_closure,
+            drop_closure,
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0017_related_collection_item_closure"),
+    ]
+
+    create_suggestions = """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        -- Every indexed word that finds at least one collection item, with
+        -- the number of items it finds directly or through related resources.
+        CREATE TABLE IF NOT EXISTS rascolls_search_suggestion (
+            term TEXT PRIMARY KEY,
+            item_count INTEGER NOT NULL
+        );
+        -- Prefix matches (LIKE 'abc%') and misspellings (term % 'abc').
+        CREATE INDEX IF NOT EXISTS rascolls_search_suggestion_prefix_idx
+            ON rascolls_search_suggestion (term text_pattern_ops, item_count);
+        CREATE INDEX IF NOT EXISTS rascolls_search_suggestion_trgm_idx
+            ON rascolls_search_suggestion USING gin (term gin_trgm_ops);
+
+        -- Advanced by each rebuild, so cached suggestions can be dropped.
+        CREATE SEQUENCE IF NOT EXISTS rascolls_search_suggestion_version;
+    """
+
+    drop_suggestions = """
+        DROP SEQUENCE IF EXISTS rascolls_search_suggestion_version;
+        DROP TABLE IF EXISTS rascolls_search_suggestion;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_suggestions,
+            drop_suggestions,
+        ),
+    ]
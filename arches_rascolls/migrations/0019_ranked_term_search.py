@@ -0,0 +1,71 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0018_search_suggestions"),
+    ]
+
+    create_ranked_search = f"""
+        -- The collection items found by __arches_rascolls_get_collection_items_by_searchable_values,
+        -- with a relevance rank: for each term, the best ts_rank_cd of a value
+        -- matching it, multiplied by hop_discount for every relation between
+        -- the value's resource and the item, summed over the terms.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_rank_collection_items_by_searchable_values(
+            search_terms TEXT[],
+            max_hops INTEGER DEFAULT 2,
+            hop_discount REAL DEFAULT 0.5
+        )
+        RETURNS TABLE(resourceinstance UUID, rank REAL) AS $$
+            WITH terms AS (
+                SELECT to_tsquery(term) AS query, position
+                FROM unnest(search_terms) WITH ORDINALITY AS t (term, position)
+            ),
+            matched AS (
+                SELECT
+                    terms.position,
+                    sv.resourceinstanceid,
+                    max(ts_rank_cd(sv.search_vector, terms.query)) AS rank
+                FROM terms
+                JOIN arches_search_terms sv ON terms.query @@ sv.search_vector
+                GROUP BY terms.position, sv.resourceinstanceid
+            ),
+            reached AS (
+                SELECT matched.position, r.resourceinstanceid, matched.rank
+                FROM matched
+                JOIN resource_instances r ON r.resourceinstanceid = matched.resourceinstanceid
+                WHERE r.graphid = '{settings.COLLECTIONS_GRAPHID}'
+                UNION ALL
+                SELECT
+                    matched.position,
+                    closure.collectionitemid,
+                    matched.rank * power(hop_discount, closure.hops)
+                FROM matched
+                JOIN rascolls_related_collection_item closure
+                    ON closure.resourceinstanceid = matched.resourceinstanceid
+                WHERE closure.hops <= max_hops
+            ),
+            term_ranks AS (
+                SELECT resourceinstanceid, position, max(rank) AS rank
+                FROM reached
+                GROUP BY resourceinstanceid, position
+            )
+            SELECT resourceinstanceid, sum(rank)::REAL
+            FROM term_ranks
+            GROUP BY resourceinstanceid
+            HAVING count(*) = cardinality(search_terms);
+        $$ LANGUAGE sql STABLE PARALLEL SAFE;
+    """
+
+    drop_ranked_search = """
+        DROP FUNCTION IF EXISTS __arches_rascolls_rank_collection_items_by_searchable_values(TEXT[], INTEGER, REAL);
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_ranked_search,
+            drop_ranked_search,
+        ),
+    ]
@@ -0,0 +1,112 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0019_ranked_term_search"),
+    ]
+
+    create_data_versions = f"""
+        CREATE SEQUENCE IF NOT EXISTS rascolls_map_data_version;
+        CREATE SEQUENCE IF NOT EXISTS rascolls_settings_data_version;
+
+        -- Advances the sequence named by the trigger's argument.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM nextval(TG_ARGV[0]::regclass);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_settings_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF (CASE WHEN TG_OP = 'DELETE' THEN OLD.resourceinstanceid ELSE NEW.resourceinstanceid END)
+                = '{settings.SYSTEM_SETTINGS_RESOURCE_ID}'
+            THEN
+                PERFORM nextval('rascolls_settings_data_version');
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Search result cards change with descriptors as well as tiles.
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_search_card_search_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON rascolls_search_card
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_search_data_version();
+
+        -- The map sources and layers, and who may read the layers.
+        DO $$
+        DECLARE
+            table_name TEXT;
+        BEGIN
+            FOREACH table_name IN ARRAY ARRAY[
+                'map_layers',
+                'map_sources',
+                'guardian_userobjectpermission',
+                'guardian_groupobjectpermission',
+                'auth_user_groups'
+            ]
+            LOOP
+                IF to_regclass(table_name) IS NOT NULL THEN
+                    EXECUTE format(
+                        'CREATE CONSTRAINT TRIGGER %I
+                            AFTER INSERT OR UPDATE OR DELETE ON %I
+                            DEFERRABLE INITIALLY DEFERRED
+                            FOR EACH ROW EXECUTE FUNCTION
+                                __arches_rascolls_bump_data_version(%L)',
+                        '__arches_rascolls_' || table_name || '_map_data_version',
+                        table_name,
+                        'rascolls_map_data_version'
+                    );
+                END IF;
+            END LOOP;
+        END $$;
+
+        -- System settings are saved as tiles of the system settings resource.
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_tiles_settings_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON tiles
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_settings_data_version();
+    """
+
+    drop_data_versions = """
+        DROP TRIGGER IF EXISTS __arches_rascolls_tiles_settings_data_version ON tiles;
+        DO $$
+        DECLARE
+            table_name TEXT;
+        BEGIN
+            FOREACH table_name IN ARRAY ARRAY[
+                'map_layers',
+                'map_sources',
+                'guardian_userobjectpermission',
+                'guardian_groupobjectpermission',
+                'auth_user_groups'
+            ]
+            LOOP
+                IF to_regclass(table_name) IS NOT NULL THEN
+                    EXECUTE format(
+                        'DROP TRIGGER IF EXISTS %I ON %I',
+                        '__arches_rascolls_' || table_name || '_map_data_version',
+                        table_name
+                    );
+                END IF;
+            END LOOP;
+        END $$;
+        DROP TRIGGER IF EXISTS __arches_rascolls_search_card_search_data_version ON rascolls_search_card;
+        DROP FUNCTION IF EXISTS __arches_rascolls_bump_settings_data_version();
+        DROP FUNCTION IF EXISTS __arches_rascolls_bump_data_version();
+        DROP SEQUENCE IF EXISTS rascolls_settings_data_version;
+        DROP SEQUENCE IF EXISTS rascolls_map_data_version;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_data_versions,
+            drop_data_versions,
+        ),
+    ]
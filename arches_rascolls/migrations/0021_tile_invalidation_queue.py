@@ -0,0 +1,66 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0020_response_data_versions"),
+    ]
+
+    create_tile_invalidation = f"""
+        -- The bounding boxes of collection map geometries that changed,
+        -- numbered as their transactions were about to commit. Each tile
+        -- cache remembers the version up to which it dropped the covering
+        -- tiles of every box, and is cleared instead when versions it hasn't
+        -- seen were purged from the queue. `created` is the clock time of the
+        -- insert, for telling a version not committed yet from one rolled back.
+        CREATE SEQUENCE IF NOT EXISTS rascolls_tile_data_version;
+        CREATE SEQUENCE IF NOT EXISTS rascolls_tile_purged_version MINVALUE 0 START 0;
+
+        CREATE TABLE IF NOT EXISTS rascolls_tile_invalidation (
+            version BIGINT PRIMARY KEY DEFAULT nextval('rascolls_tile_data_version'),
+            bbox GEOMETRY(Polygon, 3857) NOT NULL,
+            created TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+        );
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_queue_tile_invalidation()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' AND OLD.nodeid = '{settings.COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID}' THEN
+                INSERT INTO rascolls_tile_invalidation (bbox)
+                VALUES (ST_Envelope(ST_Expand(OLD.geom, 1)));
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.nodeid = '{settings.COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID}'
+                AND (TG_OP = 'INSERT' OR NOT ST_Equals(OLD.geom, NEW.geom))
+            THEN
+                INSERT INTO rascolls_tile_invalidation (bbox)
+                VALUES (ST_Envelope(ST_Expand(NEW.geom, 1)));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Deferred until commit, so versions are handed out close to commit
+        -- order. Close is not exact: a transaction can commit a version after
+        -- a later one is read, which refresh_tile_cache allows for.
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_geojson_geometries_tile_invalidation
+            AFTER INSERT OR UPDATE OR DELETE ON geojson_geometries
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_queue_tile_invalidation();
+    """
+
+    drop_tile_invalidation = """
+        DROP TRIGGER IF EXISTS __arches_rascolls_geojson_geometries_tile_invalidation ON geojson_geometries;
+        DROP FUNCTION IF EXISTS __arches_rascolls_queue_tile_invalidation();
+        DROP TABLE IF EXISTS rascolls_tile_invalidation;
+        DROP SEQUENCE IF EXISTS rascolls_tile_purged_version;
+        DROP SEQUENCE IF EXISTS rascolls_tile_data_version;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_tile_invalidation,
+            drop_tile_invalidation,
+        ),
+    ]
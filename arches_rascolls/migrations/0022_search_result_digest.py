@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0021_tile_invalidation_queue"),
+    ]
+
+    add_search_result_digest = """
+        -- Stored result sets are disposable, so drop them rather than hash them.
+        TRUNCATE rascolls_search_results;
+        ALTER TABLE rascolls_search_results ADD COLUMN digest TEXT NOT NULL;
+    """
+
+    drop_search_result_digest = """
+        ALTER TABLE rascolls_search_results DROP COLUMN digest;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            add_search_result_digest,
+            drop_search_result_digest,
+        ),
+    ]
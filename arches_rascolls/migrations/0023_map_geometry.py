@@ -0,0 +1,100 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0022_search_result_digest"),
+    ]
+
+    create_map_geometry = f"""
+        -- The production locations drawn on the collection map, with each
+        -- geometry also simplified for the zoom levels up to 11 and 14 and
+        -- reduced to a point for clustering, so tiles don't process
+        -- full-resolution geometries of other nodes on every request.
+        CREATE TABLE IF NOT EXISTS rascolls_map_geometry (
+            id INTEGER PRIMARY KEY,
+            resourceinstanceid UUID NOT NULL,
+            geom GEOMETRY(Geometry, 3857) NOT NULL,
+            geom_z11 GEOMETRY(Geometry, 3857),
+            geom_z14 GEOMETRY(Geometry, 3857),
+            point GEOMETRY(Point, 3857) NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS rascolls_map_geometry_geom_idx
+            ON rascolls_map_geometry USING GIST (geom);
+        CREATE INDEX IF NOT EXISTS rascolls_map_geometry_point_idx
+            ON rascolls_map_geometry USING GIST (point);
+        CREATE INDEX IF NOT EXISTS rascolls_map_geometry_resourceinstanceid_idx
+            ON rascolls_map_geometry (resourceinstanceid);
+
+        -- Simplified to the width of a tile unit at `zoom`, so the difference
+        -- can't be seen up to that zoom; NULL when that removes no vertices.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_simplify_for_zoom(
+            geom GEOMETRY, zoom INTEGER
+        )
+        RETURNS GEOMETRY AS $$
+            SELECT CASE WHEN ST_NPoints(simplified) < ST_NPoints(geom) THEN simplified END
+            FROM ST_SimplifyPreserveTopology(
+                geom, 2 * 20037508.342789244 / (4096 * 2 ^ zoom)
+            ) simplified;
+        $$ LANGUAGE sql IMMUTABLE;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_sync_map_geometry()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM rascolls_map_geometry WHERE id = OLD.id;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.nodeid = '{settings.COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID}' THEN
+                INSERT INTO rascolls_map_geometry
+                VALUES (
+                    NEW.id,
+                    NEW.resourceinstanceid,
+                    NEW.geom,
+                    __arches_rascolls_simplify_for_zoom(NEW.geom, 11),
+                    __arches_rascolls_simplify_for_zoom(NEW.geom, 14),
+                    ST_PointOnSurface(NEW.geom)
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER __arches_rascolls_geojson_geometries_map_geometry
+            AFTER INSERT OR UPDATE OR DELETE ON geojson_geometries
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_sync_map_geometry();
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_refresh_map_geometries()
+        RETURNS INTEGER AS $$
+            TRUNCATE rascolls_map_geometry;
+            INSERT INTO rascolls_map_geometry
+            SELECT
+                id,
+                resourceinstanceid,
+                geom,
+                __arches_rascolls_simplify_for_zoom(geom, 11),
+                __arches_rascolls_simplify_for_zoom(geom, 14),
+                ST_PointOnSurface(geom)
+            FROM geojson_geometries
+            WHERE nodeid = '{settings.COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID}';
+            SELECT count(*)::integer FROM rascolls_map_geometry;
+        $$ LANGUAGE sql;
+
+        SELECT __arches_rascolls_refresh_map_geometries();
+    """
+
+    drop_map_geometry = """
+        DROP TRIGGER IF EXISTS __arches_rascolls_geojson_geometries_map_geometry ON geojson_geometries;
+        DROP FUNCTION IF EXISTS __arches_rascolls_refresh_map_geometries();
+        DROP FUNCTION IF EXISTS __arches_rascolls_sync_map_geometry();
+        DROP FUNCTION IF EXISTS __arches_rascolls_simplify_for_zoom(GEOMETRY, INTEGER);
+        DROP TABLE IF EXISTS rascolls_map_geometry;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_map_geometry,
+            drop_map_geometry,
+        ),
+    ]
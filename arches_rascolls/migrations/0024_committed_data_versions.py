@@ -0,0 +1,178 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+# Tables whose writes change the map sources and layers a user can read.
+MAP_TABLES = [
+    "map_layers",
+    "map_sources",
+    "guardian_userobjectpermission",
+    "guardian_groupobjectpermission",
+    "auth_user_groups",
+]
+
+
+def recreate_map_triggers(argument):
+    return f"""
+        DO $$
+        DECLARE
+            table_name TEXT;
+        BEGIN
+            FOREACH table_name IN ARRAY ARRAY{MAP_TABLES}
+            LOOP
+                IF to_regclass(table_name) IS NOT NULL THEN
+                    EXECUTE format(
+                        'DROP TRIGGER IF EXISTS %I ON %I',
+                        '__arches_rascolls_' || table_name || '_map_data_version',
+                        table_name
+                    );
+                    EXECUTE format(
+                        'CREATE CONSTRAINT TRIGGER %I
+                            AFTER INSERT OR UPDATE OR DELETE ON %I
+                            DEFERRABLE INITIALLY DEFERRED
+                            FOR EACH ROW EXECUTE FUNCTION
+                                __arches_rascolls_bump_data_version(%L)',
+                        '__arches_rascolls_' || table_name || '_map_data_version',
+                        table_name,
+                        '{argument}'
+                    );
+                END IF;
+            END LOOP;
+        END $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0023_map_geometry"),
+    ]
+
+    create_committed_data_versions = f"""
+        -- Sequences advance as soon as nextval() runs, before the writing
+        -- transaction commits, so a search could read a new version, miss the
+        -- uncommitted data and cache its results under that version. A row
+        -- updated by the writing transaction only shows its new version once
+        -- the data is committed too, and updates to it are serialized.
+        CREATE TABLE IF NOT EXISTS rascolls_data_version (
+            scope TEXT PRIMARY KEY,
+            version BIGINT NOT NULL
+        );
+        INSERT INTO rascolls_data_version
+        SELECT 'search', last_value FROM rascolls_search_data_version
+        UNION ALL
+        SELECT 'suggestions', last_value FROM rascolls_search_suggestion_version
+        UNION ALL
+        SELECT 'map', last_value FROM rascolls_map_data_version
+        UNION ALL
+        SELECT 'settings', last_value FROM rascolls_settings_data_version
+        ON CONFLICT (scope) DO NOTHING;
+
+        -- Advances a scope's version once per transaction, however many rows
+        -- it writes.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_committed_version(
+            bumped_scope TEXT
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            IF current_setting('rascolls.bumped_' || bumped_scope, true)
+                IS DISTINCT FROM 'on'
+            THEN
+                UPDATE rascolls_data_version SET version = version + 1
+                WHERE scope = bumped_scope;
+                PERFORM set_config('rascolls.bumped_' || bumped_scope, 'on', true);
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_search_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM __arches_rascolls_bump_committed_version('search');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Advances the scope named by the trigger's argument.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM __arches_rascolls_bump_committed_version(TG_ARGV[0]);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_settings_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF (CASE WHEN TG_OP = 'DELETE' THEN OLD.resourceinstanceid ELSE NEW.resourceinstanceid END)
+                = '{settings.SYSTEM_SETTINGS_RESOURCE_ID}'
+            THEN
+                PERFORM __arches_rascolls_bump_committed_version('settings');
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        {recreate_map_triggers("map")}
+
+        DROP SEQUENCE IF EXISTS rascolls_search_data_version;
+        DROP SEQUENCE IF EXISTS rascolls_search_suggestion_version;
+        DROP SEQUENCE IF EXISTS rascolls_map_data_version;
+        DROP SEQUENCE IF EXISTS rascolls_settings_data_version;
+    """
+
+    drop_committed_data_versions = f"""
+        CREATE SEQUENCE IF NOT EXISTS rascolls_search_data_version;
+        CREATE SEQUENCE IF NOT EXISTS rascolls_search_suggestion_version;
+        CREATE SEQUENCE IF NOT EXISTS rascolls_map_data_version;
+        CREATE SEQUENCE IF NOT EXISTS rascolls_settings_data_version;
+        -- Continue past the committed versions so no version is reused.
+        SELECT setval(
+            'rascolls_' || CASE scope
+                WHEN 'suggestions' THEN 'search_suggestion_version'
+                ELSE scope || '_data_version'
+            END,
+            version + 1
+        )
+        FROM rascolls_data_version;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_search_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM nextval('rascolls_search_data_version');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM nextval(TG_ARGV[0]::regclass);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_settings_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF (CASE WHEN TG_OP = 'DELETE' THEN OLD.resourceinstanceid ELSE NEW.resourceinstanceid END)
+                = '{settings.SYSTEM_SETTINGS_RESOURCE_ID}'
+            THEN
+                PERFORM nextval('rascolls_settings_data_version');
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        {recreate_map_triggers("rascolls_map_data_version")}
+
+        DROP FUNCTION IF EXISTS __arches_rascolls_bump_committed_version(TEXT);
+        DROP TABLE IF EXISTS rascolls_data_version;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_committed_data_versions,
+            drop_committed_data_versions,
+        ),
+    ]
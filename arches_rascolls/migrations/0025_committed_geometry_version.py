@@ -0,0 +1,54 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+def queue_tile_invalidation(bump_version):
+    bump = ""
+    if bump_version:
+        bump = "\n                PERFORM __arches_rascolls_bump_committed_version('geometries');"
+    return f"""
+        CREATE OR REPLACE FUNCTION __arches_rascolls_queue_tile_invalidation()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' AND OLD.nodeid = '{settings.COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID}' THEN
+                INSERT INTO rascolls_tile_invalidation (bbox)
+                VALUES (ST_Envelope(ST_Expand(OLD.geom, 1)));{bump}
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.nodeid = '{settings.COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID}'
+                AND (TG_OP = 'INSERT' OR NOT ST_Equals(OLD.geom, NEW.geom))
+            THEN
+                INSERT INTO rascolls_tile_invalidation (bbox)
+                VALUES (ST_Envelope(ST_Expand(NEW.geom, 1)));{bump}
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0024_committed_data_versions"),
+    ]
+
+    # Search result tiles are cached under a version of the collection map
+    # geometries, which must not be readable before the geometries are.
+    create_geometry_version = f"""
+        INSERT INTO rascolls_data_version
+        SELECT 'geometries', last_value FROM rascolls_tile_data_version
+        ON CONFLICT (scope) DO NOTHING;
+        {queue_tile_invalidation(bump_version=True)}
+    """
+
+    drop_geometry_version = f"""
+        {queue_tile_invalidation(bump_version=False)}
+        DELETE FROM rascolls_data_version WHERE scope = 'geometries';
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_geometry_version,
+            drop_geometry_version,
+        ),
+    ]
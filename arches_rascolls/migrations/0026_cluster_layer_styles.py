@@ -0,0 +1,115 @@
+import copy
+
+from django.db import migrations
+
+REFERENCE_COLLECTIONS_LAYERID = "0c23d1a3-3e6a-4e72-b413-a2a6c46f828b"
+SEARCH_LAYERID = "0fd1ef37-f3c8-4e0a-85ce-173068173808"
+
+# Features of low zoom tiles stand for point_count geometries (see
+# render_collection_tile); single geometries have no point_count.
+POINT_COUNT = ["coalesce", ["get", "point_count"], 1]
+
+
+def get_radius(single_radius):
+    """Grow a circle from `single_radius` with the number of points."""
+    return [
+        "interpolate",
+        ["linear"],
+        POINT_COUNT,
+        1,
+        single_radius,
+        10,
+        single_radius + 4,
+        100,
+        single_radius + 9,
+        1000,
+        single_radius + 15,
+    ]
+
+
+def get_count_label(layer_prefix, source, color):
+    return {
+        "id": f"{layer_prefix}-cluster-count",
+        "type": "symbol",
+        "filter": [">", POINT_COUNT, 1],
+        "paint": {
+            "text-color": color,
+            "text-halo-color": "#fff",
+            "text-halo-width": 1.5,
+        },
+        "layout": {
+            "text-font": ["Open Sans Semibold", "Arial Unicode MS Bold"],
+            "text-size": 11,
+            "text-field": ["to-string", ["get", "point_count"]],
+            "text-allow-overlap": True,
+        },
+        "source": source,
+        "source-layer": source,
+    }
+
+
+SELECTED = ["boolean", ["feature-state", "selected"], False]
+
+# The paint of the point layers before and after clustering, by layer id.
+POINT_RADII = {
+    REFERENCE_COLLECTIONS_LAYERID: {
+        "referencecollections-point-stroke": (
+            ["case", SELECTED, 7, 6],
+            ["+", ["case", SELECTED, 2, 1], get_radius(5)],
+        ),
+        "referencecollections-point": (5, get_radius(5)),
+    },
+    SEARCH_LAYERID: {
+        "rascolls-search-point-stroke": (7, get_radius(7)),
+        "rascolls-search-point": (5, get_radius(5)),
+    },
+}
+
+COUNT_LABELS = {
+    REFERENCE_COLLECTIONS_LAYERID: get_count_label(
+        "referencecollections", "referencecollections", "#00f"
+    ),
+    SEARCH_LAYERID: get_count_label("rascolls-search", "rascolls-search", "#DE5C1B"),
+}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0025_committed_geometry_version"),
+    ]
+
+    def style_clusters(apps, schema_editor):
+        MapLayer = apps.get_model("models", "MapLayer")
+        for map_layer in MapLayer.objects.filter(maplayerid__in=POINT_RADII):
+            layerid = str(map_layer.maplayerid)
+            layerdefinitions = copy.deepcopy(map_layer.layerdefinitions)
+            for layer in layerdefinitions:
+                if layer["id"] in POINT_RADII[layerid]:
+                    _, radius = POINT_RADII[layerid][layer["id"]]
+                    layer["paint"]["circle-radius"] = radius
+            label = COUNT_LABELS[layerid]
+            if all(layer["id"] != label["id"] for layer in layerdefinitions):
+                layerdefinitions.append(label)
+            map_layer.layerdefinitions = layerdefinitions
+            map_layer.save()
+
+    def unstyle_clusters(apps, schema_editor):
+        MapLayer = apps.get_model("models", "MapLayer")
+        for map_layer in MapLayer.objects.filter(maplayerid__in=POINT_RADII):
+            layerid = str(map_layer.maplayerid)
+            layerdefinitions = [
+                layer
+                for layer in copy.deepcopy(map_layer.layerdefinitions)
+                if layer["id"] != COUNT_LABELS[layerid]["id"]
+            ]
+            for layer in layerdefinitions:
+                if layer["id"] in POINT_RADII[layerid]:
+                    radius, _ = POINT_RADII[layerid][layer["id"]]
+                    layer["paint"]["circle-radius"] = radius
+            map_layer.layerdefinitions = layerdefinitions
+            map_layer.save()
+
+    operations = [
+        migrations.RunPython(style_clusters, unstyle_clusters),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from arches_rascolls.search.advanced_search import rebuild_tiledata_index
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("arches_rascolls", "0026_cluster_layer_styles"),
+    ]
+
+    # Replaces the index of 0013, which covered the tiles of every graph, by
+    # one on the collections graph's nodegroups. Without the graph loaded yet
+    # no index is built; load_rascolls_data (or rebuild_tiledata_index) builds
+    # it once the graph is in.
+    def index_collection_tiles(apps, schema_editor):
+        rebuild_tiledata_index()
+
+    # Run one by one: a multi-statement query is a transaction block.
+    restore_tiledata_index = [
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS
+            rascolls_tiles_tiledata_path_ops_idx_new
+            ON tiles USING gin (tiledata jsonb_path_ops)""",
+        "DROP INDEX CONCURRENTLY IF EXISTS rascolls_tiles_tiledata_path_ops_idx",
+        """ALTER INDEX rascolls_tiles_tiledata_path_ops_idx_new
+            RENAME TO rascolls_tiles_tiledata_path_ops_idx""",
+    ]
+
+    operations = [
+        migrations.RunPython(index_collection_tiles, migrations.RunPython.noop),
+        migrations.RunSQL(migrations.RunSQL.noop, restore_tiledata_index),
+    ]
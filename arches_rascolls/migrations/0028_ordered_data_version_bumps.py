@@ -0,0 +1,93 @@
+from django.db import migrations
+from arches.app.models.system_settings import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("arches_rascolls", "0027_collection_tiledata_index"),
+    ]
+
+    create_ordered_bumps = f"""
+        -- A transaction bumping two scopes would otherwise lock their rows in
+        -- the order its writes were made, and deadlock with one locking them
+        -- the other way round. The first bump of a transaction locks every
+        -- row, always in scope order, so the bumps after it never wait.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_committed_version(
+            bumped_scope TEXT
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            IF current_setting('rascolls.bumped_' || bumped_scope, true)
+                IS DISTINCT FROM 'on'
+            THEN
+                IF current_setting('rascolls.locked_versions', true)
+                    IS DISTINCT FROM 'on'
+                THEN
+                    PERFORM 1 FROM rascolls_data_version ORDER BY scope FOR UPDATE;
+                    PERFORM set_config('rascolls.locked_versions', 'on', true);
+                END IF;
+                UPDATE rascolls_data_version SET version = version + 1
+                WHERE scope = bumped_scope;
+                PERFORM set_config('rascolls.bumped_' || bumped_scope, 'on', true);
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Tiles of other graphs only change search results through the
+        -- search terms, relations and search cards written with them, which
+        -- bump the version themselves. The tile of a resource deleted in the
+        -- same transaction can't be told apart, so it still bumps it.
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_tile_search_data_version()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF current_setting('rascolls.bumped_search', true) IS DISTINCT FROM 'on'
+                AND NOT EXISTS (
+                    SELECT 1 FROM resource_instances
+                    WHERE resourceinstanceid = (CASE WHEN TG_OP = 'DELETE' THEN OLD.resourceinstanceid ELSE NEW.resourceinstanceid END)
+                        AND graphid <> '{settings.COLLECTIONS_GRAPHID}'
+                )
+            THEN
+                PERFORM __arches_rascolls_bump_committed_version('search');
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS __arches_rascolls_tiles_search_data_version ON tiles;
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_tiles_search_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON tiles
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_tile_search_data_version();
+    """
+
+    drop_ordered_bumps = """
+        DROP TRIGGER IF EXISTS __arches_rascolls_tiles_search_data_version ON tiles;
+        CREATE CONSTRAINT TRIGGER __arches_rascolls_tiles_search_data_version
+            AFTER INSERT OR UPDATE OR DELETE ON tiles
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION __arches_rascolls_bump_search_data_version();
+        DROP FUNCTION IF EXISTS __arches_rascolls_bump_tile_search_data_version();
+
+        CREATE OR REPLACE FUNCTION __arches_rascolls_bump_committed_version(
+            bumped_scope TEXT
+        )
+        RETURNS VOID AS $$
+        BEGIN
+            IF current_setting('rascolls.bumped_' || bumped_scope, true)
+                IS DISTINCT FROM 'on'
+            THEN
+                UPDATE rascolls_data_version SET version = version + 1
+                WHERE scope = bumped_scope;
+                PERFORM set_config('rascolls.bumped_' || bumped_scope, 'on', true);
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """
+
+    operations = [
+        migrations.RunSQL(
+            create_ordered_bumps,
+            drop_ordered_bumps,
+        ),
+    ]
@@ -0,0 +1,259 @@
+"""Compile the `advanced-search` filter JSON into SQL.
+
+A filter is either a group or a list of groups. Groups combine their node
+conditions and nested `filters` with their `op`:
+
+    {"op": "and" | "or" | "not",
+     "<nodeid or node alias>": {"op": "eq", "val": ...},
+     "filters": [<filter>, ...]}
+
+`not` negates the conjunction of its members. In a list, each group is
+combined with everything before it using its own op, which is the format
+the search facets send:
+
+    [{"op": "and", "<nodeid>": {"op": "eq", "val": "<list item id>"}},
+     {"op": "or", "<nodeid>": {"op": "eq", "val": "<list item id>"}}]
+
+Conditions are evaluated per resource: each one selects the resources with
+a tile in the node's nodegroup whose value satisfies it. Equality is
+expressed as `tiledata @> ...` containment so it can use the GIN
+jsonb_path_ops index on the tiles of the collections graph's nodegroups,
+which rebuild_tiledata_index() keeps in step with the graph.
+"""
+
+import json
+import uuid
+
+from django.db import connection
+
+from arches.app.models.models import Node
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.utils.node_lookup import (
+    get_node_alias,
+    get_node_datatype,
+    get_node_id,
+    get_nodegroup_id,
+)
+
+GROUP_OPERATORS = {"and", "or", "not"}
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+LOCALIZED_STRING_DATATYPES = {"string", "url"}
+LIST_DATATYPES = {
+    "concept-list",
+    "domain-value-list",
+    "reference",
+    "resource-instance",
+    "resource-instance-list",
+}
+
+
+class AdvancedSearchError(ValueError):
+    """Raised when an advanced search filter cannot be compiled."""
+
+
+class AdvancedSearchCompiler:
+    def __init__(self, graph_slug=None):
+        self.graph_slug = graph_slug or settings.COLLECTIONS_GRAPH_SLUG
+
+    def compile(self, advanced_search_filter):
+        """Return (sql, params) for a boolean expression over the
+        resourceinstanceid of `ri`, or None if the filter is empty."""
+        return self.compile_filter(advanced_search_filter)
+
+    def compile_filter(self, filter):
+        if isinstance(filter, list):
+            return self.compile_filter_list(filter)
+        if not isinstance(filter, dict):
+            raise AdvancedSearchError(f"Invalid filter: {filter!r}")
+
+        op = filter.get("op", "and")
+        if op not in GROUP_OPERATORS:
+            raise AdvancedSearchError(f"Unsupported filter operator: {op!r}")
+        members = [
+            self.compile_filter(nested) for nested in filter.get("filters", [])
+        ] + [
+            self.compile_condition(node_key, condition)
+            for node_key, condition in filter.items()
+            if node_key not in ("op", "filters")
+        ]
+        members = [member for member in members if member is not None]
+        if not members:
+            return None
+        if op == "not":
+            sql, params = self.combine("AND", members)
+            return f"NOT ({sql})", params
+        return self.combine(op.upper(), members)
+
+    def compile_filter_list(self, filters):
+        compiled = None
+        for filter in filters:
+            member = self.compile_filter(filter)
+            if member is None:
+                continue
+            if compiled is None:
+                compiled = member
+            else:
+                # A negated group narrows what came before it, and a nested
+                # list is joined like an "and" group.
+                is_or = isinstance(filter, dict) and filter.get("op") == "or"
+                operator = "OR" if is_or else "AND"
+                compiled = self.combine(operator, [compiled, member])
+        return compiled
+
+    @staticmethod
+    def combine(operator, members):
+        if len(members) == 1:
+            return members[0]
+        return (
+            "(" + f" {operator} ".join(sql for sql, _ in members) + ")",
+            [param for _, params in members for param in params],
+        )
+
+    def compile_condition(self, node_key, condition):
+        if not isinstance(condition, dict) or "op" not in condition:
+            raise AdvancedSearchError(f"Invalid condition for {node_key!r}")
+        alias = self.resolve_node_alias(node_key)
+        nodeid = get_node_id(self.graph_slug, alias)
+        datatype = get_node_datatype(self.graph_slug, alias)
+        op = condition["op"]
+        value = condition.get("val")
+
+        if op == "eq":
+            predicate, params = self.compile_equals(nodeid, datatype, value)
+        elif op == "in":
+            if not isinstance(value, list) or not value:
+                raise AdvancedSearchError(f"'in' needs a list of values: {node_key!r}")
+            predicate, params = self.combine(
+                "OR",
+                [self.compile_equals(nodeid, datatype, item) for item in value],
+            )
+        elif op == "contains":
+            predicate, params = self.compile_contains(nodeid, datatype, value)
+        elif op in RANGE_OPERATORS:
+            predicate, params = self.compile_comparison(
+                nodeid, datatype, RANGE_OPERATORS[op], value
+            )
+        elif op == "range":
+            if not isinstance(value, list) or len(value) != 2:
+                raise AdvancedSearchError(f"'range' needs [low, high]: {node_key!r}")
+            predicate, params = self.combine(
+                "AND",
+                [
+                    self.compile_comparison(nodeid, datatype, ">=", value[0]),
+                    self.compile_comparison(nodeid, datatype, "<=", value[1]),
+                ],
+            )
+        else:
+            raise AdvancedSearchError(f"Unsupported condition operator: {op!r}")
+
+        return (
+            f"""ri.resourceinstanceid IN (
+                SELECT t.resourceinstanceid FROM tiles t
+                WHERE t.nodegroupid = %s AND {predicate}
+            )""",
+            [get_nodegroup_id(self.graph_slug, alias), *params],
+        )
+
+    def resolve_node_alias(self, node_key):
+        try:
+            nodeid = uuid.UUID(node_key)
+        except ValueError:
+            nodeid = None
+        try:
+            if nodeid:
+                return get_node_alias(self.graph_slug, nodeid)
+            # Check that the alias belongs to a node of the graph.
+            get_node_id(self.graph_slug, node_key)
+            return node_key
+        except Node.DoesNotExist:
+            raise AdvancedSearchError(f"Unknown node: {node_key!r}")
+
+    def compile_equals(self, nodeid, datatype, value):
+        if datatype in LOCALIZED_STRING_DATATYPES:
+            # Match the value in any language.
+            return (
+                """jsonb_path_exists(
+                    t.tiledata -> %s,
+                    '$.*.value ? (@ == $val)',
+                    jsonb_build_object('val', %s::text)
+                )""",
+                [nodeid, value],
+            )
+        if datatype == "reference":
+            if str(value).startswith("http"):
+                document = [{"uri": value}]
+            else:
+                document = [{"labels": [{"list_item_id": value}]}]
+        elif datatype in ("resource-instance", "resource-instance-list"):
+            document = [{"resourceId": value}]
+        elif datatype in LIST_DATATYPES:
+            document = [value]
+        else:
+            document = value
+        return "t.tiledata @> %s::jsonb", [json.dumps({nodeid: document})]
+
+    def compile_contains(self, nodeid, datatype, value):
+        if datatype in LIST_DATATYPES:
+            return self.compile_equals(nodeid, datatype, value)
+        pattern = "%{}%".format(
+            str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        )
+        if datatype in LOCALIZED_STRING_DATATYPES:
+            return (
+                """EXISTS (
+                    SELECT 1 FROM jsonb_each(t.tiledata -> %s) localized
+                    WHERE localized.value ->> 'value' ILIKE %s
+                )""",
+                [nodeid, pattern],
+            )
+        return "t.tiledata ->> %s ILIKE %s", [nodeid, pattern]
+
+    def compile_comparison(self, nodeid, datatype, operator, value):
+        if datatype == "number":
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise AdvancedSearchError(f"Not a number: {value!r}")
+            return (
+                f"""(CASE WHEN jsonb_typeof(t.tiledata -> %s) = 'number'
+                    THEN (t.tiledata ->> %s)::numeric END) {operator} %s""",
+                [nodeid, nodeid, value],
+            )
+        if datatype in ("date", "non-localized-string"):
+            # ISO dates order the same as text.
+            return f"t.tiledata ->> %s {operator} %s", [nodeid, str(value)]
+        raise AdvancedSearchError(f"Range conditions aren't supported for {datatype}")
+
+
+TILEDATA_INDEX = "rascolls_tiles_tiledata_path_ops_idx"
+
+
+def rebuild_tiledata_index():
+    """Recreate the index on the tiles of the collections graph's current
+    nodegroups. Conditions name their nodegroup as a literal (parameters
+    are bound client-side), so Postgres can tell the index covers them.
+    Tiles of other graphs are left out, so writing them costs nothing
+    extra. Builds CONCURRENTLY, so it must run outside a transaction.
+    Returns the number of nodegroups indexed."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """SELECT DISTINCT nodegroupid FROM nodes
+            WHERE graphid = %s AND nodegroupid IS NOT NULL
+            ORDER BY nodegroupid""",
+            [settings.COLLECTIONS_GRAPHID],
+        )
+        nodegroupids = [str(uuid.UUID(str(row[0]))) for row in cursor.fetchall()]
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {TILEDATA_INDEX}_new")
+        if nodegroupids:
+            cursor.execute(
+                f"""CREATE INDEX CONCURRENTLY {TILEDATA_INDEX}_new
+                ON tiles USING gin (tiledata jsonb_path_ops)
+                WHERE nodegroupid IN ({", ".join(f"'{id}'" for id in nodegroupids)})"""
+            )
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {TILEDATA_INDEX}")
+        if nodegroupids:
+            cursor.execute(
+                f"ALTER INDEX {TILEDATA_INDEX}_new RENAME TO {TILEDATA_INDEX}"
+            )
+    return len(nodegroupids)
@@ -0,0 +1,72 @@
+"""Rebuild the rascolls_related_collection_item closure table.
+
+Triggers on resource_x_resource keep the closure current as relations are
+written (migration 0017); a full rebuild is only needed after loading
+relations with triggers disabled. Resources are refreshed in batches by a
+pool of worker threads, each with its own database connection, while the
+table stays readable: rows are replaced per batch rather than truncated.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+
+from arches.app.models.system_settings import settings
+
+
+def get_closure_sources():
+    """Return the ids of every resource outside the collections graph that
+    has relations, i.e. that can have closure rows."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT ri.resourceinstanceid
+            FROM resource_instances ri
+            WHERE ri.graphid <> %s
+                AND EXISTS (
+                    SELECT 1 FROM rascolls_related_resource related
+                    WHERE related.resourceinstanceid = ri.resourceinstanceid
+                )
+            """,
+            [settings.COLLECTIONS_GRAPHID],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def refresh_related_closure(resourceids):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT __arches_rascolls_refresh_related_closure(%s::uuid[])",
+                [resourceids],
+            )
+    finally:
+        # Worker threads don't go through the request cycle that would
+        # otherwise close their connections.
+        connections.close_all()
+    return len(resourceids)
+
+
+def rebuild_related_closure(workers=4, batch_size=500):
+    """Recompute the closure of every resource and remove the rows of
+    resources that no longer have relations. Returns the number of
+    resources refreshed."""
+    sources = get_closure_sources()
+    batches = [
+        sources[start : start + batch_size]
+        for start in range(0, len(sources), batch_size)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        refreshed = sum(executor.map(refresh_related_closure, batches))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM rascolls_related_collection_item closure
+            WHERE NOT EXISTS (
+                SELECT 1 FROM rascolls_related_resource related
+                WHERE related.resourceinstanceid = closure.resourceinstanceid
+            )
+            """
+        )
+    return refreshed
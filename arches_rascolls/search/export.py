@@ -0,0 +1,133 @@
+"""Stream every result of a search as CSV, NDJSON or GeoJSON.
+
+Rows are read through a named server-side cursor in fixed-size batches and
+written out as they arrive, so an export starts sending immediately and
+its memory use doesn't depend on the number of results.
+"""
+
+import csv
+import json
+
+from django.db import connection, transaction
+from django.utils.translation import get_language
+
+from arches.app.models.system_settings import settings
+
+EXPORT_COLUMNS = [
+    "resourceinstanceid",
+    "displayname",
+    "displaydescription",
+    "currentlocation",
+]
+GEOMETRY_MODES = {"centroid", "full", "none"}
+
+
+class Echo:
+    """File-like object whose write() returns what it was given, so that
+    csv.writer can be used to format rows one at a time."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(planner, geometry="centroid", batch_size=None):
+    """Yield a dict per search result, in surrogate id order, with
+    `longitude` and `latitude` (centroid) or a GeoJSON `geometry` (full)."""
+    batch_size = batch_size or settings.SEARCH_EXPORT_BATCH_SIZE
+    matches_sql, params = planner.get_matches_sql()
+    if geometry == "full":
+        geometry_sql = """(
+            SELECT ST_AsGeoJSON(ST_Transform(ST_Collect(gg.geom), 4326))
+            FROM geojson_geometries gg
+            WHERE gg.resourceinstanceid = matches.resourceinstanceid
+        )"""
+    else:
+        geometry_sql = "ST_X(card.centroid), ST_Y(card.centroid)"
+
+    # Outside a transaction Django declares the cursor WITH HOLD, which makes
+    # Postgres compute every row before returning the first.
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH matches AS (
+                {matches_sql}
+            )
+            SELECT
+                matches.resourceinstanceid,
+                card.displayname,
+                card.displaydescription,
+                card.currentlocation,
+                {geometry_sql}
+            FROM matches
+            LEFT JOIN rascolls_search_card card
+                ON card.resourceinstanceid = matches.resourceinstanceid
+                AND card.language = %s
+            ORDER BY matches.surrogateid
+            """,
+            [*params, get_language()],
+        )
+        while rows := cursor.fetchmany(batch_size):
+            for row in rows:
+                result = dict(zip(EXPORT_COLUMNS, row))
+                result["resourceinstanceid"] = str(result["resourceinstanceid"])
+                if geometry == "full":
+                    result["geometry"] = json.loads(row[4]) if row[4] else None
+                elif geometry == "centroid":
+                    result["longitude"], result["latitude"] = row[4:6]
+                yield result
+
+
+def stream_csv(rows, geometry="centroid"):
+    columns = (
+        EXPORT_COLUMNS
+        + {
+            "centroid": ["longitude", "latitude"],
+            "full": ["geometry"],
+            "none": [],
+        }[geometry]
+    )
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        if geometry == "full" and row["geometry"] is not None:
+            row["geometry"] = json.dumps(row["geometry"])
+        yield writer.writerow([row[column] for column in columns])
+
+
+def stream_ndjson(rows, geometry="centroid"):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def stream_geojson(rows, geometry="centroid"):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for row in rows:
+        if geometry == "full":
+            feature_geometry = row.pop("geometry")
+        elif geometry == "centroid" and row["longitude"] is not None:
+            feature_geometry = {
+                "type": "Point",
+                "coordinates": [row.pop("longitude"), row.pop("latitude")],
+            }
+        else:
+            feature_geometry = None
+            row.pop("longitude", None)
+            row.pop("latitude", None)
+        feature = {
+            "type": "Feature",
+            "id": row["resourceinstanceid"],
+            "geometry": feature_geometry,
+            "properties": row,
+        }
+        yield separator + json.dumps(feature)
+        separator = ","
+    yield "]}"
+
+
+EXPORT_FORMATS = {
+    # format: (writer, content type, file extension)
+    "csv": (stream_csv, "text/csv", "csv"),
+    "ndjson": (stream_ndjson, "application/x-ndjson", "ndjson"),
+    "geojson": (stream_geojson, "application/geo+json", "geojson"),
+}
@@ -0,0 +1,129 @@
+"""Count the values of collection item nodes across a search's results.
+
+Every facet is counted in one grouped aggregate over the tiles of the
+matching resources, so the facets of a search cost a single query however
+many nodes and values there are. Counts are of resources, not tiles.
+"""
+
+from django.db import connection
+from django.utils.translation import get_language
+
+from arches.app.models.models import Node
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.utils.node_lookup import (
+    get_node_datatype,
+    get_node_id,
+    get_nodegroup_id,
+)
+
+SCALAR_DATATYPES = {
+    "boolean",
+    "concept",
+    "date",
+    "domain-value",
+    "non-localized-string",
+    "number",
+}
+
+
+class FacetError(ValueError):
+    """Raised when a facet can't be counted for a node."""
+
+
+class FacetCounter:
+    def __init__(self, node_aliases, graph_slug=None):
+        self.node_aliases = list(node_aliases)
+        self.graph_slug = graph_slug or settings.COLLECTIONS_GRAPH_SLUG
+
+    def get_counts(self, planner):
+        """Return {alias: [{"value", "label", "count"}, ...]} for the
+        resources matching `planner`, most frequent values first."""
+        counts = {alias: [] for alias in self.node_aliases}
+        if not self.node_aliases:
+            return counts
+        sql, params = self.get_sql(planner)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for alias, value, label, count in cursor.fetchall():
+                counts[alias].append({"value": value, "label": label, "count": count})
+        return counts
+
+    def get_sql(self, planner):
+        matches_sql, matches_params = planner.get_matches_sql()
+        values_sql, values_params = [], []
+        for alias in self.node_aliases:
+            sql, params = self.get_values_sql(alias)
+            values_sql.append(sql)
+            values_params.extend(params)
+        nodegroupids = sorted(
+            {get_nodegroup_id(self.graph_slug, alias) for alias in self.node_aliases}
+        )
+        return (
+            f"""
+            WITH matches AS MATERIALIZED (
+                {matches_sql}
+            )
+            SELECT facet.alias, facet.value, max(facet.label), count(DISTINCT t.resourceinstanceid)
+            FROM matches m
+            JOIN tiles t ON t.resourceinstanceid = m.resourceinstanceid
+            CROSS JOIN LATERAL (
+                {" UNION ALL ".join(values_sql)}
+            ) facet (alias, value, label)
+            WHERE t.nodegroupid = ANY(%s::uuid[]) AND facet.value IS NOT NULL
+            GROUP BY facet.alias, facet.value
+            ORDER BY facet.alias, 4 DESC, facet.value
+            """,
+            [*matches_params, *values_params, nodegroupids],
+        )
+
+    def get_values_sql(self, alias):
+        """Return (sql, params) selecting (alias, value, label) rows for the
+        node from the tile `t`. Values are those advanced search `eq`
+        conditions on the node accept."""
+        try:
+            nodeid = get_node_id(self.graph_slug, alias)
+        except Node.DoesNotExist:
+            raise FacetError(f"Unknown node: {alias!r}")
+        nodegroupid = get_nodegroup_id(self.graph_slug, alias)
+        datatype = get_node_datatype(self.graph_slug, alias)
+
+        if datatype == "semantic":
+            # Nothing to group by: count the resources having the nodegroup.
+            return (
+                "SELECT %s, 'true', NULL WHERE t.nodegroupid = %s",
+                [alias, nodegroupid],
+            )
+        if datatype in SCALAR_DATATYPES:
+            return (
+                "SELECT %s, t.tiledata ->> %s, NULL WHERE t.nodegroupid = %s",
+                [alias, nodeid, nodegroupid],
+            )
+
+        items = """jsonb_array_elements(
+            CASE WHEN jsonb_typeof(t.tiledata -> %s) = 'array'
+            THEN t.tiledata -> %s ELSE '[]'::jsonb END
+        ) item"""
+        if datatype == "reference":
+            # Prefer the preferred label in the active language.
+            return (
+                f"""SELECT %s, item -> 'labels' -> 0 ->> 'list_item_id', (
+                    SELECT label ->> 'value'
+                    FROM jsonb_array_elements(item -> 'labels') label
+                    ORDER BY label ->> 'language_id' = %s DESC,
+                        label ->> 'valuetype_id' = 'prefLabel' DESC
+                    LIMIT 1
+                ) FROM {items} WHERE t.nodegroupid = %s""",
+                [alias, get_language(), nodeid, nodeid, nodegroupid],
+            )
+        if datatype in ("resource-instance", "resource-instance-list"):
+            return (
+                f"SELECT %s, item ->> 'resourceId', NULL FROM {items} WHERE t.nodegroupid = %s",
+                [alias, nodeid, nodeid, nodegroupid],
+            )
+        if datatype in ("concept-list", "domain-value-list"):
+            return (
+                f"SELECT %s, item #>> '{{}}', NULL FROM {items} WHERE t.nodegroupid = %s",
+                [alias, nodeid, nodeid, nodegroupid],
+            )
+        raise FacetError(f"Facets aren't supported for {datatype} nodes: {alias!r}")
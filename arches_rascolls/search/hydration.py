@@ -0,0 +1,216 @@
+"""Build the search result cards for a page of resource ids.
+
+Cards are read from the `rascolls_search_card` table, which triggers keep
+current as tiles, relations and geometries are saved. Resources without a
+card (e.g. loaded with triggers disabled and not yet rebuilt) are built
+from the source tables instead. Either way every field is fetched for the
+whole page at once, so hydrating a page costs the same fixed number of
+queries regardless of its size, and fields that weren't requested aren't
+fetched at all.
+"""
+
+import json
+import uuid
+
+from django.contrib.gis.db.models.aggregates import Union
+from django.contrib.gis.db.models.functions import Centroid, Transform
+from django.db import connection
+from django.db.models.fields.json import KT
+from django.utils.translation import get_language
+
+from arches.app.models.models import (
+    GeoJSONGeometry,
+    ResourceInstance,
+    ResourceXResource,
+    TileModel,
+)
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.utils.node_lookup import get_node_id, get_nodegroup_id
+
+CARD_FIELDS = (
+    "currentlocation",
+    "resourceinstanceid",
+    "displayname",
+    "displaydescription",
+    "displayname_language",
+    "has_geom",
+    "centroid",
+)
+# The fields of each `fields` mode of /api-search that hydrates cards.
+FIELD_SETS = {
+    "summary": frozenset(
+        [
+            "resourceinstanceid",
+            "displayname",
+            "displaydescription",
+            "displayname_language",
+        ]
+    ),
+    "full": frozenset(CARD_FIELDS),
+}
+# rascolls_search_card columns read for each field.
+CARD_COLUMNS = {
+    "currentlocation": "currentlocation",
+    "displayname": "displayname",
+    "displaydescription": "displaydescription",
+    "has_geom": "has_geom",
+    "centroid": "ARRAY[ST_X(centroid), ST_Y(centroid)]",
+}
+
+
+def get_search_results_by_resourceids(resourceids, fields=FIELD_SETS["full"]):
+    """Return search result cards with the given fields for the given
+    resources, in the given order. Resources that no longer exist are
+    skipped."""
+    resourceids = [uuid.UUID(str(resourceid)) for resourceid in resourceids]
+    if not resourceids:
+        return []
+
+    lang = get_language()
+    cards = get_search_cards(resourceids, lang, fields)
+    missing = [resourceid for resourceid in resourceids if resourceid not in cards]
+    if missing:
+        cards.update(build_search_cards(missing, lang, fields))
+    return [cards[resourceid] for resourceid in resourceids if resourceid in cards]
+
+
+def make_card(values, lang, fields):
+    """Return the requested fields of a card, in CARD_FIELDS order. Cards
+    without geometries have no centroid."""
+    values["displayname_language"] = lang
+    if not values.get("has_geom"):
+        values.pop("centroid", None)
+    return {
+        field: values[field]
+        for field in CARD_FIELDS
+        if field in fields and field in values
+    }
+
+
+def get_search_cards(resourceids, lang, fields=FIELD_SETS["full"]):
+    """Map each resource to its stored card in `lang`."""
+    selected = [field for field in CARD_COLUMNS if field in fields]
+    if "centroid" in selected and "has_geom" not in selected:
+        selected.append("has_geom")
+    columns = "".join(f", {CARD_COLUMNS[field]}" for field in selected)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT resourceinstanceid{columns}
+            FROM rascolls_search_card
+            WHERE resourceinstanceid = ANY(%s::uuid[]) AND language = %s
+            """,
+            [resourceids, lang],
+        )
+        rows = cursor.fetchall()
+
+    cards = {}
+    for resourceid, *row in rows:
+        values = dict(zip(selected, row), resourceinstanceid=resourceid)
+        if values.get("centroid") is not None:
+            values["centroid"] = tuple(values["centroid"])
+        cards[resourceid] = make_card(values, lang, fields)
+    return cards
+
+
+def build_search_cards(resourceids, lang, fields=FIELD_SETS["full"]):
+    """Map each resource to a card in `lang` built from the source tables."""
+    descriptors = dict(
+        ResourceInstance.objects.filter(pk__in=resourceids).values_list(
+            "resourceinstanceid", "descriptors"
+        )
+    )
+    places = statements = centroids = {}
+    if "currentlocation" in fields:
+        places = get_current_location_places(resourceids)
+        statements = get_current_location_statements(resourceids)
+    if "has_geom" in fields or "centroid" in fields:
+        centroids = get_centroids(resourceids)
+
+    cards = {}
+    for resourceid, descriptor in descriptors.items():
+        current_location = [places.get(resourceid), statements.get(resourceid)]
+        values = {
+            "currentlocation": " | ".join(
+                [str(value) for value in current_location if value is not None]
+            ),
+            "resourceinstanceid": resourceid,
+            "displayname": descriptor[lang]["name"],
+            "displaydescription": descriptor[lang]["description"],
+            "has_geom": resourceid in centroids,
+            "centroid": centroids.get(resourceid),
+        }
+        cards[resourceid] = make_card(values, lang, fields)
+    return cards
+
+
+def rebuild_search_cards(resourceids=None, batch_size=1000):
+    """Recompute the stored cards of the given collection items, or of all
+    of them. Returns the number of resources processed."""
+    if resourceids is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT resourceinstanceid FROM resource_instances WHERE graphid = %s",
+                [settings.COLLECTIONS_GRAPHID],
+            )
+            resourceids = [row[0] for row in cursor.fetchall()]
+    resourceids = list(resourceids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(resourceids), batch_size):
+            cursor.execute(
+                "SELECT __arches_rascolls_refresh_search_cards(%s::uuid[])",
+                [resourceids[start : start + batch_size]],
+            )
+    return len(resourceids)
+
+
+def get_current_location_places(resourceids):
+    """Map each resource to the name of its current location, if any."""
+    places = {}
+    for resourceid, name in ResourceXResource.objects.filter(
+        from_resource_id__in=resourceids,
+        node_id=get_node_id(settings.COLLECTIONS_GRAPH_SLUG, "current_location"),
+        to_resource__isnull=False,
+    ).values_list("from_resource_id", "to_resource__name"):
+        places.setdefault(resourceid, name)
+    return places
+
+
+def get_current_location_statements(resourceids):
+    """Map each resource to its (English) current location statement."""
+    statement_node_id = get_node_id(
+        settings.COLLECTIONS_GRAPH_SLUG, "current_location_statement_content"
+    )
+    statements = {}
+    for resourceid, statement_value in (
+        TileModel.objects.filter(
+            resourceinstance_id__in=resourceids,
+            nodegroup_id=get_nodegroup_id(
+                settings.COLLECTIONS_GRAPH_SLUG, "current_location_statement"
+            ),
+        )
+        .annotate(location_description=KT(f"data__{statement_node_id}"))
+        .values_list("resourceinstance_id", "location_description")
+    ):
+        if resourceid in statements:
+            continue
+        try:
+            statements[resourceid] = json.loads(statement_value)["en"]["value"]
+        except (KeyError, TypeError):
+            pass
+    return statements
+
+
+def get_centroids(resourceids):
+    """Map each resource with geometries to the [lon, lat] of their
+    combined centroid."""
+    return {
+        resourceid: centroid.coords
+        for resourceid, centroid in GeoJSONGeometry.objects.filter(
+            resourceinstance_id__in=resourceids
+        )
+        .values("resourceinstance_id")
+        .annotate(centroid=Transform(Centroid(Union("geom")), 4326))
+        .values_list("resourceinstance_id", "centroid")
+    }
@@ -0,0 +1,28 @@
+import base64
+import binascii
+import json
+
+
+class InvalidCursor(ValueError):
+    """Raised when a paging cursor token cannot be decoded."""
+
+
+def encode_cursor(sort_key):
+    """Encode the sort key of the last row on a page as an opaque token.
+
+    The token is handed back by the client as `paging-cursor` to request the
+    rows that sort after it, so it only needs to round-trip through a URL.
+    """
+    payload = json.dumps(list(sort_key), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the sort key encoded in a token produced by encode_cursor()."""
+    try:
+        sort_key = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(token) from e
+    if not isinstance(sort_key, list) or not sort_key:
+        raise InvalidCursor(token)
+    return sort_key
@@ -0,0 +1,308 @@
+"""Compose the search filters into SQL run in a single statement.
+
+Term, spatial and advanced filters each become a semi-join predicate on
+resource_instances, so Postgres chooses which filter to drive the search
+from and only the requested page of ids (plus the total) comes back.
+
+With SEARCH_STAGE_WORKERS set, full result sets of searches combining
+several filters are instead computed one filter per statement, on a bounded
+pool of threads with their own connections, and intersected in Python, so a
+combined search takes about as long as its slowest filter. The worker
+connections don't see writes the request hasn't committed.
+"""
+
+import json
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.db import close_old_connections, connection
+
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.search.advanced_search import AdvancedSearchCompiler
+from arches_rascolls.search.result_set import ResultSet
+from arches_rascolls.utils.geo_utils import GeoUtils
+from arches_rascolls.utils.node_lookup import get_node_id
+
+_stage_executor = None
+_stage_executor_lock = threading.Lock()
+
+
+def get_stage_executor():
+    """Return the thread pool shared by every request's filter stages, so
+    the number of extra connections stays bounded."""
+    global _stage_executor
+    with _stage_executor_lock:
+        if _stage_executor is None:
+            _stage_executor = ThreadPoolExecutor(
+                max_workers=settings.SEARCH_STAGE_WORKERS,
+                thread_name_prefix="search-stage",
+            )
+        return _stage_executor
+
+
+class SearchPlanner:
+    def __init__(self, terms=None, map_filter=None, advanced_search_filter=None):
+        self.terms = terms
+        self.map_filter = map_filter or []
+        self.advanced_search_filter = advanced_search_filter or []
+        # Compiled up front so that invalid filters fail before any query.
+        self.advanced_search_predicate = AdvancedSearchCompiler().compile(
+            self.advanced_search_filter
+        )
+
+    @property
+    def is_filtered(self):
+        return bool(
+            self.terms is not None or self.map_filter or self.advanced_search_filter
+        )
+
+    @property
+    def is_ranked(self):
+        """Whether results are ordered by relevance rather than surrogateid.
+        Ranks come from the closure table, so only for up to two hops."""
+        return self.terms is not None and settings.SEARCH_TERM_MAX_HOPS <= 2
+
+    def get_matches_sql(self):
+        """Return (sql, params) selecting the surrogateid and
+        resourceinstanceid of every matching collection item, with
+        resource_instances aliased `ri`, and no ORDER BY."""
+        conditions = ["ri.graphid = %s"]
+        params = [settings.COLLECTIONS_GRAPHID]
+        for predicate_sql, predicate_params in self.get_predicates():
+            conditions.append(predicate_sql)
+            params.extend(predicate_params)
+        sql = """SELECT s.surrogateid, ri.resourceinstanceid
+            FROM resource_instances ri
+            JOIN rascolls_search_surrogate s
+                ON s.resourceinstanceid = ri.resourceinstanceid
+            WHERE """ + "\n AND ".join(
+            conditions
+        )
+        return sql, params
+
+    def get_predicates(self):
+        """Return the (sql, params) predicate of each filter in use."""
+        predicates = [
+            predicate()
+            for predicate in (
+                self.get_term_predicate,
+                self.get_spatial_predicate,
+                self.get_advanced_search_predicate,
+            )
+        ]
+        return [predicate for predicate in predicates if predicate is not None]
+
+    def get_term_predicate(self):
+        if self.terms is None:
+            return None
+        if settings.SEARCH_TERM_MAX_HOPS <= 2:
+            # Paths of up to two relations are precomputed (migration 0017).
+            return (
+                """ri.resourceinstanceid IN (
+                    SELECT resourceinstance
+                    FROM __arches_rascolls_get_collection_items_by_searchable_values(
+                        %s::text[], %s
+                    )
+                )""",
+                [self.terms, settings.SEARCH_TERM_MAX_HOPS],
+            )
+        return (
+            """ri.resourceinstanceid IN (
+                SELECT resourceinstance
+                FROM __arches_rascolls_get_related_resources_by_searchable_values(
+                    %s::text[], %s::uuid, %s
+                )
+            )""",
+            [self.terms, settings.COLLECTIONS_GRAPHID, settings.SEARCH_TERM_MAX_HOPS],
+        )
+
+    def get_spatial_predicate(self):
+        if not self.map_filter:
+            return None
+        geo_utils = GeoUtils()
+        geometries = []
+        for feature in self.map_filter:
+            raw_geom = GEOSGeometry(json.dumps(feature["geometry"]), srid=4326)
+            for geom in geo_utils.split_polygon_at_antimeridian(raw_geom):
+                if geom.geom_type == "Point":
+                    geom = geom.buffer(0.000001)
+                geometries.append(geom.ewkt)
+        # geojson_geometries are stored in web mercator.
+        intersections = " OR ".join(
+            ["ST_Intersects(gg.geom, ST_Transform(ST_GeomFromEWKT(%s), 3857))"]
+            * len(geometries)
+        )
+        return (
+            f"""ri.resourceinstanceid IN (
+                SELECT gg.resourceinstanceid FROM geojson_geometries gg
+                WHERE gg.nodeid = %s AND ({intersections})
+            )""",
+            [
+                get_node_id(settings.COLLECTIONS_GRAPH_SLUG, "production_location_geo"),
+                *geometries,
+            ],
+        )
+
+    def get_advanced_search_predicate(self):
+        return self.advanced_search_predicate
+
+    def get_page(self, limit, offset=0, exact_count_threshold=None):
+        """Return (page of surrogate ids, total number of matches, whether
+        the total is an estimate), ordered by surrogateid.
+
+        The total is counted exactly, in the same statement as the page,
+        unless the planner expects at least `exact_count_threshold` matches.
+        Then its estimate is returned instead and only the page is read,
+        rather than every matching row.
+        """
+        matches_sql, params = self.get_matches_sql()
+        if exact_count_threshold is not None:
+            estimate = self.get_estimated_count()
+            if estimate >= exact_count_threshold:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""
+                        {matches_sql}
+                        ORDER BY s.surrogateid
+                        LIMIT %s OFFSET %s
+                        """,
+                        [*params, limit, offset],
+                    )
+                    page = [row[0] for row in cursor.fetchall()]
+                return page, max(estimate, offset + len(page)), True
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH matches AS MATERIALIZED (
+                    {matches_sql}
+                )
+                SELECT
+                    (SELECT count(*) FROM matches),
+                    ARRAY(
+                        SELECT surrogateid FROM matches
+                        ORDER BY surrogateid
+                        LIMIT %s OFFSET %s
+                    )
+                """,
+                [*params, limit, offset],
+            )
+            total, page = cursor.fetchone()
+        return list(page), total, False
+
+    def get_ranked_page(self, limit, offset=0, after=None):
+        """Return up to `limit` (surrogateid, rank) pairs of a term search,
+        by descending rank and then surrogateid, after skipping `offset`
+        rows or the rows sorting before the (rank, surrogateid) `after`.
+
+        Postgres keeps only the top offset + limit rows while sorting, so
+        the sort stays cheap however many items match.
+        """
+        conditions = ["ri.graphid = %s"]
+        params = [settings.COLLECTIONS_GRAPHID]
+        for predicate in (
+            self.get_spatial_predicate(),
+            self.get_advanced_search_predicate(),
+        ):
+            if predicate is not None:
+                conditions.append(predicate[0])
+                params.extend(predicate[1])
+        if after is not None:
+            conditions.append(
+                "(ranked.rank < %s::real"
+                " OR (ranked.rank = %s::real AND s.surrogateid > %s))"
+            )
+            params.extend([after[0], after[0], after[1]])
+        where = "\n AND ".join(conditions)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT s.surrogateid, ranked.rank
+                FROM __arches_rascolls_rank_collection_items_by_searchable_values(
+                    %s::text[], %s, %s
+                ) ranked
+                JOIN resource_instances ri
+                    ON ri.resourceinstanceid = ranked.resourceinstance
+                JOIN rascolls_search_surrogate s
+                    ON s.resourceinstanceid = ri.resourceinstanceid
+                WHERE {where}
+                ORDER BY ranked.rank DESC, s.surrogateid
+                LIMIT %s OFFSET %s
+                """,
+                [
+                    self.terms,
+                    settings.SEARCH_TERM_MAX_HOPS,
+                    settings.SEARCH_TERM_HOP_DISCOUNT,
+                    *params,
+                    limit,
+                    offset,
+                ],
+            )
+            return cursor.fetchall()
+
+    def get_estimated_count(self):
+        """Return the number of matches Postgres' planner expects, from the
+        table statistics, without running the search."""
+        matches_sql, params = self.get_matches_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {matches_sql}", params)
+            (plan,) = cursor.fetchone()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def get_page_after(self, last_surrogateid, limit):
+        """Return up to `limit` surrogate ids sorting after
+        `last_surrogateid`, using the primary key index instead of counting
+        past earlier rows."""
+        matches_sql, params = self.get_matches_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                {matches_sql}
+                AND s.surrogateid > %s
+                ORDER BY s.surrogateid
+                LIMIT %s
+                """,
+                [*params, last_surrogateid, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_result_set(self):
+        """Return the surrogate ids of every match as a ResultSet."""
+        predicates = self.get_predicates()
+        if settings.SEARCH_STAGE_WORKERS and len(predicates) > 1:
+            stages = get_stage_executor().map(self.get_stage_result_set, predicates)
+            return reduce(operator.and_, sorted(stages, key=len))
+        matches_sql, params = self.get_matches_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{matches_sql} ORDER BY s.surrogateid", params)
+            return ResultSet.from_sorted(row[0] for row in cursor.fetchall())
+
+    @staticmethod
+    def get_stage_result_set(predicate):
+        """Return the ResultSet of the collection items matching one filter
+        predicate. Runs on a stage executor thread."""
+        predicate_sql, predicate_params = predicate
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""SELECT s.surrogateid
+                    FROM resource_instances ri
+                    JOIN rascolls_search_surrogate s
+                        ON s.resourceinstanceid = ri.resourceinstanceid
+                    WHERE ri.graphid = %s AND {predicate_sql}
+                    ORDER BY s.surrogateid""",
+                    [settings.COLLECTIONS_GRAPHID, *predicate_params],
+                )
+                return ResultSet.from_sorted(row[0] for row in cursor.fetchall())
+        finally:
+            # Worker threads don't go through the request cycle that would
+            # otherwise close their connections. Like that cycle, keep them
+            # open for the next stage unless they are broken or older than
+            # CONN_MAX_AGE.
+            close_old_connections()
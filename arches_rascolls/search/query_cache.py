@@ -0,0 +1,147 @@
+"""Cache of search result sets, and their facet counts, shared by every session.
+
+Entries are keyed by a fingerprint of the normalized search filters and by
+the search data version, so a tile, relation or geometry write makes every
+cached result set unreachable at once, without having to find and delete
+them. Stale entries age out of the cache by its TIMEOUT / MAX_ENTRIES.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+
+from django.core.cache import caches
+
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.search.result_set import ResultSet
+
+# Bump to orphan cached entries when the meaning of a fingerprint changes.
+FINGERPRINT_VERSION = 1
+
+# ~1 cm at the equator; finer differences in drawn geometries are noise.
+COORDINATE_PRECISION = 7
+
+
+def normalize_terms(terms):
+    if terms is None:
+        return None
+    # Terms are intersected, so their order and repetition don't matter.
+    return sorted({" ".join(term.split()).lower() for term in terms})
+
+
+def normalize_coordinates(coordinates):
+    if isinstance(coordinates, (list, tuple)):
+        return [normalize_coordinates(value) for value in coordinates]
+    return round(coordinates, COORDINATE_PRECISION)
+
+
+def normalize_map_filter(map_filter):
+    # Only the geometry of a drawn feature takes part in the search, and
+    # features are unioned, so their order doesn't matter either.
+    return sorted(
+        json.dumps(
+            {
+                "type": feature["geometry"]["type"],
+                "coordinates": normalize_coordinates(
+                    feature["geometry"]["coordinates"]
+                ),
+            },
+            sort_keys=True,
+        )
+        for feature in map_filter or []
+    )
+
+
+def get_query_fingerprint(terms=None, map_filter=None, advanced_search_filter=None):
+    """Return a stable hash of the search filters, equal for equivalent
+    searches regardless of term order, letter case, or the order of keys
+    in the filter JSON."""
+    canonical = json.dumps(
+        [
+            FINGERPRINT_VERSION,
+            normalize_terms(terms),
+            normalize_map_filter(map_filter),
+            advanced_search_filter or None,
+        ],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class QueryCache:
+    hits_key = "rascolls-query-cache:hits"
+    misses_key = "rascolls-query-cache:misses"
+
+    def __init__(self, cache_alias):
+        self.cache = caches[cache_alias]
+
+    def make_key(self, fingerprint, data_version):
+        return f"rascolls-query:{data_version}:{fingerprint}"
+
+    def get(self, fingerprint, data_version):
+        packed = self.cache.get(self.make_key(fingerprint, data_version))
+        self.increment(self.misses_key if packed is None else self.hits_key)
+        return None if packed is None else ResultSet.from_bytes(packed)
+
+    def set(self, fingerprint, data_version, result_set):
+        self.cache.set(self.make_key(fingerprint, data_version), result_set.to_bytes())
+
+    def make_facets_key(self, fingerprint, data_version, facets_key):
+        return f"rascolls-facets:{data_version}:{fingerprint}:{facets_key}"
+
+    def get_facets(self, fingerprint, data_version, facets_key):
+        return self.cache.get(
+            self.make_facets_key(fingerprint, data_version, facets_key)
+        )
+
+    def set_facets(self, fingerprint, data_version, facets_key, facets):
+        self.cache.set(
+            self.make_facets_key(fingerprint, data_version, facets_key), facets
+        )
+
+    def increment(self, key):
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # The counter was evicted between add() and incr().
+            self.cache.set(key, 1, timeout=None)
+
+    def stats(self):
+        counters = self.cache.get_many([self.hits_key, self.misses_key])
+        hits = counters.get(self.hits_key, 0)
+        misses = counters.get(self.misses_key, 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        }
+
+
+class DisabledQueryCache(QueryCache):
+    def __init__(self):
+        pass
+
+    def get(self, fingerprint, data_version):
+        return None
+
+    def set(self, fingerprint, data_version, result_set):
+        pass
+
+    def get_facets(self, fingerprint, data_version, facets_key):
+        return None
+
+    def set_facets(self, fingerprint, data_version, facets_key, facets):
+        pass
+
+    def stats(self):
+        return {"hits": 0, "misses": 0, "hit_ratio": None}
+
+
+@lru_cache(maxsize=None)
+def get_query_cache():
+    if settings.SEARCH_QUERY_CACHE is None:
+        return DisabledQueryCache()
+    return QueryCache(settings.SEARCH_QUERY_CACHE)
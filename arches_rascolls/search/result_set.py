@@ -0,0 +1,131 @@
+"""Compact sets of search results.
+
+Each collection item has a dense integer surrogate id, assigned by the
+rascolls_search_surrogate table (migration 0015) when the resource is
+created. A ResultSet holds the surrogate ids of a search's results as a
+sorted array of unsigned 32-bit integers: 4 bytes per result instead of 16
+for a binary UUID (or 36 for a UUID string), and intersections, unions and
+paging are merges and binary searches over sorted arrays.
+
+Serialized, the gaps between consecutive ids are compressed, so a result
+set of nearby ids costs little more than a bit per result.
+"""
+
+import bisect
+import hashlib
+import sys
+import uuid
+import zlib
+from array import array
+
+from django.db import connection
+
+# Bump when the serialized layout changes; older payloads are rejected.
+FORMAT_VERSION = 1
+
+
+class ResultSet:
+    __slots__ = ("ids",)
+
+    def __init__(self, ids=()):
+        self.ids = array("I", sorted(set(ids)))
+
+    @classmethod
+    def from_sorted(cls, ids):
+        """Build a result set from ids already sorted and unique, e.g. from
+        a query ordered by surrogateid."""
+        result_set = cls.__new__(cls)
+        result_set.ids = array("I", ids)
+        return result_set
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+    def __contains__(self, surrogateid):
+        index = bisect.bisect_left(self.ids, surrogateid)
+        return index < len(self.ids) and self.ids[index] == surrogateid
+
+    def __eq__(self, other):
+        return isinstance(other, ResultSet) and self.ids == other.ids
+
+    def __repr__(self):
+        return f"<ResultSet of {len(self)}>"
+
+    def __and__(self, other):
+        small, large = sorted((self.ids, other.ids), key=len)
+        if len(small) * 16 < len(large):
+            # Much smaller: binary search the larger side for each id.
+            return ResultSet.from_sorted(
+                surrogateid
+                for surrogateid in small
+                if (index := bisect.bisect_left(large, surrogateid)) < len(large)
+                and large[index] == surrogateid
+            )
+        return ResultSet.from_sorted(sorted(set(small).intersection(large)))
+
+    def __or__(self, other):
+        return ResultSet(set(self.ids).union(other.ids))
+
+    def page(self, offset, limit):
+        """Return `limit` ids starting at position `offset`."""
+        return self.ids[offset : offset + limit].tolist()
+
+    def page_after(self, last_surrogateid, limit):
+        """Return up to `limit` ids greater than `last_surrogateid`."""
+        start = bisect.bisect_right(self.ids, last_surrogateid)
+        return self.ids[start : start + limit].tolist()
+
+    def to_bytes(self):
+        deltas = array("I", self.ids)
+        for index in range(len(deltas) - 1, 0, -1):
+            deltas[index] -= deltas[index - 1]
+        if sys.byteorder == "big":
+            deltas.byteswap()
+        return bytes([FORMAT_VERSION]) + zlib.compress(deltas.tobytes())
+
+    def digest(self):
+        """Return a hex digest identifying the ids in the set."""
+        return hashlib.sha256(self.to_bytes()).hexdigest()[:32]
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data or data[0] != FORMAT_VERSION:
+            raise ValueError("Unsupported result set format.")
+        ids = array("I")
+        ids.frombytes(zlib.decompress(data[1:]))
+        if sys.byteorder == "big":
+            ids.byteswap()
+        for index in range(1, len(ids)):
+            ids[index] += ids[index - 1]
+        return cls.from_sorted(ids)
+
+
+def get_resourceids(surrogateids):
+    """Return the resourceinstanceids of the given surrogate ids, in the
+    given order. Ids of resources that no longer exist are skipped."""
+    surrogateids = list(surrogateids)
+    if not surrogateids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT surrogateid, resourceinstanceid FROM rascolls_search_surrogate
+            WHERE surrogateid = ANY(%s::integer[])
+            """,
+            [surrogateids],
+        )
+        resourceids = {
+            surrogateid: uuid.UUID(str(resourceid))
+            for surrogateid, resourceid in cursor.fetchall()
+        }
+    return [
+        resourceids[surrogateid]
+        for surrogateid in surrogateids
+        if surrogateid in resourceids
+    ]
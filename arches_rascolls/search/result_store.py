@@ -0,0 +1,205 @@
+"""Per-session storage for the full set of search result ids.
+
+The search results map layer (ReferenceCollectionSearchMVT) is requested
+independently of SearchAPI, possibly by a different web worker, so the ids
+matched by a session's search have to live somewhere every worker can reach.
+Each session keeps one active result set, identified by a key derived from
+the query that produced it and by a digest of its ids, which the map layer
+caches its tiles by.
+"""
+
+from functools import lru_cache
+
+from django.core.cache import caches
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.search.result_set import ResultSet
+
+
+class ResultStore:
+    def __init__(self, timeout=3600):
+        self.timeout = timeout
+
+    def set(self, session_key, query_key, result_set):
+        """Make `result_set` the session's active result set."""
+        raise NotImplementedError
+
+    def get(self, session_key, query_key=None):
+        """Return the session's active ResultSet, or None when there is
+        none. If `query_key` is given, only a result set produced by that
+        query is returned."""
+        raise NotImplementedError
+
+    def get_query_key(self, session_key):
+        """Return the key of the query that produced the session's active
+        result set, or None when there is none."""
+        raise NotImplementedError
+
+    def get_digest(self, session_key):
+        """Return the digest of the session's active result set, or None
+        when there is none."""
+        raise NotImplementedError
+
+    def get_surrogateids_sql(self, session_key, digest):
+        """Return (sql, params) of a query selecting the surrogate ids of the
+        session's result set, or none if its digest is no longer `digest`."""
+        raise NotImplementedError
+
+    def delete(self, session_key, query_key=None):
+        """Forget the session's result set (only if produced by `query_key`,
+        when given)."""
+        raise NotImplementedError
+
+
+class PostgresResultStore(ResultStore):
+    """Keeps result sets as integer[] rows of surrogate ids in the unlogged
+    rascolls_search_results table created by migration 0011. Map tiles are
+    rendered by joining the row, so the ids never leave the database."""
+
+    def set(self, session_key, query_key, result_set):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                DELETE FROM rascolls_search_results
+                WHERE (session_key = %s AND query_key != %s) OR expires < now()
+                """,
+                [session_key, query_key],
+            )
+            cursor.execute(
+                """
+                INSERT INTO rascolls_search_results
+                    (session_key, query_key, surrogateids, digest, expires)
+                VALUES (
+                    %s, %s, %s::integer[], %s, now() + make_interval(secs => %s)
+                )
+                ON CONFLICT (session_key, query_key) DO UPDATE
+                SET surrogateids = EXCLUDED.surrogateids,
+                    digest = EXCLUDED.digest,
+                    expires = EXCLUDED.expires
+                """,
+                [
+                    session_key,
+                    query_key,
+                    list(result_set),
+                    result_set.digest(),
+                    self.timeout,
+                ],
+            )
+
+    def get(self, session_key, query_key=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT surrogateids FROM rascolls_search_results
+                WHERE session_key = %s
+                    AND (%s::text IS NULL OR query_key = %s)
+                    AND expires > now()
+                ORDER BY expires DESC
+                LIMIT 1
+                """,
+                [session_key, query_key, query_key],
+            )
+            row = cursor.fetchone()
+        return ResultSet.from_sorted(row[0]) if row else None
+
+    def get_query_key(self, session_key):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT query_key FROM rascolls_search_results
+                WHERE session_key = %s AND expires > now()
+                ORDER BY expires DESC
+                LIMIT 1
+                """,
+                [session_key],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_digest(self, session_key):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT digest FROM rascolls_search_results
+                WHERE session_key = %s AND expires > now()
+                ORDER BY expires DESC
+                LIMIT 1
+                """,
+                [session_key],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_surrogateids_sql(self, session_key, digest):
+        return (
+            """
+            SELECT unnest(surrogateids) FROM rascolls_search_results
+            WHERE session_key = %s AND digest = %s
+            """,
+            [session_key, digest],
+        )
+
+    def delete(self, session_key, query_key=None):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                DELETE FROM rascolls_search_results
+                WHERE session_key = %s AND (%s::text IS NULL OR query_key = %s)
+                """,
+                [session_key, query_key, query_key],
+            )
+
+
+class CacheResultStore(ResultStore):
+    """Keeps result sets in a Django cache, e.g. one configured with
+    django.core.cache.backends.redis.RedisCache. The cache must be shared
+    between workers, so LocMemCache is only suitable for a single process."""
+
+    def __init__(self, cache_alias="searchresults", **kwargs):
+        super().__init__(**kwargs)
+        self.cache = caches[cache_alias]
+
+    def make_key(self, session_key):
+        return f"rascolls-search-results:v2:{session_key}"
+
+    def set(self, session_key, query_key, result_set):
+        self.cache.set(
+            self.make_key(session_key),
+            (query_key, result_set.to_bytes(), result_set.digest()),
+            self.timeout,
+        )
+
+    def get(self, session_key, query_key=None):
+        stored = self.cache.get(self.make_key(session_key))
+        if stored is None or query_key not in (None, stored[0]):
+            return None
+        return ResultSet.from_bytes(stored[1])
+
+    def get_query_key(self, session_key):
+        stored = self.cache.get(self.make_key(session_key))
+        return stored[0] if stored is not None else None
+
+    def get_digest(self, session_key):
+        stored = self.cache.get(self.make_key(session_key))
+        return stored[2] if stored is not None else None
+
+    def get_surrogateids_sql(self, session_key, digest):
+        # The ids have to be sent to the database with every tile query.
+        stored = self.cache.get(self.make_key(session_key))
+        surrogateids = []
+        if stored is not None and stored[2] == digest:
+            surrogateids = list(ResultSet.from_bytes(stored[1]))
+        return "SELECT unnest(%s::integer[])", [surrogateids]
+
+    def delete(self, session_key, query_key=None):
+        if query_key is None or self.get(session_key, query_key) is not None:
+            self.cache.delete(self.make_key(session_key))
+
+
+@lru_cache(maxsize=None)
+def get_result_store():
+    config = settings.SEARCH_RESULT_STORE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
@@ -0,0 +1,126 @@
+"""Typeahead suggestions for the term search.
+
+Suggestions come from rascolls_search_suggestion, a dictionary of the
+lowercased words of the values in arches_search_terms (as typed, not
+stemmed) that lead to at least one collection item (directly or through the
+related collection item closure), rebuilt by the rebuild_search_suggestions
+command. Completions of the typed prefix come
+first, most widely found first, followed by near-misses by trigram
+similarity. Hot prefixes are answered from an in-process LRU until the
+dictionary is next rebuilt.
+"""
+
+from functools import lru_cache
+
+from django.db import connection, transaction
+
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.utils.data_version import get_data_version
+
+# Entries per web worker process.
+SUGGESTION_CACHE_SIZE = 4096
+
+# Below this, trigram matches are mostly noise.
+MIN_SIMILARITY_LENGTH = 3
+
+
+def normalize_prefix(text):
+    """Return the lowercased last word being typed."""
+    words = text.lower().split()
+    return words[-1] if words else ""
+
+
+def get_suggestions(text, limit=10):
+    """Return up to `limit` {"term", "count"} suggestions for the text."""
+    prefix = normalize_prefix(text)
+    if not prefix:
+        return []
+    return list(get_cached_suggestions(prefix, limit, get_data_version("suggestions")))
+
+
+@lru_cache(maxsize=SUGGESTION_CACHE_SIZE)
+def get_cached_suggestions(prefix, limit, version):
+    # `version` only takes part in the cache key.
+    pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    # Each branch is ranked within itself; prefix matches come first.
+    queries = [
+        (
+            """(
+                SELECT 1 AS branch, item_count::real AS rank, term, item_count
+                FROM rascolls_search_suggestion
+                WHERE term LIKE %s
+                ORDER BY item_count DESC, term
+                LIMIT %s
+            )""",
+            [pattern, limit],
+        )
+    ]
+    if len(prefix) >= MIN_SIMILARITY_LENGTH:
+        queries.append(
+            (
+                """(
+                    SELECT 2, similarity(term, %s), term, item_count
+                    FROM rascolls_search_suggestion
+                    WHERE term %% %s AND term NOT LIKE %s
+                    ORDER BY similarity(term, %s) DESC, item_count DESC, term
+                    LIMIT %s
+                )""",
+                [prefix, prefix, pattern, prefix, limit],
+            )
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT term, item_count
+            FROM ({" UNION ALL ".join(sql for sql, _ in queries)}) suggestions
+            ORDER BY branch, rank DESC, item_count DESC, term
+            LIMIT %s""",
+            [param for _, params in queries for param in params] + [limit],
+        )
+        rows = cursor.fetchall()
+    return tuple({"term": term, "count": count} for term, count in rows)
+
+
+def rebuild_search_suggestions():
+    """Recompute the suggestion dictionary. Returns its number of terms."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM rascolls_search_suggestion")
+        cursor.execute(
+            """
+            INSERT INTO rascolls_search_suggestion (term, item_count)
+            WITH words AS (
+                -- Whitespace separated, so CAS numbers stay whole, without
+                -- the punctuation around them.
+                SELECT DISTINCT sv.resourceinstanceid, regexp_replace(
+                    spaced.word, '^[^[:alnum:]]+|[^[:alnum:]]+$', '', 'g'
+                ) AS word
+                FROM arches_search_terms sv
+                CROSS JOIN LATERAL
+                    regexp_split_to_table(lower(sv.value), '[[:space:]]+') spaced(word)
+            ),
+            searchable AS (
+                -- Stop words have no lexeme, so a term search finds nothing.
+                SELECT word FROM (SELECT DISTINCT word FROM words) distinct_words
+                WHERE length(to_tsvector(word)) > 0
+            )
+            SELECT words.word, count(DISTINCT items.itemid)
+            FROM words
+            JOIN searchable ON searchable.word = words.word
+            CROSS JOIN LATERAL (
+                SELECT r.resourceinstanceid AS itemid
+                FROM resource_instances r
+                WHERE r.resourceinstanceid = words.resourceinstanceid
+                    AND r.graphid = %s
+                UNION ALL
+                SELECT closure.collectionitemid
+                FROM rascolls_related_collection_item closure
+                WHERE closure.resourceinstanceid = words.resourceinstanceid
+                    AND closure.hops <= %s
+            ) items
+            GROUP BY words.word
+            """,
+            [settings.COLLECTIONS_GRAPHID, min(settings.SEARCH_TERM_MAX_HOPS, 2)],
+        )
+        count = cursor.rowcount
+        cursor.execute("SELECT __arches_rascolls_bump_committed_version('suggestions')")
+    return count
@@ -0,0 +1,491 @@
+"""Cache for the collection map's vector tiles.
+
+Rendering a tile runs ST_AsMVT over the production locations copied from
+geojson_geometries into rascolls_map_geometry (migration 0023), but the
+collection map rarely changes, so rendered tiles are kept in a TILE_CACHE
+store: an MBTiles archive per layer by default, files on disk, or a Django
+cache shared between hosts. The seed_tile_cache command fills a store ahead of
+the first visitors. Tiles of search results are cached by result set in the
+SEARCH_TILE_CACHE instead.
+
+A deferred trigger queues the bounding box of every production_location_geo
+geometry written (migration 0021), numbered by the `tiles` data version.
+Before serving, a store catches up to the current version by dropping the
+tiles that cover the queued boxes at every cached zoom level, so an edit
+only costs the tiles around it. When the boxes cover too many tiles, the
+zoom levels from the first one over the limit up are cleared; when the
+store has fallen further behind than the queue is kept, the layer is.
+"""
+
+import json
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from functools import lru_cache
+
+from django.core.cache import caches
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.utils.data_version import get_data_version
+
+# Half the width of the web mercator world, in metres.
+MERCATOR_EXTENT = 20037508.342789244
+# Tiles select geometries within this fraction of their size outside them.
+TILE_MARGIN = 64.0 / 4096
+
+
+class TileCache:
+    """Stores rendered tiles by layer and z/x/y, and for each layer the last
+    invalidation version its tiles were brought up to date with."""
+
+    def get(self, layer, zoom, x, y):
+        """Return the stored tile, or None."""
+        raise NotImplementedError
+
+    def set(self, layer, zoom, x, y, tile):
+        raise NotImplementedError
+
+    def set_many(self, layer, tiles):
+        """Store (zoom, x, y, tile) tuples of a layer."""
+        for zoom, x, y, tile in tiles:
+            self.set(layer, zoom, x, y, tile)
+
+    def delete(self, layer, tiles):
+        """Drop the given (zoom, x, y) tiles of a layer."""
+        raise NotImplementedError
+
+    def clear(self, layer):
+        """Drop every tile of a layer."""
+        raise NotImplementedError
+
+    def clear_zooms(self, layer, min_zoom):
+        """Drop every tile of a layer at `min_zoom` and above."""
+        raise NotImplementedError
+
+    def get_version(self, layer):
+        """Return the layer's invalidation version, or None for a new layer."""
+        raise NotImplementedError
+
+    def set_version(self, layer, version):
+        raise NotImplementedError
+
+
+class FileSystemTileCache(TileCache):
+    """Keeps tiles as <location>/<layer>/<z>/<x>/<y>.pbf files. Each host
+    has its own files and catches up with the invalidation queue on its
+    own."""
+
+    def __init__(self, location):
+        self.location = location
+
+    def get_path(self, layer, *parts):
+        return os.path.join(self.location, layer, *map(str, parts))
+
+    def get(self, layer, zoom, x, y):
+        try:
+            with open(self.get_path(layer, zoom, x, f"{y}.pbf"), "rb") as tile_file:
+                return tile_file.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, layer, zoom, x, y, tile):
+        self.write(self.get_path(layer, zoom, x, f"{y}.pbf"), tile)
+
+    def delete(self, layer, tiles):
+        for zoom, x, y in tiles:
+            try:
+                os.remove(self.get_path(layer, zoom, x, f"{y}.pbf"))
+            except FileNotFoundError:
+                pass
+
+    def clear(self, layer):
+        shutil.rmtree(self.get_path(layer), ignore_errors=True)
+
+    def clear_zooms(self, layer, min_zoom):
+        try:
+            entries = os.listdir(self.get_path(layer))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.isdigit() and int(entry) >= min_zoom:
+                shutil.rmtree(self.get_path(layer, entry), ignore_errors=True)
+
+    def get_version(self, layer):
+        try:
+            with open(self.get_path(layer, "version")) as version_file:
+                return int(version_file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set_version(self, layer, version):
+        self.write(self.get_path(layer, "version"), str(version).encode())
+
+    @staticmethod
+    def write(path, content):
+        # Written aside and renamed, so readers never see a partial file.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as temporary_file:
+            temporary_file.write(content)
+        os.replace(temporary_path, path)
+
+
+class MBTilesTileCache(TileCache):
+    """Keeps each layer in a <location>/<layer>.mbtiles SQLite archive, which
+    tile servers and desktop GIS can also read. The archive is written in
+    WAL mode, so web workers keep reading tiles while one of them writes."""
+
+    SCHEMA = """
+        PRAGMA journal_mode=WAL;
+        CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS tiles (
+            zoom_level INTEGER,
+            tile_column INTEGER,
+            tile_row INTEGER,
+            tile_data BLOB,
+            PRIMARY KEY (zoom_level, tile_column, tile_row)
+        );
+    """
+
+    def __init__(self, location, timeout=30):
+        self.location = location
+        self.timeout = timeout
+        self.created = set()
+
+    def connect(self, layer):
+        path = os.path.join(self.location, f"{layer}.mbtiles")
+        if path not in self.created:
+            os.makedirs(self.location, exist_ok=True)
+            with closing(sqlite3.connect(path, timeout=self.timeout)) as archive:
+                archive.executescript(self.SCHEMA)
+                with archive:
+                    archive.executemany(
+                        "INSERT OR IGNORE INTO metadata VALUES (?, ?)",
+                        [
+                            ("name", layer),
+                            ("format", "pbf"),
+                            ("json", json.dumps({"vector_layers": [{"id": layer}]})),
+                        ],
+                    )
+            self.created.add(path)
+        return closing(sqlite3.connect(path, timeout=self.timeout))
+
+    @staticmethod
+    def get_row(zoom, y):
+        # MBTiles numbers rows from the south, as TMS does.
+        return 2**zoom - 1 - y
+
+    def get(self, layer, zoom, x, y):
+        with self.connect(layer) as archive:
+            row = archive.execute(
+                """SELECT tile_data FROM tiles
+                WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?""",
+                [zoom, x, self.get_row(zoom, y)],
+            ).fetchone()
+        return row and bytes(row[0])
+
+    def set(self, layer, zoom, x, y, tile):
+        self.set_many(layer, [(zoom, x, y, tile)])
+
+    def set_many(self, layer, tiles):
+        with self.connect(layer) as archive, archive:
+            archive.executemany(
+                "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+                [(zoom, x, self.get_row(zoom, y), tile) for zoom, x, y, tile in tiles],
+            )
+
+    def delete(self, layer, tiles):
+        with self.connect(layer) as archive, archive:
+            archive.executemany(
+                """DELETE FROM tiles
+                WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?""",
+                [(zoom, x, self.get_row(zoom, y)) for zoom, x, y in tiles],
+            )
+
+    def clear(self, layer):
+        # Other processes may have the archive open, so it is emptied rather
+        # than removed.
+        with self.connect(layer) as archive, archive:
+            archive.execute("DELETE FROM tiles")
+
+    def clear_zooms(self, layer, min_zoom):
+        with self.connect(layer) as archive, archive:
+            archive.execute("DELETE FROM tiles WHERE zoom_level >= ?", [min_zoom])
+
+    def get_version(self, layer):
+        with self.connect(layer) as archive:
+            row = archive.execute(
+                "SELECT value FROM metadata WHERE name = 'rascolls_version'"
+            ).fetchone()
+        return row and int(row[0])
+
+    def set_version(self, layer, version):
+        with self.connect(layer) as archive, archive:
+            archive.execute(
+                "INSERT OR REPLACE INTO metadata VALUES ('rascolls_version', ?)",
+                [str(version)],
+            )
+
+
+class DjangoCacheTileCache(TileCache):
+    """Keeps tiles in a Django cache, e.g. one configured with
+    django.core.cache.backends.redis.RedisCache, shared by every host.
+    Clearing a zoom level of a layer moves it to a new generation of keys
+    rather than deleting them, so the cache should evict by LRU or a
+    timeout."""
+
+    def __init__(self, cache_alias="tiles", timeout=None):
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+
+    def get_generation(self, layer, zoom):
+        return self.cache.get_or_set(
+            f"rascolls-tiles:{layer}:{zoom}:generation", 0, None
+        )
+
+    def make_key(self, layer, zoom, x, y, generation=None):
+        if generation is None:
+            generation = self.get_generation(layer, zoom)
+        return f"rascolls-tiles:{layer}:{zoom}:{generation}/{x}/{y}"
+
+    def get_generations(self, layer, tiles):
+        return {zoom: self.get_generation(layer, zoom) for zoom, *_ in tiles}
+
+    def get(self, layer, zoom, x, y):
+        return self.cache.get(self.make_key(layer, zoom, x, y))
+
+    def set(self, layer, zoom, x, y, tile):
+        self.cache.set(self.make_key(layer, zoom, x, y), tile, self.timeout)
+
+    def set_many(self, layer, tiles):
+        generations = self.get_generations(layer, tiles)
+        self.cache.set_many(
+            {
+                self.make_key(layer, zoom, x, y, generation=generations[zoom]): tile
+                for zoom, x, y, tile in tiles
+            },
+            self.timeout,
+        )
+
+    def delete(self, layer, tiles):
+        generations = self.get_generations(layer, tiles)
+        self.cache.delete_many(
+            [
+                self.make_key(layer, zoom, x, y, generation=generations[zoom])
+                for zoom, x, y in tiles
+            ]
+        )
+
+    def clear(self, layer):
+        self.clear_zooms(layer, 0)
+
+    def clear_zooms(self, layer, min_zoom):
+        # No tiles are stored above the configured MAX_ZOOM.
+        for zoom in range(min_zoom, get_max_zoom() + 1):
+            self.get_generation(layer, zoom)
+            self.cache.incr(f"rascolls-tiles:{layer}:{zoom}:generation")
+
+    def get_version(self, layer):
+        return self.cache.get(f"rascolls-tiles:{layer}:version")
+
+    def set_version(self, layer, version):
+        self.cache.set(f"rascolls-tiles:{layer}:version", version, None)
+
+
+@lru_cache(maxsize=None)
+def get_tile_cache():
+    config = settings.TILE_CACHE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+def get_max_zoom():
+    """Return the highest zoom level whose tiles are cached."""
+    return settings.TILE_CACHE.get("MAX_ZOOM", 14)
+
+
+def get_tile_ranges(bbox, zoom):
+    """Return the (x range, y range) of the tiles at `zoom` that select
+    geometries within the web mercator `bbox` (xmin, ymin, xmax, ymax)."""
+    xmin, ymin, xmax, ymax = bbox
+    count = 2**zoom
+    size = 2 * MERCATOR_EXTENT / count
+    margin = size * TILE_MARGIN
+
+    def clamp(value):
+        return min(max(math.floor(value), 0), count - 1)
+
+    return (
+        range(
+            clamp((xmin - margin + MERCATOR_EXTENT) / size),
+            clamp((xmax + margin + MERCATOR_EXTENT) / size) + 1,
+        ),
+        range(
+            clamp((MERCATOR_EXTENT - ymax - margin) / size),
+            clamp((MERCATOR_EXTENT - ymin + margin) / size) + 1,
+        ),
+    )
+
+
+def get_covering_tiles(bboxes, max_zoom, limit=None, min_zoom=0):
+    """Return the set of (zoom, x, y) tiles covering any of the bounding
+    boxes from `min_zoom` to `max_zoom`, or None if there are more than
+    `limit`."""
+    tiles = set()
+    for bbox in bboxes:
+        for zoom in range(min_zoom, max_zoom + 1):
+            xs, ys = get_tile_ranges(bbox, zoom)
+            if limit is not None and len(tiles) + len(xs) * len(ys) > limit:
+                return None
+            tiles.update((zoom, x, y) for x in xs for y in ys)
+    return tiles
+
+
+def get_invalidated_tiles(bboxes, max_zoom, limit):
+    """Return the set of (zoom, x, y) tiles covering any of the bounding
+    boxes, zoom level by zoom level while they number at most `limit`, and
+    the first zoom level left out (None if none was)."""
+    tiles = set()
+    for zoom in range(max_zoom + 1):
+        zoom_tiles = get_covering_tiles(bboxes, zoom, limit - len(tiles), zoom)
+        if zoom_tiles is None:
+            return tiles, zoom
+        tiles |= zoom_tiles
+    return tiles, None
+
+
+def refresh_tile_cache(tile_cache, layer):
+    """Drop the tiles of `layer` covering geometries changed since it was
+    last refreshed. Returns the data version read first: a tile rendered
+    after the refresh can be stored if the version is unchanged by then."""
+    version = get_data_version("tiles")
+    last_version = tile_cache.get_version(layer)
+    if last_version is not None and last_version >= version:
+        return version
+
+    config = settings.TILE_CACHE
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT last_value FROM rascolls_tile_purged_version")
+        (purged_version,) = cursor.fetchone()
+        start_version = max(last_version or 0, purged_version)
+        cursor.execute(
+            """
+            SELECT
+                version,
+                extract(epoch FROM clock_timestamp() - created),
+                ST_XMin(bbox), ST_YMin(bbox), ST_XMax(bbox), ST_YMax(bbox)
+            FROM rascolls_tile_invalidation
+            WHERE version > %s
+            ORDER BY version
+            """,
+            [start_version],
+        )
+        rows = cursor.fetchall()
+
+    if last_version is None or last_version < purged_version:
+        tile_cache.clear(layer)
+    else:
+        tiles, truncated_zoom = get_invalidated_tiles(
+            [row[2:] for row in rows],
+            get_max_zoom(),
+            config.get("MAX_INVALIDATED_TILES", 10000),
+        )
+        tile_cache.delete(layer, tiles)
+        if truncated_zoom is not None:
+            tile_cache.clear_zooms(layer, truncated_zoom)
+    tile_cache.set_version(
+        layer,
+        get_contiguous_version(
+            start_version, rows, config.get("UNCOMMITTED_GRACE", 30)
+        ),
+    )
+    if rows:
+        purge_tile_invalidations(config.get("RETENTION", 7 * 24 * 3600))
+    return version
+
+
+def get_contiguous_version(start_version, rows, grace):
+    """Return the version a layer has caught up to after reading the queued
+    `rows` of (version, age in seconds, ...) above `start_version`.
+
+    Versions are handed out just before each writing transaction commits,
+    so a later version can be committed first. The layer only advances up
+    to a missing version, and the rows after it are read again by the next
+    refresh, until the missing version shows up or the row after it is
+    `grace` seconds old: by then its transaction was rolled back."""
+    caught_up = start_version
+    for row_version, age, *bbox in rows:
+        if row_version != caught_up + 1 and age < grace:
+            break
+        caught_up = row_version
+    return caught_up
+
+
+def purge_tile_invalidations(retention):
+    """Delete queued bounding boxes older than `retention` seconds. Layers
+    that hadn't caught up with them will be cleared."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH purged AS (
+                DELETE FROM rascolls_tile_invalidation
+                WHERE created < now() - make_interval(secs => %s)
+                RETURNING version
+            )
+            SELECT setval(
+                'rascolls_tile_purged_version',
+                GREATEST(max(version), last_value)
+            )
+            FROM purged, rascolls_tile_purged_version
+            GROUP BY last_value
+            """,
+            [retention],
+        )
+
+
+def rebuild_map_geometries():
+    """Refill rascolls_map_geometry from geojson_geometries and return the
+    number of geometries."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT __arches_rascolls_refresh_map_geometries()")
+        return cursor.fetchone()[0]
+
+
+def get_cached_tile(layer, zoom, x, y, render):
+    """Return the layer's z/x/y tile from the cache, or from `render()` when
+    it isn't stored, storing it unless the data changed while rendering.
+    Tiles above the cached zoom levels are always rendered."""
+    if zoom > get_max_zoom():
+        return render()
+    tile_cache = get_tile_cache()
+    version = refresh_tile_cache(tile_cache, layer)
+    tile = tile_cache.get(layer, zoom, x, y)
+    if tile is None:
+        tile = render()
+        if get_data_version("tiles") == version:
+            tile_cache.set(layer, zoom, x, y, tile)
+    return tile
+
+
+def get_cached_search_tile(digest, zoom, x, y, render, is_current):
+    """Return the z/x/y tile of the search results with `digest` from the
+    SEARCH_TILE_CACHE, or from `render()` when it isn't cached. Keys carry
+    the geometries data version, so changed geometries make every search
+    tile unreachable at once; a rendered tile is stored only if the version
+    is unchanged and `is_current()` still holds by then."""
+    if settings.SEARCH_TILE_CACHE is None:
+        return render()
+    cache = caches[settings.SEARCH_TILE_CACHE]
+    version = get_data_version("geometries")
+    key = f"rascolls-search-tile:{version}:{digest}:{zoom}/{x}/{y}"
+    tile = cache.get(key)
+    if tile is None:
+        tile = render()
+        if get_data_version("geometries") == version and is_current():
+            cache.set(key, tile)
+    return tile
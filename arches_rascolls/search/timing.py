@@ -0,0 +1,182 @@
+"""Per-stage timings for search requests.
+
+A StageTimer records the wall time, number of queries and number of rows
+of each stage of a request. Timings are returned in a Server-Timing header
+(shown in the browser's network panel), logged as one JSON line on the
+`arches_rascolls.search.timing` logger at INFO, and a sample of requests is
+added to per-stage histograms that /api-search-stats exposes.
+
+Queries are counted with a connection execute wrapper, which costs a
+function call per query and works without DEBUG.
+"""
+
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.core.cache import caches
+from django.db import connection
+
+from arches.app.models.system_settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the histogram buckets; slower requests go in +Inf.
+HISTOGRAM_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as stage `name`. The yielded dict's "rows" can be
+        set to the number of rows the stage produced. Repeated stages add
+        up."""
+        stats = {"dur": 0.0, "queries": 0, "rows": None}
+
+        def count_queries(execute, sql, params, many, context):
+            stats["queries"] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                yield stats
+        finally:
+            stats["dur"] = (time.perf_counter() - start) * 1000
+            self.add(name, stats)
+
+    def add(self, name, stats):
+        total = self.stages.setdefault(name, {"dur": 0.0, "queries": 0, "rows": None})
+        total["dur"] += stats["dur"]
+        total["queries"] += stats["queries"]
+        if stats["rows"] is not None:
+            total["rows"] = (total["rows"] or 0) + stats["rows"]
+
+    @property
+    def total(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def get_server_timing(self):
+        entries = []
+        for name, stats in [*self.stages.items(), ("total", {"dur": self.total})]:
+            description = " ".join(
+                f"{key}={stats[key]}"
+                for key in ("queries", "rows")
+                if stats.get(key) is not None
+            )
+            entry = f"{name};dur={stats['dur']:.1f}"
+            if description:
+                entry += f';desc="{description}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+    def finish(self, response, endpoint):
+        """Add the Server-Timing header to the response, log the timings
+        and sample them into the histograms."""
+        total = self.total
+        response["Server-Timing"] = self.get_server_timing()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                json.dumps(
+                    {
+                        "endpoint": endpoint,
+                        "status": response.status_code,
+                        "total_ms": round(total, 1),
+                        "stages": {
+                            name: {**stats, "dur": round(stats["dur"], 1)}
+                            for name, stats in self.stages.items()
+                        },
+                    }
+                )
+            )
+        if random.random() < settings.SEARCH_TIMING["SAMPLE_RATE"]:
+            histograms = get_timing_histograms()
+            for name, stats in [*self.stages.items(), ("total", {"dur": total})]:
+                histograms.observe(f"{endpoint}.{name}", stats["dur"])
+
+
+class TimingHistograms:
+    """Bucket counters per stage, kept in a Django cache so that every
+    worker sharing the cache contributes to the same histograms."""
+
+    stages_key = "rascolls-timing:stages"
+
+    def __init__(self, cache_alias):
+        self.cache = caches[cache_alias]
+
+    def make_key(self, stage, suffix):
+        return f"rascolls-timing:{stage}:{suffix}"
+
+    def observe(self, stage, milliseconds):
+        bucket = next(
+            (str(bound) for bound in HISTOGRAM_BUCKETS if milliseconds <= bound),
+            "inf",
+        )
+        self.increment(self.make_key(stage, bucket))
+        self.increment(self.make_key(stage, "count"))
+        self.increment(self.make_key(stage, "sum"), round(milliseconds))
+        # Only the worker whose add() creates the marker registers the stage,
+        # so concurrent workers never overwrite each other's stages.
+        if self.cache.add(self.make_key(stage, "seen"), True, timeout=None):
+            slot = self.increment(self.stages_key)
+            self.cache.set(f"{self.stages_key}:{slot}", stage, timeout=None)
+
+    def increment(self, key, delta=1):
+        self.cache.add(key, 0, timeout=None)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # The counter was evicted between add() and incr().
+            self.cache.set(key, delta, timeout=None)
+            return delta
+
+    def get_stages(self):
+        count = self.cache.get(self.stages_key, 0)
+        slots = [f"{self.stages_key}:{slot}" for slot in range(1, count + 1)]
+        return set(self.cache.get_many(slots).values())
+
+    def snapshot(self):
+        """Return {stage: {"buckets": {bound: count}, "count", "sum_ms"}}."""
+        bounds = [str(bound) for bound in HISTOGRAM_BUCKETS] + ["inf"]
+        snapshot = {}
+        for stage in sorted(self.get_stages()):
+            keys = {
+                suffix: self.make_key(stage, suffix)
+                for suffix in [*bounds, "count", "sum"]
+            }
+            values = self.cache.get_many(keys.values())
+            snapshot[stage] = {
+                "buckets": {bound: values.get(keys[bound], 0) for bound in bounds},
+                "count": values.get(keys["count"], 0),
+                "sum_ms": values.get(keys["sum"], 0),
+            }
+        return snapshot
+
+    def to_prometheus(self):
+        """Return the histograms in the Prometheus text exposition format."""
+        lines = [
+            "# HELP rascolls_search_stage_duration_milliseconds Sampled search stage durations.",
+            "# TYPE rascolls_search_stage_duration_milliseconds histogram",
+        ]
+        name = "rascolls_search_stage_duration_milliseconds"
+        for stage, histogram in self.snapshot().items():
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram["sum_ms"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_timing_histograms():
+    return TimingHistograms(settings.SEARCH_TIMING["CACHE"])
@@ -452,6 +452,100 @@ CACHES = {
     "searchresults": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     },
+    "searchqueries": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "TIMEOUT": 3600,
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    "searchtiles": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "TIMEOUT": 3600,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "searchtimings": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "TIMEOUT": None,
+    },
+}
+
+# Where each session's search result ids are kept so the search results map
+# layer can be served by any web worker. To keep them in Redis instead, point
+# the "searchresults" cache at django.core.cache.backends.redis.RedisCache and use:
+# {"BACKEND": "arches_rascolls.search.result_store.CacheResultStore",
+#  "OPTIONS": {"cache_alias": "searchresults", "timeout": 3600}}
+SEARCH_RESULT_STORE = {
+    "BACKEND": "arches_rascolls.search.result_store.PostgresResultStore",
+    "OPTIONS": {"timeout": 3600},  # seconds
+}
+
+# Cache alias holding the result sets of recent searches, shared between
+# sessions and invalidated by writes to tiles, relations and geometries.
+# Set to None to disable.
+SEARCH_QUERY_CACHE = "searchqueries"
+
+# A term matches the collection items it is indexed on, and the items
+# reachable from those through up to this many relations to other resources.
+SEARCH_TERM_MAX_HOPS = 2
+
+# Term search results are ordered by relevance, the ts_rank_cd of the
+# matching values multiplied by this for each relation they are found through.
+SEARCH_TERM_HOP_DISCOUNT = 0.5
+
+# Unfiltered searches report the planner's estimate of the number of
+# collection items, flagged with total_is_estimate, instead of counting them
+# when it is at least this many. None always counts.
+SEARCH_EXACT_COUNT_THRESHOLD = 10000
+
+# Threads (each holding a database connection while busy) shared by all
+# searches to run the term, map and advanced filters of a combined search
+# concurrently instead of as one statement. 0 disables them.
+SEARCH_STAGE_WORKERS = 0
+
+# Fraction of searches whose stage timings are added to the histograms served
+# by /api-search-stats, and the cache alias holding them (share it between
+# workers, e.g. with Redis, for instance-wide histograms).
+SEARCH_TIMING = {"SAMPLE_RATE": 0.1, "CACHE": "searchtimings"}
+
+# Rows fetched per round trip when streaming /api-search-export.
+SEARCH_EXPORT_BATCH_SIZE = 2000
+
+# Collection item nodes whose values /api-search-facets counts.
+SEARCH_FACET_NODE_ALIASES = [
+    "material",
+    "standard_type",
+    "mixture_type",
+    "ghs_safety_classification_classification",
+    "nfpa_safety_classification_classification",
+]
+
+# Cache alias holding the search results map layer's tiles, keyed by a digest
+# of the result set, so sessions with the same results share them. Set to None
+# to disable.
+SEARCH_TILE_CACHE = "searchtiles"
+
+# Where rendered collection map vector tiles are kept, up to MAX_ZOOM (tiles
+# above it cover few geometries and are rendered on every request). Tiles
+# covering geometries that change are dropped, zoom level by zoom level up to
+# MAX_INVALIDATED_TILES tiles per refresh (the zoom levels beyond that are
+# cleared); changes are queued for RETENTION seconds. Each layer is an
+# MBTiles archive in "location" (outside the package, set ARCHES_TILECACHEDIR
+# to move it), filled ahead of time by the seed_tile_cache command;
+# FileSystemTileCache keeps <layer>/<z>/<x>/<y>.pbf files instead. To share
+# the tiles between hosts, use
+# {"BACKEND": "arches_rascolls.search.tile_cache.DjangoCacheTileCache",
+#  "OPTIONS": {"cache_alias": "tiles"}}
+TILE_CACHE = {
+    "BACKEND": "arches_rascolls.search.tile_cache.MBTilesTileCache",
+    "OPTIONS": {
+        "location": get_optional_env_variable(
+            "ARCHES_TILECACHEDIR", os.path.join(os.path.dirname(APP_ROOT), "tiles")
+        )
+    },
+    "MAX_ZOOM": 14,
+    "MAX_INVALIDATED_TILES": 10000,
+    "RETENTION": 7 * 24 * 3600,  # seconds
+    # How long a missing version may still be committed by its transaction.
+    "UNCOMMITTED_GRACE": 30,  # seconds
 }
 
 # Hide nodes and cards in a report that have no data
@@ -473,6 +567,14 @@ CACHE_BY_USER = {"default": 3600 * 24, "anonymous": 3600 * 24}  # 24hrs  # 24hrs
 
 TILE_CACHE_TIMEOUT = 600  # seconds
 CLUSTER_DISTANCE_MAX = 5000  # meters
+
+# Collection map tiles up to MAP_CLUSTER_MAX_ZOOM show clusters of nearby
+# points, grouped by a grid of MAP_CLUSTER_GRID cells per tile side, instead
+# of every geometry. None clusters while a cell is at least
+# CLUSTER_DISTANCE_MAX wide (zoom 8 by default). Run clear_tile_cache after
+# changing these.
+MAP_CLUSTER_GRID = 16
+MAP_CLUSTER_MAX_ZOOM = None
 GRAPH_MODEL_CACHE_TIMEOUT = None
 
 OAUTH_CLIENT_ID = ""  #'9JCibwrWQ4hwuGn5fu2u1oRZSs9V6gK8Vu8hpRC4'
@@ -635,6 +737,13 @@ SHOW_LANGUAGE_SWITCH = len(LANGUAGES) > 1
 COLLECTIONS_GRAPHID = "d4e956f7-9fad-4fd2-94e3-563a3b2c3585"
 COLLECTIONS_GRAPH_SLUG = "reference_and_sample_collection_item"
 
+# Nodes of the collections graph that the search SQL functions and triggers
+# of the migrations name directly, which can't look them up by alias.
+COLLECTIONS_CURRENT_LOCATION_NODEID = "2c90a384-664d-4882-9aac-adb0a7fc6785"
+COLLECTIONS_CURRENT_LOCATION_NODEGROUPID = "2c90a384-664d-4882-9aac-adb0a7fc6785"
+COLLECTIONS_CURRENT_LOCATION_STATEMENT_NODEID = "a5a78cba-3dac-4737-82c8-57c710f4f55a"
+COLLECTIONS_PRODUCTION_LOCATION_GEO_NODEID = "c4743a33-cd94-4093-bc71-b928f501ab47"
+
 # Implement this class to associate custom documents to the ES resource index
 # See tests.views.search_tests.TestEsMappingModifier class for example
 # ES_MAPPING_MODIFIER_CLASSES = ["arches_rascolls.search.es_mapping_modifier.EsMappingModifier"]
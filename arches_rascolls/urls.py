@@ -8,7 +8,13 @@ from arches_rascolls.views.resource import (
 )
 from arches_rascolls.views.file_api import FileAPI
 from arches_rascolls.views.settings_api import SettingsAPI
-from arches_rascolls.views.search_api import SearchAPI
+from arches_rascolls.views.search_api import (
+    SearchAPI,
+    SearchExportAPI,
+    SearchFacetsAPI,
+    SearchStatsAPI,
+    SearchSuggestAPI,
+)
 from arches_rascolls.views.map_api import (
     MapDataAPI,
     FeatureBufferAPI,
@@ -26,6 +32,10 @@ uuid_regex = settings.UUID_REGEX
 urlpatterns = [
     # project-level urls
     path("api-search", SearchAPI.as_view(), name="api-search"),
+    path("api-search-export", SearchExportAPI.as_view(), name="api-search-export"),
+    path("api-search-facets", SearchFacetsAPI.as_view(), name="api-search-facets"),
+    path("api-search-suggest", SearchSuggestAPI.as_view(), name="api-search-suggest"),
+    path("api-search-stats", SearchStatsAPI.as_view(), name="api-search-stats"),
     path("api-settings", SettingsAPI.as_view(), name="api-settings"),
     path("api-map-data", MapDataAPI.as_view(), name="api-map-data"),
     path("api-file-data", FileAPI.as_view(), name="api-file-data"),
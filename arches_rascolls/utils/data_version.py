@@ -0,0 +1,45 @@
+from django.db import connection
+
+# Scopes whose version is a row of rascolls_data_version (migration 0024),
+# advanced by writing transactions as they commit: by database triggers for
+# search (see migrations 0012, 0020 and 0028; tiles only of collection
+# items), map sources and layers and system settings (migration 0020) and
+# collection map geometries (migration 0025), and by each rebuild for
+# suggestions. A version read is never newer than the data a query run after
+# reading it sees, so results can be cached under it.
+COMMITTED_DATA_VERSION_SCOPES = {
+    "search",
+    "suggestions",
+    "map",
+    "settings",
+    "geometries",
+}
+
+# Sequences advanced whenever the data behind a scope changes, before the
+# change is committed: collection map geometries (migration 0021), whose
+# versions number the tile invalidation queue.
+DATA_VERSION_SEQUENCES = {
+    "tiles": "rascolls_tile_data_version",
+}
+
+
+def get_data_version(scope="search"):
+    """Return a number that changes whenever data in the given scope does.
+
+    Reading a version takes no locks and sees advances committed by every
+    other session, so this is cheap enough to call on every request.
+    """
+    with connection.cursor() as cursor:
+        if scope in COMMITTED_DATA_VERSION_SCOPES:
+            cursor.execute(
+                "SELECT version FROM rascolls_data_version WHERE scope = %s",
+                [scope],
+            )
+        else:
+            # A sequence that was never advanced is one short of its first
+            # value.
+            cursor.execute(
+                f"""SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END
+                FROM {DATA_VERSION_SEQUENCES[scope]}"""
+            )
+        return cursor.fetchone()[0]
@@ -0,0 +1,48 @@
+"""Strong ETags derived from data versions.
+
+An ETag combines the data version of a scope with everything else the
+response depends on, so a conditional GET can be answered with 304 Not
+Modified after reading the scope's row of rascolls_data_version, before any
+query work. The row only advances as writes commit, so a response is never
+tagged with a version newer than the data it was built from.
+"""
+
+import hashlib
+import json
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from arches_rascolls.utils.data_version import get_data_version
+
+
+def make_etag(scope, *parts):
+    """Return a quoted ETag for the current data version of `scope` and the
+    JSON-serializable `parts` the response depends on."""
+    payload = json.dumps(
+        [scope, get_data_version(scope), *parts], default=str, sort_keys=True
+    )
+    return '"{}"'.format(hashlib.sha256(payload.encode()).hexdigest()[:32])
+
+
+def get_not_modified_response(request, etag):
+    """Return a 304 response if the request's If-None-Match lists `etag`
+    (or *), otherwise None."""
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return None
+    # If-None-Match uses weak comparison.
+    etags = [tag.removeprefix("W/") for tag in parse_etags(if_none_match)]
+    if etag not in etags and "*" not in etags:
+        return None
+    return set_etag(HttpResponseNotModified(), etag)
+
+
+def set_etag(response, etag):
+    """Add `etag` to a successful response and have browsers revalidate it
+    on every use."""
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
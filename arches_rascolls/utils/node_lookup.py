@@ -25,3 +25,23 @@ def get_nodegroup_id(graph_slug, node_alias):
         .get(graph__slug=graph_slug, alias=node_alias, source_identifier=None)
         .nodegroup_id
     )
+
+
+@lru_cache(maxsize=None)
+def get_node_alias(graph_slug, node_id):
+    """Resolve the alias of a node from its graph slug and node UUID."""
+    return (
+        Node.objects.only("alias")
+        .get(graph__slug=graph_slug, pk=node_id, source_identifier=None)
+        .alias
+    )
+
+
+@lru_cache(maxsize=None)
+def get_node_datatype(graph_slug, node_alias):
+    """Resolve the datatype of the node with the given alias."""
+    return (
+        Node.objects.only("datatype")
+        .get(graph__slug=graph_slug, alias=node_alias, source_identifier=None)
+        .datatype
+    )
@@ -1,13 +1,13 @@
 from http import HTTPStatus
 import json
+import math
 import uuid
 
 from django.contrib.gis.db.models import Extent
 from django.contrib.gis.db.models.functions import Transform
-from django.core.cache import caches
 from django.db import connection
 from django.http import HttpResponse, Http404
-from django.utils.translation import gettext as _
+from django.utils.translation import get_language, gettext as _
 from django.views.generic import View
 
 from arches.app.models import models
@@ -17,14 +17,35 @@ from arches.app.search.mappings import RESOURCES_INDEX
 from arches.app.utils.file_validator import FileValidator
 from arches.app.utils.response import JSONResponse, JSONErrorResponse
 from arches.app.utils.permission_backend import user_can_read_map_layers
+from arches_rascolls.search.result_store import get_result_store
+from arches_rascolls.search.tile_cache import (
+    MERCATOR_EXTENT,
+    get_cached_search_tile,
+    get_cached_tile,
+)
+from arches_rascolls.utils.etag import (
+    get_not_modified_response,
+    make_etag,
+    set_etag,
+)
 from arches_rascolls.utils.geo_utils import GeoUtils
 from arches_rascolls.utils.node_lookup import get_node_id
 
-searchresults_cache = caches["searchresults"]
-
 
 class MapDataAPI(View):
     def get(self, request):
+        # The readable layers depend on the user, the basemaps and tile URLs
+        # on the settings file.
+        etag = make_etag(
+            "map",
+            request.user.pk,
+            get_language(),
+            settings.BASEMAPS,
+            settings.PUBLIC_SERVER_ADDRESS,
+        )
+        if (response := get_not_modified_response(request, etag)) is not None:
+            return response
+
         map_layers = user_can_read_map_layers(request.user)
         map_sources = list(models.MapSource.objects.all())
         for map_source in map_sources:
@@ -35,14 +56,17 @@ class MapDataAPI(View):
                     )
                     map_source.source["tiles"][0] = source
 
-        return JSONResponse(
-            {
-                "map_layers": map_layers,
-                "map_sources": map_sources,
-                "rascolls_basemaps": settings.BASEMAPS,
-                # "resource_map_layers": resource_map_layers,
-                # "resource_map_sources": resource_map_sources,
-            }
+        return set_etag(
+            JSONResponse(
+                {
+                    "map_layers": map_layers,
+                    "map_sources": map_sources,
+                    "rascolls_basemaps": settings.BASEMAPS,
+                    # "resource_map_layers": resource_map_layers,
+                    # "resource_map_sources": resource_map_sources,
+                }
+            ),
+            etag,
         )
 
 
@@ -157,89 +181,187 @@ class GeoJSONParseIntoCollectionAPI(View):
         return JSONResponse(GeoUtils.shape_geojson_as_feature_collection(geojson_obj))
 
 
-class ReferenceCollectionSearchMVT(View):
-    def get(self, request, zoom, x, y):
-        system_settings_resourceid = settings.SYSTEM_SETTINGS_RESOURCE_ID
-        result = None
-        with connection.cursor() as cursor:
-            session_id = request.session.session_key
-            resource_ids = searchresults_cache.get(session_id, [])
-            if resource_ids:
-                result = cursor.execute(
-                    """
-                    SELECT ST_AsMVT(tile, 'rascolls-search', 4096, 'geom', 'id')
-                    FROM (
+def get_cluster_max_zoom():
+    """Return the highest zoom level at which collection map tiles show
+    clusters of points rather than every geometry."""
+    if settings.MAP_CLUSTER_MAX_ZOOM is not None:
+        return settings.MAP_CLUSTER_MAX_ZOOM
+    # The highest zoom level at which a cluster cell is at least
+    # CLUSTER_DISTANCE_MAX wide.
+    cell_width = 2 * MERCATOR_EXTENT / settings.MAP_CLUSTER_GRID
+    return math.floor(math.log2(cell_width / settings.CLUSTER_DISTANCE_MAX))
+
+
+# Zoom levels up to which tiles draw the geometries simplified for them in
+# rascolls_map_geometry (migration 0023); NULL where nothing was removed.
+SIMPLIFIED_GEOMETRY_ZOOMS = (11, 14)
+
+
+def get_geometry_column(zoom):
+    """Return the rascolls_map_geometry column to draw at `zoom`."""
+    for simplified_zoom in SIMPLIFIED_GEOMETRY_ZOOMS:
+        if zoom <= simplified_zoom:
+            return f"coalesce(geom_z{simplified_zoom}, geom)"
+    return "geom"
+
+
+def render_collection_tile(layer, zoom, x, y, condition="", params=()):
+    """Return the z/x/y vector tile of the collection items' production
+    locations, named `layer` and restricted by an extra SQL `condition` on
+    rascolls_map_geometry gg.
+
+    Up to get_cluster_max_zoom(), each tile is divided into a grid of
+    MAP_CLUSTER_GRID cells per side, and the points on the surface of the
+    geometries in a cell become one point at their mean position, with the
+    number of geometries as point_count and the lowest geometry id and its
+    resource as representatives. Tiles then hold at most MAP_CLUSTER_GRID²
+    features however many items there are. Beyond it, geometries are drawn
+    simplified for the zoom level."""
+    zoom, x, y = int(zoom), int(x), int(y)
+    with connection.cursor() as cursor:
+        if zoom <= get_cluster_max_zoom():
+            cell = 4096.0 / settings.MAP_CLUSTER_GRID
+            cursor.execute(
+                f"""
+                SELECT ST_AsMVT(tile, %s, 4096, 'geom', 'id')
+                FROM (
+                SELECT
+                    min(id) id,
+                    (array_agg(resourceinstanceid ORDER BY id))[1] resourceinstanceid,
+                    count(*) point_count,
+                    ST_Point(round(avg(ST_X(point))), round(avg(ST_Y(point)))) geom
+                FROM (
                     SELECT
                         id,
                         resourceinstanceid,
-                        nodeid,
                         ST_AsMVTGeom(
-                            geom,
+                            point,
                             TileBBox(%s, %s, %s, 3857),
                             4096,
-                            256,
+                            0,
                             false
-                        ) geom
-                    FROM geojson_geometries gg
-                    WHERE nodeid=%s and resourceinstanceid != %s and resourceinstanceid in %s and (gg.geom && ST_TileEnvelope(%s, %s, %s, margin => (64.0 / 4096)))
-                    ) tile
-                    """,
-                    [
-                        zoom,
-                        x,
-                        y,
-                        get_node_id(
-                            settings.COLLECTIONS_GRAPH_SLUG, "production_location_geo"
-                        ),
-                        system_settings_resourceid,
-                        tuple(resource_ids),
-                        zoom,
-                        x,
-                        y,
-                    ],
-                )
-                result = bytes(cursor.fetchone()[0]) if result is None else result
-            else:
-                raise Http404("No search results found")
-        return HttpResponse(result, content_type="application/x-protobuf")
-
-
-class ReferenceCollectionMVT(View):
-    def get(self, request, zoom, x, y):
-        system_settings_resourceid = settings.SYSTEM_SETTINGS_RESOURCE_ID
-        result = None
-        with connection.cursor() as cursor:
-            result = cursor.execute(
-                """
-                SELECT ST_AsMVT(tile, 'referencecollections', 4096, 'geom', 'id')
+                        ) point
+                    FROM rascolls_map_geometry gg
+                    WHERE resourceinstanceid != %s {condition} and (gg.point && ST_TileEnvelope(%s, %s, %s))
+                ) points
+                WHERE point IS NOT NULL
+                GROUP BY floor(ST_X(point) / %s), floor(ST_Y(point) / %s)
+                ) tile
+                """,
+                [
+                    layer,
+                    zoom,
+                    x,
+                    y,
+                    settings.SYSTEM_SETTINGS_RESOURCE_ID,
+                    *params,
+                    zoom,
+                    x,
+                    y,
+                    cell,
+                    cell,
+                ],
+            )
+        else:
+            cursor.execute(
+                f"""
+                SELECT ST_AsMVT(tile, %s, 4096, 'geom', 'id')
                 FROM (
                 SELECT
                     id,
                     resourceinstanceid,
-                    nodeid,
+                    %s::text nodeid,
                     ST_AsMVTGeom(
-                        geom,
+                        {get_geometry_column(zoom)},
                         TileBBox(%s, %s, %s, 3857),
                         4096,
                         256,
                         false
                     ) geom
-                FROM geojson_geometries gg
-                WHERE nodeid=%s and resourceinstanceid != %s and (gg.geom && ST_TileEnvelope(%s, %s, %s, margin => (64.0 / 4096)))
+                FROM rascolls_map_geometry gg
+                WHERE resourceinstanceid != %s {condition} and (gg.geom && ST_TileEnvelope(%s, %s, %s, margin => (64.0 / 4096)))
                 ) tile
                 """,
                 [
-                    zoom,
-                    x,
-                    y,
+                    layer,
                     get_node_id(
                         settings.COLLECTIONS_GRAPH_SLUG, "production_location_geo"
                     ),
-                    system_settings_resourceid,
+                    zoom,
+                    x,
+                    y,
+                    settings.SYSTEM_SETTINGS_RESOURCE_ID,
+                    *params,
                     zoom,
                     x,
                     y,
                 ],
             )
-            result = bytes(cursor.fetchone()[0]) if result is None else result
-        return HttpResponse(result, content_type="application/x-protobuf")
+        return bytes(cursor.fetchone()[0])
+
+
+class ReferenceCollectionSearchMVT(View):
+    layer = "rascolls-search"
+
+    def get(self, request, zoom, x, y):
+        session_id = request.session.session_key
+        result_store = get_result_store()
+        digest = session_id and result_store.get_digest(session_id)
+        if not digest:
+            raise Http404("No search results found")
+        tile = get_cached_search_tile(
+            digest,
+            int(zoom),
+            int(x),
+            int(y),
+            lambda: self.render(result_store, session_id, digest, zoom, x, y),
+            lambda: result_store.get_digest(session_id) == digest,
+        )
+        return HttpResponse(tile, content_type="application/x-protobuf")
+
+    def render(self, result_store, session_id, digest, zoom, x, y):
+        surrogateids_sql, surrogateids_params = result_store.get_surrogateids_sql(
+            session_id, digest
+        )
+        return render_collection_tile(
+            self.layer,
+            zoom,
+            x,
+            y,
+            f"""and gg.resourceinstanceid IN (
+                SELECT resourceinstanceid FROM rascolls_search_surrogate
+                WHERE surrogateid IN ({surrogateids_sql})
+            )""",
+            surrogateids_params,
+        )
+
+
+class ReferenceCollectionMVT(View):
+    layer = "referencecollections"
+
+    def get(self, request, zoom, x, y):
+        tile = get_cached_tile(
+            self.layer,
+            int(zoom),
+            int(x),
+            int(y),
+            lambda: self.render(zoom, x, y),
+        )
+        return HttpResponse(tile, content_type="application/x-protobuf")
+
+    def get_bboxes(self):
+        """Return the web mercator (xmin, ymin, xmax, ymax) bounding box of
+        every geometry on the layer."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT ST_XMin(geom), ST_YMin(geom), ST_XMax(geom), ST_YMax(geom)
+                FROM rascolls_map_geometry
+                WHERE resourceinstanceid != %s
+                """,
+                [settings.SYSTEM_SETTINGS_RESOURCE_ID],
+            )
+            return cursor.fetchall()
+
+    def render(self, zoom, x, y):
+        return render_collection_tile(self.layer, zoom, x, y)
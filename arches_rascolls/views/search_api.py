@@ -16,183 +16,400 @@ You should have received a copy of the GNU Affero General Public License
 along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
+from http import HTTPStatus
 import json
 import logging
-import math
 
-from django.core.cache import caches
-from django.core.paginator import Paginator
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.generic import View
-from django.db import connection
-from django.core.exceptions import ObjectDoesNotExist
-from django.contrib.gis.db.models.aggregates import Union
-from django.contrib.gis.db.models.functions import Transform, Centroid
-from django.contrib.gis.geos import GEOSGeometry
 from django.utils.translation import get_language, gettext as _
-from django.db.models import Q
-from django.db.models.fields.json import KT
 
-from arches.app.models.models import GeoJSONGeometry, ResourceInstance, TileModel
-from arches.app.utils.response import JSONResponse
+from arches.app.utils.response import JSONErrorResponse, JSONResponse
 from arches.app.models.system_settings import settings
 
-from arches_rascolls.utils.geo_utils import GeoUtils
-from arches_rascolls.utils.node_lookup import get_node_id, get_nodegroup_id
+from arches_rascolls.search.advanced_search import AdvancedSearchError
+from arches_rascolls.search.export import (
+    EXPORT_FORMATS,
+    GEOMETRY_MODES,
+    iter_export_rows,
+)
+from arches_rascolls.search.facets import FacetCounter, FacetError
+from arches_rascolls.search.hydration import (
+    FIELD_SETS,
+    get_search_results_by_resourceids,
+)
+from arches_rascolls.search.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+)
+from arches_rascolls.search.planner import SearchPlanner
+from arches_rascolls.search.query_cache import get_query_cache, get_query_fingerprint
+from arches_rascolls.search.result_set import get_resourceids
+from arches_rascolls.search.result_store import get_result_store
+from arches_rascolls.search.suggest import get_suggestions
+from arches_rascolls.search.timing import StageTimer, get_timing_histograms
+from arches_rascolls.utils.data_version import get_data_version
+from arches_rascolls.utils.etag import (
+    get_not_modified_response,
+    make_etag,
+    set_etag,
+)
 
 logger = logging.getLogger(__name__)
 
-searchresults_cache = caches["searchresults"]
-
 
 class SearchAPI(View):
     def get(self, request):
-        current_page = int(request.GET.get("paging-filter", 1))
-        page_size = int(settings.SEARCH_ITEMS_PER_PAGE)
-        results = []
-
-        if term_filter := request.GET.get("term-filter", None):
-            terms = json.loads(term_filter)
-            if terms:
-                terms = [term["text"] for term in terms]
-            results = get_related_resources_by_text(terms, settings.COLLECTIONS_GRAPHID)
-        else:
-            results = ResourceInstance.objects.filter(
-                graph_id=settings.COLLECTIONS_GRAPHID
-            ).values_list("resourceinstanceid")
-
-        if map_filter := json.loads(request.GET.get("map-filter", "[]")):
-            geo_utils = GeoUtils()
-            spatial_filters = Q()
-            for feature in map_filter:
-                raw_geom = GEOSGeometry(json.dumps(feature["geometry"]), srid=4326)
-                for geom in geo_utils.split_polygon_at_antimeridian(raw_geom):
-                    if geom.geom_type == "Point":
-                        spatial_filters |= Q(geom__intersects=geom.buffer(0.000001))
-                    else:
-                        spatial_filters |= Q(geom__intersects=geom)
-
-            resourceids_in_buffer = GeoJSONGeometry.objects.filter(
-                spatial_filters,
-                Q(
-                    node_id=get_node_id(
-                        settings.COLLECTIONS_GRAPH_SLUG, "production_location_geo"
-                    )
-                ),
-            ).values_list("resourceinstance_id")
-
-            results = set(resourceids_in_buffer).intersection(set(results))
-
-        if advanced_search_filter := request.GET.get("advanced-search", None):
-            advanced_search_results = []
-            advanced_search_filter = json.loads(advanced_search_filter)
-            query = Q()
-            # [{'op': 'and', 'e9b8d73c-09b7-11f0-b84f-0275dc2ded29': {'op': 'eq', 'val': 'f697d7f2-4956-4b14-8910-c7ca673e74ca'}}]
-            for filter in advanced_search_filter:
-                if filter["op"] == "and":
-                    for key, value in filter.items():
-                        if key != "op":
-                            query &= Q(**{f"data__{key}": value["val"]})
-                elif filter["op"] == "or":
-                    for key, value in filter.items():
-                        if key != "op":
-                            query |= Q(**{f"data__{key}": value["val"]})
-                elif filter["op"] == "not":
-                    # Handle "not" operation
-                    pass
-                else:
-                    # Handle other operations
-                    pass
+        self.timer = StageTimer()
+        # The rank of each surrogate id on a relevance-ranked page.
+        self.ranks = {}
+        with self.timer.stage("etag"):
+            etag, query_key = get_search_etag(request)
+            response = None
+            if etag is not None:
+                response = get_not_modified_response(request, etag)
+            # Searching also makes its results the session's map layer, so
+            # only skip it when they already are.
+            if response is not None and query_key != get_result_store().get_query_key(
+                request.session._get_or_create_session_key()
+            ):
+                response = None
+        if response is None:
+            response = self.search(request)
+            if etag is not None:
+                set_etag(response, etag)
+        self.timer.finish(response, "search")
+        return response
 
-            advanced_search_results = TileModel.objects.filter(query).values_list(
-                "resourceinstance_id"
+    def search(self, request):
+        page_size = int(settings.SEARCH_ITEMS_PER_PAGE)
+        # `ids` returns just the resource ids of the page, without cards.
+        self.fields = request.GET.get("fields", "full").strip('"')
+        if self.fields != "ids" and self.fields not in FIELD_SETS:
+            return JSONErrorResponse(
+                message=_("Unsupported fields: {}").format(self.fields),
+                status=HTTPStatus.BAD_REQUEST,
             )
-            results = set(advanced_search_results).intersection(set(results))
 
-        session_id = request.session._get_or_create_session_key()
+        try:
+            with self.timer.stage("plan"):
+                planner, fingerprint = get_search_planner(request)
+        except AdvancedSearchError as e:
+            return JSONErrorResponse(
+                message=_("Invalid advanced search: {}").format(e),
+                status=HTTPStatus.BAD_REQUEST,
+            )
 
-        if term_filter or map_filter or advanced_search_filter:
-            searchresults_cache.set(session_id, [str(id[0]) for id in results])
-        else:
-            searchresults_cache.clear()
+        if "paging-cursor" in request.GET:
+            return self.get_cursor_page(request, planner, fingerprint, page_size)
 
-        ret = get_search_results_by_resourceids(
-            [str(row[0]) for row in results],
-            start=(current_page - 1) * page_size,
+        current_page = int(request.GET.get("paging-filter", 1))
+        page, total_results, total_is_estimate = self.get_page(
+            request,
+            planner,
+            fingerprint,
+            offset=(current_page - 1) * page_size,
             limit=page_size,
         )
         return JSONResponse(
-            {"results": ret, "total_results": len(results), "page_size": page_size}
+            {
+                "results": self.hydrate(page),
+                "total_results": total_results,
+                "total_is_estimate": total_is_estimate,
+                "page_size": page_size,
+            }
         )
 
+    def hydrate(self, page):
+        with self.timer.stage("hydrate") as stage:
+            resourceids = get_resourceids(page)
+            if self.fields == "ids":
+                results = resourceids
+            else:
+                results = get_search_results_by_resourceids(
+                    resourceids, FIELD_SETS[self.fields]
+                )
+            stage["rows"] = len(results)
+        return results
 
-def get_current_location(resource):
-    try:
-        place = (
-            resource.from_resxres.filter(
-                node_id=get_node_id(settings.COLLECTIONS_GRAPH_SLUG, "current_location")
+    def get_page(self, request, planner, fingerprint, offset, limit):
+        """Return (page of surrogate ids, total number of results, whether
+        the total is an estimate) and keep the session's results for the
+        search results map layer. Filtered results are always counted
+        exactly: every id is needed for the map layer anyway."""
+        session_id = request.session._get_or_create_session_key()
+        if not planner.is_filtered:
+            # The map shows every item already, so there is nothing to keep
+            # and Postgres can page and count without returning every id.
+            with self.timer.stage("store"):
+                get_result_store().delete(session_id)
+            with self.timer.stage("match") as stage:
+                page, total, total_is_estimate = planner.get_page(
+                    limit,
+                    offset,
+                    exact_count_threshold=settings.SEARCH_EXACT_COUNT_THRESHOLD,
+                )
+                stage["rows"] = len(page) if total_is_estimate else total
+            return page, total, total_is_estimate
+
+        result_set = get_search_result_set(planner, fingerprint, self.timer)
+        with self.timer.stage("store"):
+            get_result_store().set(session_id, fingerprint, result_set)
+        if planner.is_ranked:
+            return self.get_ranked_page(planner, limit, offset), len(result_set), False
+        return result_set.page(offset, limit), len(result_set), False
+
+    def get_ranked_page(self, planner, limit, offset=0, after=None):
+        with self.timer.stage("rank") as stage:
+            self.ranks = dict(planner.get_ranked_page(limit, offset, after))
+            stage["rows"] = len(self.ranks)
+        return list(self.ranks)
+
+    def get_cursor_page(self, request, planner, fingerprint, page_size):
+        """Serve one page of results following the `paging-cursor` token.
+
+        Results are ordered by surrogate id, so every page after the first
+        is an indexed range scan (`WHERE surrogateid > cursor LIMIT n`) and
+        costs the same no matter how deep into the results it is, or a
+        binary search of the cached result set when the query cache has it.
+        Term searches are ordered by rank, and their cursor is the
+        (rank, surrogateid) of the last row. The total and the session's map
+        results are only computed for the first page (an empty cursor);
+        later pages leave them untouched.
+        """
+        total_results = None
+        total_is_estimate = False
+        # The search UI JSON-encodes every query parameter, so tolerate quotes.
+        if cursor := request.GET.get("paging-cursor", "").strip().strip('"'):
+            try:
+                if planner.is_ranked:
+                    last_rank, last_surrogateid = decode_cursor(cursor)
+                    last_rank = float(last_rank)
+                else:
+                    (last_surrogateid,) = decode_cursor(cursor)
+                last_surrogateid = int(last_surrogateid)
+            except (InvalidCursor, TypeError, ValueError):
+                return JSONErrorResponse(
+                    message=_("Invalid paging cursor."),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            if planner.is_ranked:
+                page = self.get_ranked_page(
+                    planner, page_size + 1, after=(last_rank, last_surrogateid)
+                )
+            else:
+                with self.timer.stage("cache"):
+                    result_set = get_query_cache().get(fingerprint, get_data_version())
+                with self.timer.stage("match") as stage:
+                    if result_set is not None:
+                        page = result_set.page_after(last_surrogateid, page_size + 1)
+                    else:
+                        page = planner.get_page_after(last_surrogateid, page_size + 1)
+                    stage["rows"] = len(page)
+        else:
+            page, total_results, total_is_estimate = self.get_page(
+                request, planner, fingerprint, offset=0, limit=page_size + 1
             )
-            .first()
-            .to_resource.name
-        )
-    except (AttributeError, ObjectDoesNotExist):
-        place = None
 
-    try:
-        statement_node_id = get_node_id(
-            settings.COLLECTIONS_GRAPH_SLUG, "current_location_statement_content"
+        # One extra row was fetched to learn whether another page follows.
+        next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            if planner.is_ranked:
+                next_cursor = encode_cursor([self.ranks[page[-1]], page[-1]])
+            else:
+                next_cursor = encode_cursor([page[-1]])
+
+        return JSONResponse(
+            {
+                "results": self.hydrate(page),
+                "total_results": total_results,
+                "total_is_estimate": total_is_estimate,
+                "page_size": page_size,
+                "next_cursor": next_cursor,
+            }
         )
-        statement_value = (
-            TileModel.objects.filter(
-                resourceinstance_id=resource.pk,
-                nodegroup_id=get_nodegroup_id(
-                    settings.COLLECTIONS_GRAPH_SLUG, "current_location_statement"
-                ),
+
+
+class SearchFacetsAPI(View):
+    def get(self, request):
+        """Return value counts of the SEARCH_FACET_NODE_ALIASES nodes (or
+        of the `facets` subset of them) across the search's results."""
+        node_aliases = settings.SEARCH_FACET_NODE_ALIASES
+        if requested := request.GET.get("facets", None):
+            try:
+                requested = set(json.loads(requested))
+            except (TypeError, ValueError):
+                return JSONErrorResponse(
+                    message=_("Invalid facets: {}").format(requested),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            if unknown := requested - set(node_aliases):
+                return JSONErrorResponse(
+                    message=_("Unknown facets: {}").format(
+                        ", ".join(sorted(map(str, unknown)))
+                    ),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            node_aliases = [alias for alias in node_aliases if alias in requested]
+
+        try:
+            planner, fingerprint = get_search_planner(request)
+        except AdvancedSearchError as e:
+            return JSONErrorResponse(
+                message=_("Invalid advanced search: {}").format(e),
+                status=HTTPStatus.BAD_REQUEST,
+            )
+
+        query_cache = get_query_cache()
+        data_version = get_data_version()
+        facets_key = ":".join([get_language(), *node_aliases])
+        facets = query_cache.get_facets(fingerprint, data_version, facets_key)
+        if facets is None:
+            try:
+                facets = FacetCounter(node_aliases).get_counts(planner)
+            except FacetError as e:
+                return JSONErrorResponse(
+                    message=_("Invalid facets: {}").format(e),
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+            query_cache.set_facets(fingerprint, data_version, facets_key, facets)
+        return JSONResponse({"facets": facets})
+
+
+class SearchExportAPI(View):
+    def get(self, request):
+        """Stream every result of the search in `format` (csv, ndjson or
+        geojson), with each item's centroid, full geometry or none."""
+        if not request.user.is_authenticated:
+            return JSONResponse({"message": "Forbidden"}, status=403)
+        # The search UI JSON-encodes every query parameter, so tolerate quotes.
+        export_format = request.GET.get("format", "csv").strip('"')
+        geometry = request.GET.get("geometry", "centroid").strip('"')
+        if export_format not in EXPORT_FORMATS or geometry not in GEOMETRY_MODES:
+            return JSONErrorResponse(
+                message=_("Unsupported export format or geometry."),
+                status=HTTPStatus.BAD_REQUEST,
             )
-            .annotate(location_description=KT(f"data__{statement_node_id}"))
-            .values_list("location_description", flat=True)
-            .first()
+        try:
+            planner, _fingerprint = get_search_planner(request)
+        except AdvancedSearchError as e:
+            return JSONErrorResponse(
+                message=_("Invalid advanced search: {}").format(e),
+                status=HTTPStatus.BAD_REQUEST,
+            )
+
+        writer, content_type, extension = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            writer(iter_export_rows(planner, geometry), geometry),
+            content_type=content_type,
         )
-        statement = json.loads(statement_value)["en"]["value"]
-    except TypeError:
-        statement = None
+        response["Content-Disposition"] = (
+            f'attachment; filename="search-results.{extension}"'
+        )
+        return response
 
-    return " | ".join([str(value) for value in [place, statement] if value is not None])
 
+class SearchSuggestAPI(View):
+    max_limit = 50
 
-def get_related_resources_by_text(search_query, graphid):
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT DISTINCT * FROM __arches_rascolls_get_related_resources_by_searchable_values(%s, %s)",
-            [search_query, graphid],
+    def get(self, request):
+        """Return completions for the last word of `q`."""
+        # The search UI JSON-encodes every query parameter, so tolerate quotes.
+        text = request.GET.get("q", "").strip().strip('"')
+        try:
+            limit = int(request.GET.get("limit", 10))
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return JSONErrorResponse(
+                message=_("Invalid limit."),
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        return JSONResponse(
+            {"suggestions": get_suggestions(text, min(limit, self.max_limit))}
         )
-        rows = cursor.fetchall()
-    return rows
-
-
-def get_search_results_by_resourceids(
-    resourceids, start=0, limit=settings.SEARCH_ITEMS_PER_PAGE
-):
-    resource_paginator = Paginator(resourceids, limit)
-    page = math.ceil((start + 1) / limit)
-    resources = ResourceInstance.objects.filter(
-        pk__in=resource_paginator.page(page).object_list
-    ).prefetch_related("geojsongeometry_set")
-    results = []
-    lang = get_language()
-    for resource_instance in resources:
-        res = {"currentlocation": get_current_location(resource_instance)}
-        res["resourceinstanceid"] = resource_instance.resourceinstanceid
-        res["displayname"] = resource_instance.descriptors[lang]["name"]
-        res["displaydescription"] = resource_instance.descriptors[lang]["description"]
-        res["displayname_language"] = lang
-        res["has_geom"] = resource_instance.geojsongeometry_set.exists()
-        if res["has_geom"]:
-            res["centroid"] = (
-                resource_instance.geojsongeometry_set.all()
-                .annotate(centroid=Centroid(Union("geom")))
-                .annotate(wgs=Transform("geom", 4326))
-                .first()
-                .wgs.coords
+
+
+class SearchStatsAPI(View):
+    def get(self, request):
+        """Return query cache statistics and sampled stage timings, the
+        latter in the Prometheus text format with `?format=prometheus`."""
+        if not request.user.is_superuser:
+            return JSONResponse({"message": "Forbidden"}, status=403)
+        histograms = get_timing_histograms()
+        if request.GET.get("format") == "prometheus":
+            return HttpResponse(
+                histograms.to_prometheus(),
+                content_type="text/plain; version=0.0.4",
             )
-        results.append(res)
-    return results
+        return JSONResponse(
+            {
+                "query_cache": get_query_cache().stats(),
+                "stage_timings": histograms.snapshot(),
+            }
+        )
+
+
+def get_search_filters(request):
+    """Return the (terms, map filter, advanced search filter) in the
+    request's query parameters."""
+    terms = None
+    if term_filter := request.GET.get("term-filter", None):
+        terms = [term["text"] for term in json.loads(term_filter)]
+    map_filter = json.loads(request.GET.get("map-filter", "[]"))
+    advanced_search_filter = request.GET.get("advanced-search", None)
+    if advanced_search_filter:
+        advanced_search_filter = json.loads(advanced_search_filter)
+    return terms, map_filter, advanced_search_filter
+
+
+def get_search_etag(request):
+    """Return the ETag of the request's search response, and the key of the
+    result set the search keeps for the session (None when unfiltered).
+    Returns (None, None) when the filters can't be parsed."""
+    try:
+        terms, map_filter, advanced_search_filter = get_search_filters(request)
+    except (KeyError, TypeError, ValueError):
+        return None, None
+    query_key = None
+    if terms is not None or map_filter or advanced_search_filter:
+        query_key = get_query_fingerprint(terms, map_filter, advanced_search_filter)
+    etag = make_etag(
+        "search",
+        sorted(request.GET.lists()),
+        get_language(),
+        settings.SEARCH_ITEMS_PER_PAGE,
+    )
+    return etag, query_key
+
+
+def get_search_planner(request):
+    """Return the SearchPlanner and query fingerprint for the search filters
+    in the request's query parameters."""
+    terms, map_filter, advanced_search_filter = get_search_filters(request)
+    planner = SearchPlanner(
+        terms=terms,
+        map_filter=map_filter,
+        advanced_search_filter=advanced_search_filter,
+    )
+    return planner, get_query_fingerprint(terms, map_filter, advanced_search_filter)
+
+
+def get_search_result_set(planner, fingerprint, timer=None):
+    """Return the ResultSet of every resource matching the search. Searches
+    already run against the current data by any session are answered from
+    the query cache."""
+    timer = timer or StageTimer()
+    query_cache = get_query_cache()
+    with timer.stage("cache"):
+        data_version = get_data_version()
+        result_set = query_cache.get(fingerprint, data_version)
+    if result_set is None:
+        with timer.stage("match") as stage:
+            result_set = planner.get_result_set()
+            stage["rows"] = len(result_set)
+        with timer.stage("cache"):
+            query_cache.set(fingerprint, data_version, result_set)
+    return result_set
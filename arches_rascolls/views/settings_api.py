@@ -4,13 +4,23 @@ from django.utils.translation import get_language, get_language_bidi
 from arches.app.utils.response import JSONResponse
 from arches.app.models.system_settings import settings
 
+from arches_rascolls.utils.etag import (
+    get_not_modified_response,
+    make_etag,
+    set_etag,
+)
+
 
 class SettingsAPI(View):
     def get(self, request):
-        return JSONResponse(
-            {
-                "ACTIVE_LANGUAGE": get_language(),
-                "ACTIVE_LANGUAGE_DIRECTION": "rtl" if get_language_bidi() else "ltr",
-                "DEFAULT_BOUNDS": settings.DEFAULT_BOUNDS,
-            }
-        )
+        data = {
+            "ACTIVE_LANGUAGE": get_language(),
+            "ACTIVE_LANGUAGE_DIRECTION": "rtl" if get_language_bidi() else "ltr",
+            "DEFAULT_BOUNDS": settings.DEFAULT_BOUNDS,
+        }
+        # Settings from the settings file only change with a restart, so
+        # they are part of the tag alongside the system settings version.
+        etag = make_etag("settings", data)
+        if (response := get_not_modified_response(request, etag)) is not None:
+            return response
+        return set_etag(JSONResponse(data), etag)
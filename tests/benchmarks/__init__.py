@@ -0,0 +1,7 @@
+# these benchmarks can be run from the command line via
+# python manage.py test tests.benchmarks --pattern="*.py" --settings="tests.test_settings"
+#
+# RASCOLLS_BENCHMARK_ITEMS, RASCOLLS_BENCHMARK_RUNS and RASCOLLS_BENCHMARK_SEED
+# size the synthetic collection, and results are written as JSON to
+# RASCOLLS_BENCHMARK_OUTPUT (benchmark-results.json by default) so runs from
+# different commits can be compared.
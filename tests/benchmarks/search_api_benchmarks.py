@@ -0,0 +1,458 @@
+"""Time /api-search against a synthetic collection in the test database.
+
+The fixtures are generated from a seeded random number generator, so two
+runs with the same settings search identical data: collection items with a
+name, a material, a current location, a production location with a point or
+polygon geometry, a person they were acquired by and sometimes a digital
+resource, and the Persons, Places and Digital Resources they relate to.
+Relations, geometries and search terms are derived from the tile data the
+same way Arches and arches_search derive them, so the search tables and
+triggers see ordinary rows.
+"""
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.core import management
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from arches.app.models.models import GraphModel, ResourceInstance, TileModel
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.search.timing import get_timing_histograms
+from tests import test_report_configs
+
+ITEM_COUNT = int(os.environ.get("RASCOLLS_BENCHMARK_ITEMS", 2000))
+RUNS = int(os.environ.get("RASCOLLS_BENCHMARK_RUNS", 5))
+SEED = int(os.environ.get("RASCOLLS_BENCHMARK_SEED", 0))
+OUTPUT = os.environ.get("RASCOLLS_BENCHMARK_OUTPUT", "benchmark-results.json")
+PAGES = [1, 10, 50]
+
+PERSON_GRAPH_FILE = test_report_configs.RESOURCE_MODELS_DIR / "Person.json"
+PLACE_GRAPH_FILE = test_report_configs.RESOURCE_MODELS_DIR / "Place.json"
+
+# Collection item nodes
+NAME_NODEGROUPID = "271bc2c1-0ec9-47bc-8a3c-c73947b52b30"
+NAME_CONTENT_NODEID = "30d34ddd-5b73-420e-a9ea-c785e3860530"
+MATERIAL_NODEID = "49910861-d211-4712-ac97-5a737e8650cb"
+CURRENT_LOCATION_NODEID = "2c90a384-664d-4882-9aac-adb0a7fc6785"
+PRODUCTION_NODEGROUPID = "d31d9491-2aff-4252-9028-ad8d72a460a8"
+PRODUCTION_LOCATION_NODEID = "5f63ecde-36d4-4211-9f09-c91186e3d229"
+PRODUCTION_LOCATION_GEO_NODEID = "c4743a33-cd94-4093-bc71-b928f501ab47"
+ACQUISITION_NODEGROUPID = "42d08fd6-6296-4c0c-afbd-2f1a4c469b62"
+ACQUISITION_TRANSFERRED_TITLE_TO_NODEID = "21a1041d-7cb8-49cb-bcae-37e3ab87ebbe"
+DIGITAL_SOURCE_NODEGROUPID = "1f43c3b8-e527-496b-be7c-9820a140a553"
+DIGITAL_SOURCE_NODEID = "d933304d-ac77-4ef6-881a-9502644cf636"
+
+# Name nodes of the related graphs
+PERSON_NAME_NODEGROUPID = "e1d0f244-d770-11ef-8c40-0275dc2ded29"
+PERSON_NAME_CONTENT_NODEID = "e1d1ddda-d770-11ef-8c40-0275dc2ded29"
+PLACE_NAME_NODEGROUPID = "3ddab19c-d771-11ef-825b-0275dc2ded29"
+PLACE_NAME_CONTENT_NODEID = "3ddacdf8-d771-11ef-825b-0275dc2ded29"
+DIGITAL_NAME_NODEGROUPID = "8713f270-d860-11ef-98f5-0275dc2ded29"
+DIGITAL_NAME_CONTENT_NODEID = "87143b9a-d860-11ef-98f5-0275dc2ded29"
+
+OBJECT_TYPES = ["vessel", "bowl", "figurine", "coin", "textile", "mask", "blade"]
+MATERIALS = ["bronze", "clay", "glass", "silk", "wood"]
+SURNAMES = ["Abbott", "Baker", "Castillo", "Dunmore", "Eriksen", "Farouk"] + [
+    f"Surname{i}" for i in range(44)
+]
+# The map filter covers the western quarter of the production locations.
+BOUNDS = (-10.0, 35.0, 30.0, 60.0)
+MAP_FILTER_BOUNDS = (-10.0, 35.0, 0.0, 60.0)
+
+
+def localized(value):
+    return {"en": {"value": value, "direction": "ltr"}}
+
+
+def related_resource(resourceid):
+    return [
+        {
+            "resourceId": str(resourceid),
+            "ontologyProperty": "",
+            "inverseOntologyProperty": "",
+        }
+    ]
+
+
+def bbox_polygon(west, south, east, north):
+    return {
+        "type": "Polygon",
+        "coordinates": [
+            [[west, south], [east, south], [east, north], [west, north], [west, south]]
+        ],
+    }
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class SyntheticCollection:
+    """Build the synthetic collection with bulk inserts."""
+
+    def __init__(self, item_count, seed):
+        self.item_count = item_count
+        self.random = random.Random(seed)
+        self.material_ids = {
+            material: str(uuid.UUID(int=self.random.getrandbits(128)))
+            for material in MATERIALS
+        }
+        self.resources = []
+        self.tiles = []
+
+    def uuid(self):
+        return uuid.UUID(int=self.random.getrandbits(128), version=4)
+
+    def add_resource(self, graph, name, nodegroupid, name_nodeid):
+        resourceid = self.uuid()
+        self.resources.append(
+            ResourceInstance(
+                resourceinstanceid=resourceid,
+                graph=graph,
+                name=localized(name),
+                descriptors={"en": {"name": name, "description": ""}},
+            )
+        )
+        self.add_tile(resourceid, nodegroupid, {name_nodeid: localized(name)})
+        return resourceid
+
+    def add_tile(self, resourceid, nodegroupid, data):
+        self.tiles.append(
+            TileModel(
+                tileid=self.uuid(),
+                resourceinstance_id=resourceid,
+                nodegroup_id=nodegroupid,
+                data=data,
+                sortorder=0,
+            )
+        )
+
+    def build(self):
+        graphs = {
+            graph.slug: graph
+            for graph in GraphModel.objects.filter(source_identifier=None)
+        }
+        people = [
+            self.add_resource(
+                graphs["person"],
+                f"{self.random.choice(['Ada', 'Ben', 'Chen', 'Dara'])} {surname}",
+                PERSON_NAME_NODEGROUPID,
+                PERSON_NAME_CONTENT_NODEID,
+            )
+            for surname in self.random.choices(
+                SURNAMES, k=max(self.item_count // 10, 1)
+            )
+        ]
+        places = [
+            self.add_resource(
+                graphs["place"],
+                f"Site{i}",
+                PLACE_NAME_NODEGROUPID,
+                PLACE_NAME_CONTENT_NODEID,
+            )
+            for i in range(max(self.item_count // 20, 1))
+        ]
+        digital_resources = [
+            self.add_resource(
+                graphs["digital_resources"],
+                f"Photograph{i}",
+                DIGITAL_NAME_NODEGROUPID,
+                DIGITAL_NAME_CONTENT_NODEID,
+            )
+            for i in range(max(self.item_count // 5, 1))
+        ]
+
+        collection_graph = graphs[settings.COLLECTIONS_GRAPH_SLUG]
+        item_ids = []
+        for i in range(self.item_count):
+            material = self.random.choice(MATERIALS)
+            itemid = self.add_resource(
+                collection_graph,
+                f"{material.title()} {self.random.choice(OBJECT_TYPES)} {i}",
+                NAME_NODEGROUPID,
+                NAME_CONTENT_NODEID,
+            )
+            item_ids.append(itemid)
+            self.add_tile(
+                itemid,
+                MATERIAL_NODEID,
+                {MATERIAL_NODEID: self.get_reference(material)},
+            )
+            self.add_tile(
+                itemid,
+                CURRENT_LOCATION_NODEID,
+                {CURRENT_LOCATION_NODEID: related_resource(self.random.choice(places))},
+            )
+            self.add_tile(
+                itemid,
+                PRODUCTION_NODEGROUPID,
+                {
+                    PRODUCTION_LOCATION_NODEID: related_resource(
+                        self.random.choice(places)
+                    ),
+                    PRODUCTION_LOCATION_GEO_NODEID: self.get_feature_collection(),
+                },
+            )
+            self.add_tile(
+                itemid,
+                ACQUISITION_NODEGROUPID,
+                {
+                    ACQUISITION_TRANSFERRED_TITLE_TO_NODEID: related_resource(
+                        self.random.choice(people)
+                    )
+                },
+            )
+            if self.random.random() < 0.5:
+                self.add_tile(
+                    itemid,
+                    DIGITAL_SOURCE_NODEGROUPID,
+                    {
+                        DIGITAL_SOURCE_NODEID: related_resource(
+                            self.random.choice(digital_resources)
+                        )
+                    },
+                )
+
+        ResourceInstance.objects.bulk_create(self.resources, batch_size=1000)
+        TileModel.objects.bulk_create(self.tiles, batch_size=1000)
+        resourceids = [resource.resourceinstanceid for resource in self.resources]
+        with connection.cursor() as cursor:
+            self.insert_relations(cursor, item_ids)
+            self.insert_geometries(cursor, item_ids)
+            self.insert_search_terms(cursor, resourceids)
+        return item_ids
+
+    def get_reference(self, material):
+        list_item_id = self.material_ids[material]
+        return [
+            {
+                "uri": f"http://localhost:8000/plugins/controlled-list-manager/item/{list_item_id}",
+                "labels": [
+                    {
+                        "id": list_item_id,
+                        "value": material,
+                        "language_id": "en",
+                        "valuetype_id": "prefLabel",
+                        "list_item_id": list_item_id,
+                    }
+                ],
+                "list_id": str(uuid.UUID(int=0)),
+            }
+        ]
+
+    def get_feature_collection(self):
+        west, south, east, north = BOUNDS
+        x = self.random.uniform(west, east)
+        y = self.random.uniform(south, north)
+        if self.random.random() < 0.8:
+            geometry = {"type": "Point", "coordinates": [x, y]}
+        else:
+            size = self.random.uniform(0.01, 0.5)
+            geometry = bbox_polygon(x, y, x + size, y + size)
+        return {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "id": str(self.uuid()),
+                    "type": "Feature",
+                    "geometry": geometry,
+                    "properties": {},
+                }
+            ],
+        }
+
+    @staticmethod
+    def insert_relations(cursor, item_ids):
+        # One statement, so the closure triggers refresh once.
+        cursor.execute(
+            """INSERT INTO resource_x_resource (
+                resourcexid, resourceinstanceidfrom, resourceinstancefrom_graphid,
+                resourceinstanceidto, resourceinstanceto_graphid,
+                nodeid, tileid, created, modified
+            )
+            SELECT gen_random_uuid(), t.resourceinstanceid, %s,
+                related.resourceinstanceid, related.graphid,
+                n.nodeid, t.tileid, now(), now()
+            FROM tiles t
+            JOIN nodes n ON n.nodegroupid = t.nodegroupid
+                AND n.datatype IN ('resource-instance', 'resource-instance-list')
+            CROSS JOIN jsonb_array_elements(t.tiledata -> n.nodeid::text) relation
+            JOIN resource_instances related
+                ON related.resourceinstanceid = (relation ->> 'resourceId')::uuid
+            WHERE t.resourceinstanceid = ANY(%s::uuid[])""",
+            [settings.COLLECTIONS_GRAPHID, item_ids],
+        )
+
+    @staticmethod
+    def insert_geometries(cursor, item_ids):
+        cursor.execute(
+            """INSERT INTO geojson_geometries (
+                tileid, resourceinstanceid, nodeid, geom, featureid
+            )
+            SELECT t.tileid, t.resourceinstanceid, %s,
+                ST_Transform(
+                    ST_SetSRID(ST_GeomFromGeoJSON(feature -> 'geometry'), 4326),
+                    3857
+                ),
+                (feature ->> 'id')::uuid
+            FROM tiles t
+            CROSS JOIN jsonb_array_elements(t.tiledata -> %s -> 'features') feature
+            WHERE t.resourceinstanceid = ANY(%s::uuid[]) AND t.nodegroupid = %s""",
+            [
+                PRODUCTION_LOCATION_GEO_NODEID,
+                PRODUCTION_LOCATION_GEO_NODEID,
+                item_ids,
+                PRODUCTION_NODEGROUPID,
+            ],
+        )
+
+    @staticmethod
+    def insert_search_terms(cursor, resourceids):
+        cursor.execute(
+            """INSERT INTO arches_search_terms (
+                tileid, resourceinstanceid, graph_slug, node_alias,
+                language, datatype, value
+            )
+            SELECT t.tileid, t.resourceinstanceid, g.slug, n.alias,
+                localized.key, n.datatype, localized.value ->> 'value'
+            FROM tiles t
+            JOIN nodes n ON n.nodegroupid = t.nodegroupid AND n.datatype = 'string'
+            JOIN graphs g ON g.graphid = n.graphid
+            CROSS JOIN jsonb_each(t.tiledata -> n.nodeid::text) localized
+            WHERE t.resourceinstanceid = ANY(%s::uuid[])
+                AND jsonb_typeof(t.tiledata -> n.nodeid::text) = 'object'""",
+            [resourceids],
+        )
+
+
+def load_synthetic_collection():
+    """Import the graphs and build the synthetic collection. Returns the
+    SyntheticCollection and its collection item ids."""
+    management.call_command(
+        "load_ontology", source=str(test_report_configs.ONTOLOGY_DIR), verbosity=0
+    )
+    for graph_file in (
+        test_report_configs.REFERENCE_AND_SAMPLE_ITEM_GRAPH_FILE,
+        test_report_configs.DIGITAL_RESOURCES_GRAPH_FILE,
+        PERSON_GRAPH_FILE,
+        PLACE_GRAPH_FILE,
+    ):
+        test_report_configs.ReportConfigValidationTests.import_graph_file(graph_file)
+    collection = SyntheticCollection(ITEM_COUNT, SEED)
+    return collection, collection.build()
+
+
+class SearchAPIBenchmarks(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection, cls.item_ids = load_synthetic_collection()
+
+    def get_scenarios(self):
+        map_filter = [
+            {
+                "type": "Feature",
+                "properties": {},
+                "geometry": bbox_polygon(*MAP_FILTER_BOUNDS),
+            }
+        ]
+        advanced_search = [
+            {
+                "op": "and",
+                MATERIAL_NODEID: {
+                    "op": "eq",
+                    "val": self.collection.material_ids["clay"],
+                },
+            }
+        ]
+        return {
+            "unfiltered": {},
+            "term-item": {"term-filter": [{"text": "vessel"}]},
+            "term-related": {"term-filter": [{"text": "Castillo"}]},
+            "map": {"map-filter": map_filter},
+            "advanced": {"advanced-search": advanced_search},
+            "combined": {
+                "term-filter": [{"text": "vessel"}],
+                "map-filter": map_filter,
+                "advanced-search": advanced_search,
+            },
+        }
+
+    def time_search(self, params):
+        """Return the timings in ms of RUNS requests after one warm-up, and
+        the last response and its queries."""
+        # The search UI JSON-encodes every query parameter.
+        url = "/api-search?" + urlencode(
+            {name: json.dumps(value) for name, value in params.items()}
+        )
+        self.client.get(url)
+        timings = []
+        for _ in range(RUNS):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = self.client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings, response, queries
+
+    def test_sampled_search_is_timed(self):
+        histograms = get_timing_histograms()
+        histograms.cache.clear()
+        params = self.get_scenarios()["combined"]
+        with self.settings(SEARCH_TIMING={**settings.SEARCH_TIMING, "SAMPLE_RATE": 1}):
+            _, response, _ = self.time_search(params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(histograms.snapshot()["search.total"]["count"], RUNS + 1)
+
+    def test_search_api(self):
+        results = {}
+        for name, params in self.get_scenarios().items():
+            for page in PAGES:
+                timings, response, queries = self.time_search(
+                    {**params, "paging-filter": page}
+                )
+                self.assertEqual(response.status_code, 200, name)
+                body = response.json()
+                if name == "unfiltered" and not body["total_is_estimate"]:
+                    self.assertEqual(body["total_results"], ITEM_COUNT)
+                results[f"{name}/page-{page}"] = {
+                    "median_ms": round(statistics.median(timings), 3),
+                    "p95_ms": round(percentile(timings, 0.95), 3),
+                    "min_ms": round(min(timings), 3),
+                    "queries": len(queries),
+                    "total_results": body["total_results"],
+                    "total_is_estimate": body["total_is_estimate"],
+                    "page_results": len(body["results"]),
+                    "server_timing": response.get("Server-Timing"),
+                }
+
+        report = {
+            "commit": get_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "items": ITEM_COUNT,
+            "runs": RUNS,
+            "seed": SEED,
+            "page_size": int(settings.SEARCH_ITEMS_PER_PAGE),
+            "scenarios": results,
+        }
+        with open(OUTPUT, "w") as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,96 @@
+"""Time /api-search-suggest against the synthetic collection of
+search_api_benchmarks, with and without the in-process LRU.
+
+The target is a p95 under 20 ms on a 100k item collection:
+RASCOLLS_BENCHMARK_ITEMS=100000 builds one.
+"""
+
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.test import TestCase
+
+from arches_rascolls.search.suggest import (
+    get_cached_suggestions,
+    rebuild_search_suggestions,
+)
+from tests.benchmarks.search_api_benchmarks import (
+    ITEM_COUNT,
+    MATERIALS,
+    OBJECT_TYPES,
+    RUNS,
+    SEED,
+    SURNAMES,
+    get_commit,
+    load_synthetic_collection,
+    percentile,
+)
+
+OUTPUT = os.environ.get(
+    "RASCOLLS_SUGGEST_BENCHMARK_OUTPUT", "suggest-benchmark-results.json"
+)
+TARGET_P95_MS = 20
+# Misspellings only found by trigram similarity.
+MISSPELLINGS = ["bronse", "vesel", "figurin", "castilo"]
+
+
+class SearchSuggestBenchmarks(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        load_synthetic_collection()
+        cls.term_count = rebuild_search_suggestions()
+
+    def get_prefixes(self):
+        """Every prefix of the fixture's words, as typed one key at a time."""
+        words = MATERIALS + OBJECT_TYPES + [surname.lower() for surname in SURNAMES]
+        return [word[:end] for word in words for end in range(1, len(word) + 1)]
+
+    def time_suggest(self, text, cached):
+        url = "/api-search-suggest?" + urlencode({"q": text})
+        timings = []
+        for _ in range(RUNS):
+            if not cached:
+                get_cached_suggestions.cache_clear()
+            start = time.perf_counter()
+            response = self.client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            self.assertEqual(response.status_code, 200, text)
+        return timings, response.json()["suggestions"]
+
+    def test_suggest_api(self):
+        self.client.get("/api-search-suggest?q=a")
+        results = {}
+        for name, texts, cached in [
+            ("prefixes", self.get_prefixes(), False),
+            ("prefixes-cached", self.get_prefixes(), True),
+            ("misspellings", MISSPELLINGS, False),
+        ]:
+            timings = []
+            for text in texts:
+                text_timings, suggestions = self.time_suggest(text, cached)
+                timings.extend(text_timings)
+                if name == "prefixes" and text in MATERIALS:
+                    self.assertEqual(suggestions[0]["term"], text)
+            results[name] = {
+                "requests": len(timings),
+                "median_ms": round(statistics.median(timings), 3),
+                "p95_ms": round(percentile(timings, 0.95), 3),
+                "max_ms": round(max(timings), 3),
+            }
+
+        report = {
+            "commit": get_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "items": ITEM_COUNT,
+            "terms": self.term_count,
+            "runs": RUNS,
+            "seed": SEED,
+            "target_p95_ms": TARGET_P95_MS,
+            "scenarios": results,
+        }
+        with open(OUTPUT, "w") as output:
+            json.dump(report, output, indent=2)
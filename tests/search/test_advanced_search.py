@@ -0,0 +1,215 @@
+import json
+import uuid
+from unittest import mock
+
+from django.core import management
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from arches.app.models.models import GraphModel, ResourceInstance, TileModel
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.search.advanced_search import (
+    AdvancedSearchCompiler,
+    AdvancedSearchError,
+)
+from tests import test_report_configs
+
+NODES = {
+    # alias: (nodeid, nodegroupid, datatype)
+    "material": ("49910861-d211-4712-ac97-5a737e8650cb", "ng-material", "reference"),
+    "name_content": ("11111111-1111-1111-1111-111111111111", "ng-name", "string"),
+    "dimension": ("22222222-2222-2222-2222-222222222222", "ng-dim", "number"),
+}
+
+
+def get_node_alias(graph_slug, nodeid):
+    for alias, (node_id, _, _) in NODES.items():
+        if node_id == str(nodeid):
+            return alias
+    raise AdvancedSearchCompilerTests.DoesNotExist
+
+
+class AdvancedSearchCompilerTests(SimpleTestCase):
+    class DoesNotExist(Exception):
+        pass
+
+    def setUp(self):
+        patches = [
+            mock.patch(
+                "arches_rascolls.search.advanced_search.Node.DoesNotExist",
+                self.DoesNotExist,
+            ),
+            mock.patch(
+                "arches_rascolls.search.advanced_search.get_node_alias",
+                get_node_alias,
+            ),
+            mock.patch(
+                "arches_rascolls.search.advanced_search.get_node_id",
+                self.lookup(0),
+            ),
+            mock.patch(
+                "arches_rascolls.search.advanced_search.get_nodegroup_id",
+                self.lookup(1),
+            ),
+            mock.patch(
+                "arches_rascolls.search.advanced_search.get_node_datatype",
+                self.lookup(2),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.compiler = AdvancedSearchCompiler(graph_slug="graph")
+
+    def lookup(self, index):
+        def lookup(graph_slug, alias):
+            if alias not in NODES:
+                raise self.DoesNotExist
+            return NODES[alias][index]
+
+        return lookup
+
+    def test_empty_filter(self):
+        self.assertIsNone(self.compiler.compile([]))
+        self.assertIsNone(self.compiler.compile([{"op": "and"}]))
+
+    def test_reference_equality_uses_containment(self):
+        sql, params = self.compiler.compile(
+            [{"op": "and", NODES["material"][0]: {"op": "eq", "val": "item-1"}}]
+        )
+        self.assertIn("t.nodegroupid = %s AND t.tiledata @> %s::jsonb", sql)
+        self.assertEqual(params[0], "ng-material")
+        self.assertEqual(
+            json.loads(params[1]),
+            {NODES["material"][0]: [{"labels": [{"list_item_id": "item-1"}]}]},
+        )
+
+    def test_facet_list_folds_left(self):
+        sql, params = self.compiler.compile(
+            [
+                {"op": "and", "material": {"op": "eq", "val": "item-1"}},
+                {"op": "or", "material": {"op": "eq", "val": "item-2"}},
+                {"op": "not", "dimension": {"op": "gt", "val": 10}},
+            ]
+        )
+        self.assertRegex(sql, r"(?s)^\(\(ri\..* OR ri\..*\) AND NOT \(ri\..*\)\)$")
+        self.assertIn("ng-dim", params)
+        self.assertEqual(params[-1], 10.0)
+
+    def test_nested_groups(self):
+        sql, _ = self.compiler.compile(
+            {
+                "op": "or",
+                "filters": [
+                    {"op": "not", "material": {"op": "in", "val": ["a", "b"]}},
+                    {"op": "and", "dimension": {"op": "range", "val": [1, 2]}},
+                ],
+            }
+        )
+        self.assertTrue(sql.startswith("(NOT (ri."))
+        self.assertIn(" OR t.tiledata @> %s::jsonb", sql)
+        self.assertIn(">= %s", sql)
+        self.assertIn("<= %s", sql)
+
+    def test_nested_lists_are_and_groups(self):
+        sql, _ = self.compiler.compile(
+            [
+                {"op": "and", "material": {"op": "eq", "val": "item-1"}},
+                [{"op": "or", "material": {"op": "eq", "val": "item-2"}}],
+            ]
+        )
+        self.assertRegex(sql, r"(?s)^\(ri\..* AND ri\..*\)$")
+        with self.assertRaises(AdvancedSearchError):
+            self.compiler.compile([{"material": {"op": "eq", "val": 1}}, [1]])
+
+    def test_string_contains_escapes_wildcards(self):
+        _, params = self.compiler.compile(
+            {"name_content": {"op": "contains", "val": "50%_lead"}}
+        )
+        self.assertEqual(params[-1], "%50\\%\\_lead%")
+
+    def test_invalid_filters(self):
+        for filter in [
+            {"op": "xor", "material": {"op": "eq", "val": 1}},
+            {"material": {"op": "near", "val": 1}},
+            {"material": "item-1"},
+            {"unknown_alias": {"op": "eq", "val": 1}},
+            {"33333333-3333-3333-3333-333333333333": {"op": "eq", "val": 1}},
+            {"material": {"op": "gt", "val": 1}},
+            {"dimension": {"op": "gt", "val": "tall"}},
+            {"material": {"op": "in", "val": "item-1"}},
+        ]:
+            with self.subTest(filter=filter):
+                with self.assertRaises(AdvancedSearchError):
+                    self.compiler.compile(filter)
+
+
+class AdvancedSearchQueryTests(TestCase):
+    """Run compiled conditions against collection items in the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        management.call_command(
+            "load_ontology", source=str(test_report_configs.ONTOLOGY_DIR), verbosity=0
+        )
+        test_report_configs.ReportConfigValidationTests.import_graph_file(
+            test_report_configs.REFERENCE_AND_SAMPLE_ITEM_GRAPH_FILE
+        )
+        graph = GraphModel.objects.get(
+            slug=settings.COLLECTIONS_GRAPH_SLUG, source_identifier=None
+        )
+        cls.items = {}
+        for material in ["bronze", "clay", "glass"]:
+            item = ResourceInstance.objects.create(
+                graph=graph,
+                name={"en": {"value": material, "direction": "ltr"}},
+            )
+            materialid = NODES["material"][0]
+            TileModel.objects.create(
+                resourceinstance=item,
+                nodegroup_id=materialid,
+                data={
+                    materialid: [
+                        {
+                            "uri": f"http://localhost:8000/plugins/controlled-list-manager/item/{material}",
+                            "labels": [
+                                {
+                                    "id": str(uuid.uuid4()),
+                                    "value": material,
+                                    "language_id": "en",
+                                    "valuetype_id": "prefLabel",
+                                    "list_item_id": f"item-{material}",
+                                }
+                            ],
+                            "list_id": str(uuid.UUID(int=0)),
+                        }
+                    ]
+                },
+                sortorder=0,
+            )
+            cls.items[material] = item.resourceinstanceid
+
+    def search(self, advanced_search_filter):
+        sql, params = AdvancedSearchCompiler().compile(advanced_search_filter)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""SELECT ri.resourceinstanceid FROM resource_instances ri
+                WHERE ri.graphid = %s AND {sql}""",
+                [settings.COLLECTIONS_GRAPHID, *params],
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_containment_finds_matching_items(self):
+        self.assertEqual(
+            self.search({"material": {"op": "eq", "val": "item-clay"}}),
+            {self.items["clay"]},
+        )
+        self.assertEqual(
+            self.search({"material": {"op": "in", "val": ["item-clay", "item-glass"]}}),
+            {self.items["clay"], self.items["glass"]},
+        )
+        self.assertEqual(
+            self.search({"op": "not", "material": {"op": "eq", "val": "item-clay"}}),
+            {self.items["bronze"], self.items["glass"]},
+        )
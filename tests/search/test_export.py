@@ -0,0 +1,44 @@
+import json
+
+from django.test import SimpleTestCase
+
+from arches_rascolls.search.export import stream_csv, stream_geojson, stream_ndjson
+
+
+def rows(geometry="centroid"):
+    for index in range(3):
+        row = {
+            "resourceinstanceid": f"id-{index}",
+            "displayname": f"Item, {index}",
+            "displaydescription": "",
+            "currentlocation": "Shelf 1",
+        }
+        if geometry == "centroid":
+            row["longitude"], row["latitude"] = (
+                (index, -index) if index else (None, None)
+            )
+        elif geometry == "full":
+            row["geometry"] = {"type": "Point", "coordinates": [index, index]}
+        yield row
+
+
+class ExportFormatTests(SimpleTestCase):
+    def test_csv(self):
+        lines = list(stream_csv(rows()))
+        self.assertEqual(
+            lines[0],
+            "resourceinstanceid,displayname,displaydescription,currentlocation,longitude,latitude\r\n",
+        )
+        self.assertEqual(lines[2], 'id-1,"Item, 1",,Shelf 1,1,-1\r\n')
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson(self):
+        lines = list(stream_ndjson(rows("full"), "full"))
+        self.assertEqual(json.loads(lines[1])["geometry"]["coordinates"], [1, 1])
+
+    def test_geojson_is_one_document(self):
+        collection = json.loads("".join(stream_geojson(rows())))
+        self.assertEqual(len(collection["features"]), 3)
+        self.assertIsNone(collection["features"][0]["geometry"])
+        self.assertEqual(collection["features"][2]["geometry"]["coordinates"], [2, -2])
+        self.assertNotIn("longitude", collection["features"][2]["properties"])
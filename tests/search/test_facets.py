@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from arches_rascolls.search.facets import FacetCounter, FacetError
+
+NODES = {
+    # alias: (nodeid, nodegroupid, datatype)
+    "material": ("49910861-d211-4712-ac97-5a737e8650cb", "ng-material", "reference"),
+    "safety_classification": ("ng-safety", "ng-safety", "semantic"),
+    "name_content": ("11111111-1111-1111-1111-111111111111", "ng-name", "string"),
+}
+
+
+class Planner:
+    def get_matches_sql(self):
+        return "SELECT ri.resourceinstanceid FROM resource_instances ri", []
+
+
+class FacetCounterTests(SimpleTestCase):
+    def setUp(self):
+        for index, name in enumerate(
+            ["get_node_id", "get_nodegroup_id", "get_node_datatype"]
+        ):
+            patch = mock.patch(
+                f"arches_rascolls.search.facets.{name}",
+                lambda graph_slug, alias, index=index: NODES[alias][index],
+            )
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_facets_are_counted_in_one_statement(self):
+        sql, params = FacetCounter(
+            ["material", "safety_classification"], graph_slug="graph"
+        ).get_sql(Planner())
+        self.assertEqual(sql.count("GROUP BY"), 1)
+        self.assertIn("UNION ALL", sql)
+        self.assertIn("count(DISTINCT t.resourceinstanceid)", sql)
+        self.assertEqual(sql.count("%s"), len(params))
+        self.assertEqual(params[-1], ["ng-material", "ng-safety"])
+
+    def test_localized_strings_are_rejected(self):
+        with self.assertRaises(FacetError):
+            FacetCounter(["name_content"], graph_slug="graph").get_sql(Planner())
+
+    def test_no_facets_runs_no_query(self):
+        self.assertEqual(FacetCounter([], graph_slug="graph").get_counts(Planner()), {})
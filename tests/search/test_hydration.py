@@ -0,0 +1,97 @@
+import uuid
+
+from django.core import management
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import override
+
+from arches.app.models.models import GraphModel, ResourceInstance
+from arches.app.models.system_settings import settings
+
+from arches_rascolls.search.hydration import (
+    FIELD_SETS,
+    get_search_results_by_resourceids,
+    rebuild_search_cards,
+)
+from tests import test_report_configs
+
+
+class SearchResultHydrationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        management.call_command(
+            "load_ontology", source=str(test_report_configs.ONTOLOGY_DIR), verbosity=0
+        )
+        test_report_configs.ReportConfigValidationTests.import_graph_file(
+            test_report_configs.REFERENCE_AND_SAMPLE_ITEM_GRAPH_FILE
+        )
+        graph = GraphModel.objects.get(
+            slug=settings.COLLECTIONS_GRAPH_SLUG, source_identifier=None
+        )
+        cls.resources = ResourceInstance.objects.bulk_create(
+            [
+                ResourceInstance(
+                    resourceinstanceid=uuid.uuid4(),
+                    graph=graph,
+                    descriptors={
+                        "en": {"name": f"Item {i}", "description": f"Sample {i}"}
+                    },
+                )
+                for i in range(20)
+            ]
+        )
+        cls.resourceids = [resource.pk for resource in cls.resources]
+
+    def hydrate(self, resourceids, fields=FIELD_SETS["full"]):
+        with override("en"):
+            return get_search_results_by_resourceids(resourceids, fields)
+
+    def test_results_keep_requested_order(self):
+        resourceids = list(reversed(self.resourceids[:5]))
+        results = self.hydrate([str(resourceid) for resourceid in resourceids])
+        self.assertEqual(
+            [result["resourceinstanceid"] for result in results], resourceids
+        )
+        self.assertEqual(results[0]["displayname"], "Item 4")
+        self.assertFalse(results[0]["has_geom"])
+
+    def test_empty_page_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.hydrate([]), [])
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # Warm the node lookup caches.
+        self.hydrate(self.resourceids[:1])
+        with CaptureQueriesContext(connection) as small_page:
+            self.hydrate(self.resourceids[:2])
+        with CaptureQueriesContext(connection) as large_page:
+            self.hydrate(self.resourceids)
+        self.assertEqual(len(small_page), len(large_page))
+        self.assertLessEqual(len(large_page), 4)
+
+    def test_cards_are_maintained_on_save(self):
+        resource = self.resources[0]
+        resource.descriptors = {"en": {"name": "Renamed", "description": "Sample 0"}}
+        resource.save()
+        with self.assertNumQueries(1):
+            [result] = self.hydrate([resource.pk])
+        self.assertEqual(result["displayname"], "Renamed")
+
+    def test_missing_cards_are_built_and_rebuilt(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM rascolls_search_card")
+        built = self.hydrate(self.resourceids[:3])
+        self.assertEqual(rebuild_search_cards(), len(self.resourceids))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.hydrate(self.resourceids[:3]), built)
+
+    def test_summary_skips_location_and_geometry(self):
+        [stored] = self.hydrate(self.resourceids[:1], FIELD_SETS["summary"])
+        self.assertEqual(set(stored), FIELD_SETS["summary"])
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM rascolls_search_card")
+        # The card lookup and the descriptors.
+        with self.assertNumQueries(2):
+            [built] = self.hydrate(self.resourceids[:1], FIELD_SETS["summary"])
+        self.assertEqual(built, stored)
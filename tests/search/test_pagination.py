@@ -0,0 +1,26 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from arches_rascolls.search.pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        resourceid = uuid.uuid4()
+        token = encode_cursor([resourceid])
+        self.assertEqual(decode_cursor(token), [str(resourceid)])
+
+    def test_token_is_url_safe(self):
+        token = encode_cursor([0.5, str(uuid.uuid4())])
+        self.assertRegex(token, r"^[A-Za-z0-9_-]+$")
+
+    def test_invalid_tokens(self):
+        for token in ["", "not a cursor", encode_cursor([])[:-1] + "!", "e30"]:
+            with self.subTest(token=token):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(token)
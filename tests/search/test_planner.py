@@ -0,0 +1,102 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from arches_rascolls.search.planner import SearchPlanner
+from arches_rascolls.search.result_set import ResultSet
+
+STAGE_RESULTS = {
+    "term": ResultSet.from_sorted([1, 2, 3, 5, 8]),
+    "map": ResultSet.from_sorted([2, 3, 4, 5]),
+    "advanced": ResultSet.from_sorted([3, 5, 7]),
+}
+
+
+@override_settings(SEARCH_STAGE_WORKERS=3)
+class ConcurrentStageTests(SimpleTestCase):
+    def get_result_set(self, predicates):
+        threads = set()
+
+        def get_stage_result_set(predicate):
+            threads.add(threading.current_thread().name)
+            return STAGE_RESULTS[predicate[0]]
+
+        planner = SearchPlanner(terms=["bronze"])
+        with (
+            mock.patch.object(planner, "get_predicates", return_value=predicates),
+            mock.patch.object(
+                planner, "get_stage_result_set", side_effect=get_stage_result_set
+            ),
+        ):
+            return planner.get_result_set(), threads
+
+    def test_stages_are_intersected(self):
+        result_set, threads = self.get_result_set(
+            [("term", []), ("map", []), ("advanced", [])]
+        )
+        self.assertEqual(list(result_set), [3, 5])
+        self.assertNotIn(threading.current_thread().name, threads)
+
+    def test_single_filter_runs_as_one_statement(self):
+        planner = SearchPlanner(terms=["bronze"])
+        with (
+            mock.patch.object(planner, "get_stage_result_set") as get_stage,
+            mock.patch("arches_rascolls.search.planner.connection") as connection,
+        ):
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [(1,), (4,)]
+            self.assertEqual(list(planner.get_result_set()), [1, 4])
+        get_stage.assert_not_called()
+
+
+class CountTests(SimpleTestCase):
+    def get_page(self, estimate, rows, offset=0):
+        planner = SearchPlanner()
+        with (
+            mock.patch.object(planner, "get_estimated_count", return_value=estimate),
+            mock.patch("arches_rascolls.search.planner.connection") as connection,
+        ):
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [(row,) for row in rows]
+            cursor.fetchone.return_value = (len(rows), rows)
+            return planner.get_page(limit=10, offset=offset, exact_count_threshold=100)
+
+    def test_counts_below_threshold(self):
+        self.assertEqual(self.get_page(99, [1, 2]), ([1, 2], 2, False))
+
+    def test_estimates_above_threshold(self):
+        self.assertEqual(self.get_page(150, [1, 2]), ([1, 2], 150, True))
+
+    def test_estimate_covers_the_page(self):
+        page, total, is_estimate = self.get_page(100, [1, 2], offset=200)
+        self.assertEqual(total, 202)
+        self.assertTrue(is_estimate)
+
+
+@override_settings(SEARCH_TERM_MAX_HOPS=2, SEARCH_TERM_HOP_DISCOUNT=0.5)
+class RankedPageTests(SimpleTestCase):
+    def get_ranked_page(self, **kwargs):
+        planner = SearchPlanner(terms=["bronze", "bowl"])
+        with mock.patch("arches_rascolls.search.planner.connection") as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [(7, 0.4), (2, 0.2)]
+            page = planner.get_ranked_page(**kwargs)
+        return page, *cursor.execute.call_args.args
+
+    def test_top_k_is_sorted_in_sql(self):
+        page, sql, params = self.get_ranked_page(limit=2, offset=4)
+        self.assertEqual(page, [(7, 0.4), (2, 0.2)])
+        self.assertIn("ORDER BY ranked.rank DESC, s.surrogateid", sql)
+        self.assertEqual(params[:3], [["bronze", "bowl"], 2, 0.5])
+        self.assertEqual(params[-2:], [2, 4])
+
+    def test_pages_after_rank_and_surrogateid(self):
+        _, sql, params = self.get_ranked_page(limit=2, after=(0.3, 9))
+        self.assertIn("ranked.rank = %s::real AND s.surrogateid > %s", sql)
+        self.assertEqual(params[-5:], [0.3, 0.3, 9, 2, 0])
+
+    def test_unranked_beyond_the_closure(self):
+        with self.settings(SEARCH_TERM_MAX_HOPS=3):
+            self.assertFalse(SearchPlanner(terms=["bronze"]).is_ranked)
+        self.assertFalse(SearchPlanner().is_ranked)
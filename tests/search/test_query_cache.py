@@ -0,0 +1,91 @@
+from django.test import SimpleTestCase, override_settings
+
+from arches_rascolls.search.query_cache import QueryCache, get_query_fingerprint
+from arches_rascolls.search.result_set import ResultSet
+
+POINT = {"type": "Feature", "geometry": {"type": "Point", "coordinates": [1.5, 2.5]}}
+POLYGON = {
+    "type": "Feature",
+    "properties": {"buffer_distance": 0},
+    "geometry": {
+        "type": "Polygon",
+        "coordinates": [[[0, 0], [0, 1], [1, 1], [0, 0]]],
+    },
+}
+
+
+class QueryFingerprintTests(SimpleTestCase):
+    def test_equivalent_terms(self):
+        self.assertEqual(
+            get_query_fingerprint(terms=["Lead  White", "ochre"]),
+            get_query_fingerprint(terms=["ochre", "lead white", "Ochre"]),
+        )
+
+    def test_no_term_filter_differs_from_empty_term_filter(self):
+        self.assertNotEqual(
+            get_query_fingerprint(terms=None), get_query_fingerprint(terms=[])
+        )
+
+    def test_map_filter_ignores_feature_order_and_properties(self):
+        polygon_without_properties = {**POLYGON, "properties": {}}
+        self.assertEqual(
+            get_query_fingerprint(map_filter=[POINT, POLYGON]),
+            get_query_fingerprint(map_filter=[polygon_without_properties, POINT]),
+        )
+
+    def test_map_filter_rounds_coordinates(self):
+        nudged = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [1.50000000001, 2.5]},
+        }
+        self.assertEqual(
+            get_query_fingerprint(map_filter=[POINT]),
+            get_query_fingerprint(map_filter=[nudged]),
+        )
+
+    def test_advanced_search_key_order(self):
+        self.assertEqual(
+            get_query_fingerprint(
+                advanced_search_filter=[{"op": "and", "a": {"op": "eq", "val": 1}}]
+            ),
+            get_query_fingerprint(
+                advanced_search_filter=[{"a": {"val": 1, "op": "eq"}, "op": "and"}]
+            ),
+        )
+
+    def test_distinct_filters(self):
+        self.assertNotEqual(
+            get_query_fingerprint(terms=["ochre"]),
+            get_query_fingerprint(terms=["ochre"], map_filter=[POINT]),
+        )
+
+
+@override_settings(
+    CACHES={
+        "searchqueries": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-query-cache",
+        }
+    }
+)
+class QueryCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.query_cache = QueryCache("searchqueries")
+
+    def tearDown(self):
+        self.query_cache.cache.clear()
+
+    def test_data_version_invalidates(self):
+        result_set = ResultSet([2, 1])
+        self.query_cache.set("fingerprint", 1, result_set)
+        self.assertEqual(self.query_cache.get("fingerprint", 1), result_set)
+        self.assertIsNone(self.query_cache.get("fingerprint", 2))
+
+    def test_stats(self):
+        self.query_cache.set("fingerprint", 1, ResultSet())
+        self.query_cache.get("fingerprint", 1)
+        self.query_cache.get("other-fingerprint", 1)
+        self.query_cache.get("other-fingerprint", 1)
+        self.assertEqual(
+            self.query_cache.stats(), {"hits": 1, "misses": 2, "hit_ratio": 1 / 3}
+        )
@@ -0,0 +1,36 @@
+from django.test import SimpleTestCase
+
+from arches_rascolls.search.result_set import ResultSet
+
+
+class ResultSetTests(SimpleTestCase):
+    def test_ids_are_sorted_and_unique(self):
+        self.assertEqual(list(ResultSet([5, 1, 3, 1])), [1, 3, 5])
+
+    def test_intersection(self):
+        evens = ResultSet(range(0, 1000, 2))
+        threes = ResultSet(range(0, 1000, 3))
+        expected = list(range(0, 1000, 6))
+        self.assertEqual(list(evens & threes), expected)
+        # A much smaller side is binary searched rather than hashed.
+        self.assertEqual(list(ResultSet([4, 5, 6]) & evens), [4, 6])
+        self.assertEqual(list(ResultSet() & evens), [])
+
+    def test_paging(self):
+        result_set = ResultSet([10, 20, 30, 40])
+        self.assertEqual(result_set.page(1, 2), [20, 30])
+        self.assertEqual(result_set.page_after(20, 5), [30, 40])
+        self.assertEqual(result_set.page_after(25, 1), [30])
+        self.assertIn(30, result_set)
+        self.assertNotIn(35, result_set)
+
+    def test_serialization_round_trip(self):
+        result_set = ResultSet(range(1, 100_000, 7))
+        packed = result_set.to_bytes()
+        self.assertEqual(ResultSet.from_bytes(packed), result_set)
+        self.assertLess(len(packed), len(result_set))
+        self.assertEqual(ResultSet.from_bytes(ResultSet().to_bytes()), ResultSet())
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ResultSet.from_bytes(b"\x00")
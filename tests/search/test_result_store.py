@@ -0,0 +1,57 @@
+from django.test import SimpleTestCase, override_settings
+
+from arches_rascolls.search.result_set import ResultSet
+from arches_rascolls.search.result_store import CacheResultStore
+
+
+@override_settings(
+    CACHES={
+        "searchresults": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-result-store",
+        }
+    }
+)
+class CacheResultStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = CacheResultStore(cache_alias="searchresults")
+        self.resourceids = ResultSet([3, 1, 2])
+
+    def tearDown(self):
+        self.store.cache.clear()
+
+    def test_get_by_session(self):
+        self.store.set("session", "query", self.resourceids)
+        self.assertEqual(self.store.get("session"), self.resourceids)
+        self.assertEqual(self.store.get("session", "query"), self.resourceids)
+        self.assertIsNone(self.store.get("session", "other-query"))
+        self.assertIsNone(self.store.get("other-session"))
+        self.assertEqual(self.store.get_query_key("session"), "query")
+        self.assertIsNone(self.store.get_query_key("other-session"))
+
+    def test_new_query_replaces_result_set(self):
+        self.store.set("session", "query", self.resourceids)
+        self.store.set("session", "other-query", ResultSet([1]))
+        self.assertEqual(self.store.get("session"), ResultSet([1]))
+
+    def test_delete_is_scoped_to_session(self):
+        self.store.set("session", "query", self.resourceids)
+        self.store.set("other-session", "query", self.resourceids)
+        self.store.delete("session", "other-query")
+        self.assertEqual(self.store.get("session"), self.resourceids)
+        self.store.delete("session")
+        self.assertIsNone(self.store.get("session"))
+        self.assertEqual(self.store.get("other-session"), self.resourceids)
+
+    def test_tiles_select_result_set_by_digest(self):
+        self.store.set("session", "query", self.resourceids)
+        digest = self.store.get_digest("session")
+        self.assertEqual(digest, ResultSet([1, 2, 3]).digest())
+        self.assertNotEqual(digest, ResultSet([1]).digest())
+        self.assertIsNone(self.store.get_digest("other-session"))
+        self.assertEqual(
+            self.store.get_surrogateids_sql("session", digest),
+            ("SELECT unnest(%s::integer[])", [[1, 2, 3]]),
+        )
+        self.store.set("session", "other-query", ResultSet([1]))
+        self.assertEqual(self.store.get_surrogateids_sql("session", digest)[1], [[]])
@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from arches_rascolls.search import suggest
+
+
+class SuggestTests(SimpleTestCase):
+    def setUp(self):
+        suggest.get_cached_suggestions.cache_clear()
+        patch = mock.patch.object(suggest, "get_data_version", return_value=1)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_normalize_prefix(self):
+        self.assertEqual(suggest.normalize_prefix("  Prussian BLu"), "blu")
+        self.assertEqual(suggest.normalize_prefix("   "), "")
+
+    def test_blank_text_runs_no_query(self):
+        with mock.patch.object(suggest, "connection") as connection:
+            self.assertEqual(suggest.get_suggestions(" "), [])
+        connection.cursor.assert_not_called()
+
+    def test_hot_prefixes_are_cached(self):
+        with mock.patch.object(suggest, "connection") as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = [("lead", 12), ("leaf", 3)]
+            first = suggest.get_suggestions("Lea", limit=5)
+            second = suggest.get_suggestions("white lea", limit=5)
+        self.assertEqual(
+            first, [{"term": "lead", "count": 12}, {"term": "leaf", "count": 3}]
+        )
+        self.assertEqual(second, first)
+        self.assertEqual(cursor.execute.call_count, 1)
+        sql, params = cursor.execute.call_args.args
+        self.assertIn("UNION ALL", sql)
+        self.assertRegex(sql, r"ORDER BY branch, rank DESC, .*\s+LIMIT %s$")
+        self.assertEqual(params[0], "lea%")
+        self.assertEqual(params[-1], 5)
+
+    def test_short_prefixes_skip_trigram_matches(self):
+        with mock.patch.object(suggest, "connection") as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = []
+            suggest.get_suggestions("p_")
+        sql, params = cursor.execute.call_args.args
+        self.assertNotIn("similarity", sql)
+        self.assertEqual(params, ["p\\_%", 10, 10])
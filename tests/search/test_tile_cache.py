@@ -0,0 +1,169 @@
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from arches_rascolls.search.tile_cache import (
+    MERCATOR_EXTENT,
+    FileSystemTileCache,
+    MBTilesTileCache,
+    get_covering_tiles,
+    get_tile_ranges,
+    refresh_tile_cache,
+)
+
+# A point in the north-east quarter of the world, away from tile edges.
+POINT_BBOX = (MERCATOR_EXTENT / 3, MERCATOR_EXTENT / 3) * 2
+# A polygon about 5 km across near Oxford, covered by 43 tiles up to zoom 14.
+FIELD_BBOX = (-144715.3, 6753250.0, -136923.0, 6758644.9)
+# Covering tiles at zoom levels 10, 12 and 14, and tiles away from it.
+FIELD_TILES = [(10, 508, 339), (12, 2033, 1357), (14, 8132, 5428)]
+OTHER_TILES = [(10, 500, 339), (12, 2000, 1357), (14, 8000, 5428)]
+
+
+class TileRangeTests(SimpleTestCase):
+    def test_point_is_covered_by_one_tile_per_zoom(self):
+        for zoom, expected in [(0, (0, 0)), (1, (1, 0)), (2, (2, 1))]:
+            with self.subTest(zoom=zoom):
+                xs, ys = get_tile_ranges(POINT_BBOX, zoom)
+                self.assertEqual((list(xs), list(ys)), ([expected[0]], [expected[1]]))
+
+    def test_margin_reaches_neighbouring_tiles(self):
+        xs, ys = get_tile_ranges((0, 0, 0, 0), 1)
+        self.assertEqual((list(xs), list(ys)), ([0, 1], [0, 1]))
+
+    def test_too_many_tiles(self):
+        self.assertEqual(len(get_covering_tiles([POINT_BBOX], 3, 10)), 4)
+        world = (-MERCATOR_EXTENT, -MERCATOR_EXTENT, MERCATOR_EXTENT, MERCATOR_EXTENT)
+        self.assertIsNone(get_covering_tiles([world], 3, 10))
+
+
+@override_settings(
+    TILE_CACHE={"MAX_ZOOM": 1, "MAX_INVALIDATED_TILES": 100, "UNCOMMITTED_GRACE": 30}
+)
+class RefreshTileCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tile_cache = FileSystemTileCache(directory.name)
+        for zoom, x, y in [(0, 0, 0), (1, 1, 0), (1, 0, 1)]:
+            self.tile_cache.set("layer", zoom, x, y, b"tile")
+
+    def refresh(self, version, purged_version=0, rows=()):
+        with (
+            mock.patch(
+                "arches_rascolls.search.tile_cache.get_data_version",
+                return_value=version,
+            ),
+            mock.patch("arches_rascolls.search.tile_cache.connection") as connection,
+            mock.patch(
+                "arches_rascolls.search.tile_cache.purge_tile_invalidations"
+            ) as purge,
+        ):
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = (purged_version,)
+            cursor.fetchall.return_value = list(rows)
+            refresh_tile_cache(self.tile_cache, "layer")
+        return connection, purge
+
+    def get_tiles(self):
+        return [
+            tile
+            for tile in [(0, 0, 0), (1, 1, 0), (1, 0, 1)]
+            if self.tile_cache.get("layer", *tile) is not None
+        ]
+
+    def test_up_to_date_layer_runs_no_queries(self):
+        self.tile_cache.set_version("layer", 5)
+        connection, _ = self.refresh(5)
+        connection.cursor.assert_not_called()
+        self.assertEqual(len(self.get_tiles()), 3)
+
+    def test_changed_tiles_are_dropped(self):
+        self.tile_cache.set_version("layer", 5)
+        _, purge = self.refresh(6, rows=[(6, 0, *POINT_BBOX)])
+        self.assertEqual(self.get_tiles(), [(1, 0, 1)])
+        self.assertEqual(self.tile_cache.get_version("layer"), 6)
+        purge.assert_called_once()
+
+    def test_versions_committed_out_of_order_are_read_again(self):
+        self.tile_cache.set_version("layer", 4)
+        self.refresh(6, rows=[(6, 0, *POINT_BBOX)])
+        self.assertEqual(self.get_tiles(), [(1, 0, 1)])
+        self.assertEqual(self.tile_cache.get_version("layer"), 4)
+
+        self.tile_cache.set("layer", 1, 1, 0, b"tile")
+        self.refresh(6, rows=[(5, 0, *POINT_BBOX), (6, 1, *POINT_BBOX)])
+        self.assertEqual(self.get_tiles(), [(1, 0, 1)])
+        self.assertEqual(self.tile_cache.get_version("layer"), 6)
+
+    def test_rolled_back_versions_are_skipped_after_grace(self):
+        self.tile_cache.set_version("layer", 4)
+        self.refresh(6, rows=[(6, 60, *POINT_BBOX)])
+        self.assertEqual(self.tile_cache.get_version("layer"), 6)
+
+    def test_layer_behind_purged_versions_is_cleared(self):
+        self.tile_cache.set_version("layer", 5)
+        self.refresh(8, purged_version=7, rows=[(8, 0, *POINT_BBOX)])
+        self.assertEqual(self.get_tiles(), [])
+        self.assertEqual(self.tile_cache.get_version("layer"), 8)
+
+    def test_only_tiles_covering_a_polygon_are_dropped(self):
+        for tile in FIELD_TILES + OTHER_TILES:
+            self.tile_cache.set("layer", *tile, b"tile")
+        self.tile_cache.set_version("layer", 5)
+        with self.settings(TILE_CACHE={"MAX_ZOOM": 14, "MAX_INVALIDATED_TILES": 100}):
+            self.refresh(6, rows=[(6, 0, *FIELD_BBOX)])
+        for tile in FIELD_TILES:
+            self.assertIsNone(self.tile_cache.get("layer", *tile))
+        for tile in OTHER_TILES:
+            self.assertEqual(self.tile_cache.get("layer", *tile), b"tile")
+
+    def test_zoom_levels_over_the_limit_are_cleared(self):
+        for tile in FIELD_TILES + OTHER_TILES:
+            self.tile_cache.set("layer", *tile, b"tile")
+        self.tile_cache.set_version("layer", 5)
+        # Zoom levels 0-12 are covered by 17 tiles, 0-13 by 23.
+        with self.settings(TILE_CACHE={"MAX_ZOOM": 14, "MAX_INVALIDATED_TILES": 20}):
+            self.refresh(6, rows=[(6, 0, *FIELD_BBOX)])
+        self.assertEqual(
+            [
+                tile
+                for tile in FIELD_TILES + OTHER_TILES
+                if self.tile_cache.get("layer", *tile) is not None
+            ],
+            OTHER_TILES[:2],
+        )
+
+
+class MBTilesTileCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.tile_cache = MBTilesTileCache(directory.name)
+
+    def test_tiles_are_stored_in_tms_rows(self):
+        self.tile_cache.set_many("layer", [(2, 1, 0, b"north"), (2, 1, 3, b"south")])
+        self.assertEqual(self.tile_cache.get("layer", 2, 1, 0), b"north")
+        with self.tile_cache.connect("layer") as archive:
+            rows = archive.execute(
+                "SELECT tile_row, tile_data FROM tiles ORDER BY tile_row"
+            ).fetchall()
+        self.assertEqual(rows, [(0, b"south"), (3, b"north")])
+
+    def test_delete_clear_and_version(self):
+        self.assertIsNone(self.tile_cache.get_version("layer"))
+        self.tile_cache.set_many("layer", [(0, 0, 0, b"a"), (1, 0, 0, b"b")])
+        self.tile_cache.set_version("layer", 3)
+        self.tile_cache.delete("layer", [(1, 0, 0)])
+        self.assertIsNone(self.tile_cache.get("layer", 1, 0, 0))
+        self.assertEqual(self.tile_cache.get("layer", 0, 0, 0), b"a")
+        self.tile_cache.clear("layer")
+        self.assertIsNone(self.tile_cache.get("layer", 0, 0, 0))
+        self.assertEqual(self.tile_cache.get_version("layer"), 3)
+
+    def test_clear_zooms(self):
+        self.tile_cache.set_many("layer", [(1, 0, 0, b"a"), (2, 0, 0, b"b")])
+        self.tile_cache.clear_zooms("layer", 2)
+        self.assertEqual(self.tile_cache.get("layer", 1, 0, 0), b"a")
+        self.assertIsNone(self.tile_cache.get("layer", 2, 0, 0))
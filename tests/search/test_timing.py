@@ -0,0 +1,62 @@
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+
+from arches_rascolls.search.timing import StageTimer, TimingHistograms
+
+
+@override_settings(
+    CACHES={
+        "searchtimings": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test-timings",
+        }
+    }
+)
+class StageTimerTests(SimpleTestCase):
+    def setUp(self):
+        self.histograms = TimingHistograms("searchtimings")
+
+    def tearDown(self):
+        self.histograms.cache.clear()
+
+    def test_repeated_stages_add_up(self):
+        timer = StageTimer()
+        with timer.stage("match") as stage:
+            stage["rows"] = 3
+        with timer.stage("match") as stage:
+            stage["rows"] = 2
+        with timer.stage("hydrate"):
+            pass
+        self.assertEqual(timer.stages["match"]["rows"], 5)
+        self.assertIsNone(timer.stages["hydrate"]["rows"])
+        header = timer.get_server_timing()
+        self.assertRegex(header, r'^match;dur=[\d.]+;desc="queries=0 rows=5", ')
+        self.assertRegex(header, r'hydrate;dur=[\d.]+;desc="queries=0", total;dur=')
+
+    def test_finish_sets_server_timing(self):
+        timer = StageTimer()
+        response = HttpResponse()
+        with self.settings(SEARCH_TIMING={"SAMPLE_RATE": 0, "CACHE": "searchtimings"}):
+            timer.finish(response, "search")
+        self.assertTrue(response["Server-Timing"].startswith("total;dur="))
+
+    def test_histograms(self):
+        for milliseconds in (3, 40, 40, 9000):
+            self.histograms.observe("search.match", milliseconds)
+        histogram = self.histograms.snapshot()["search.match"]
+        self.assertEqual(histogram["count"], 4)
+        self.assertEqual(histogram["sum_ms"], 9083)
+        self.assertEqual(histogram["buckets"]["5"], 1)
+        self.assertEqual(histogram["buckets"]["50"], 2)
+        self.assertEqual(histogram["buckets"]["inf"], 1)
+        exposition = self.histograms.to_prometheus()
+        self.assertIn('_bucket{stage="search.match",le="50"} 3', exposition)
+        self.assertIn('_bucket{stage="search.match",le="+Inf"} 4', exposition)
+
+    def test_stages_are_registered_once(self):
+        for stage in ("search.match", "search.total", "search.match"):
+            self.histograms.observe(stage, 1)
+        self.assertEqual(self.histograms.cache.get(TimingHistograms.stages_key), 2)
+        self.assertEqual(
+            list(self.histograms.snapshot()), ["search.match", "search.total"]
+        )
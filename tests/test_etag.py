@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from arches_rascolls.utils.etag import (
+    get_not_modified_response,
+    make_etag,
+    set_etag,
+)
+
+
+@mock.patch("arches_rascolls.utils.etag.get_data_version", return_value=7)
+class ETagTests(SimpleTestCase):
+    def get_request(self, if_none_match=None):
+        headers = {"If-None-Match": if_none_match} if if_none_match else {}
+        return RequestFactory().get("/api-search", headers=headers)
+
+    def test_etag_changes_with_version_and_parts(self, get_data_version):
+        etag = make_etag("search", {"term-filter": ["bronze"]}, "en")
+        self.assertRegex(etag, r'^"[0-9a-f]{32}"$')
+        self.assertEqual(etag, make_etag("search", {"term-filter": ["bronze"]}, "en"))
+        self.assertNotEqual(etag, make_etag("search", {"term-filter": ["clay"]}, "en"))
+        get_data_version.return_value = 8
+        self.assertNotEqual(
+            etag, make_etag("search", {"term-filter": ["bronze"]}, "en")
+        )
+
+    def test_matching_etag_is_not_modified(self, get_data_version):
+        etag = make_etag("settings")
+        for if_none_match in [etag, f'"other", W/{etag}', "*"]:
+            with self.subTest(if_none_match=if_none_match):
+                response = get_not_modified_response(
+                    self.get_request(if_none_match), etag
+                )
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+
+    def test_other_etags_are_modified(self, get_data_version):
+        etag = make_etag("settings")
+        self.assertIsNone(get_not_modified_response(self.get_request(), etag))
+        self.assertIsNone(get_not_modified_response(self.get_request('"other"'), etag))
+
+    def test_errors_are_not_tagged(self, get_data_version):
+        etag = make_etag("map")
+        self.assertEqual(set_etag(HttpResponse(), etag)["ETag"], etag)
+        self.assertNotIn("ETag", set_etag(HttpResponse(status=400), etag))
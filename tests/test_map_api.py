@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from arches_rascolls.views.map_api import (
+    get_cluster_max_zoom,
+    get_geometry_column,
+    render_collection_tile,
+)
+
+
+@override_settings(
+    MAP_CLUSTER_GRID=16, MAP_CLUSTER_MAX_ZOOM=None, CLUSTER_DISTANCE_MAX=5000
+)
+@mock.patch("arches_rascolls.views.map_api.get_node_id", return_value="node")
+@mock.patch("arches_rascolls.views.map_api.connection")
+class ClusterTileTests(SimpleTestCase):
+    def render(self, connection, zoom):
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (memoryview(b"tile"),)
+        self.assertEqual(render_collection_tile("layer", zoom, 0, 0), b"tile")
+        return cursor.execute.call_args.args
+
+    def test_cluster_max_zoom(self, connection, get_node_id):
+        # A cell of a zoom 8 tile is ~9.8 km wide, of a zoom 9 tile ~4.9 km.
+        self.assertEqual(get_cluster_max_zoom(), 8)
+        with self.settings(CLUSTER_DISTANCE_MAX=10000):
+            self.assertEqual(get_cluster_max_zoom(), 7)
+        with self.settings(MAP_CLUSTER_MAX_ZOOM=3):
+            self.assertEqual(get_cluster_max_zoom(), 3)
+
+    def test_low_zooms_are_clustered(self, connection, get_node_id):
+        sql, params = self.render(connection, 8)
+        self.assertIn("point_count", sql)
+        self.assertEqual(params[-2:], [256.0, 256.0])
+
+        sql, params = self.render(connection, 9)
+        self.assertNotIn("point_count", sql)
+        self.assertIn("coalesce(geom_z11, geom)", sql)
+
+    def test_geometries_are_simplified_for_zoom(self, connection, get_node_id):
+        self.assertEqual(get_geometry_column(11), "coalesce(geom_z11, geom)")
+        self.assertEqual(get_geometry_column(12), "coalesce(geom_z14, geom)")
+        self.assertEqual(get_geometry_column(15), "geom")
@@ -60,8 +60,24 @@ CACHES = {
     "searchresults": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     },
+    # Test transactions never commit, so the search data version never moves.
+    "searchqueries": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    },
+    # Keyed by the geometry data version, which doesn't move either.
+    "searchtiles": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    },
+    "searchtimings": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "searchtimings",
+    },
 }
 
+# Sample no request into the timing histograms, so that runs don't depend on
+# random.random(); tests that need the histograms raise the rate themselves.
+SEARCH_TIMING = {**SEARCH_TIMING, "SAMPLE_RATE": 0}
+
 LOGGING["loggers"]["arches"]["level"] = "ERROR"
 
 ELASTICSEARCH_PREFIX = "test"